@@ -0,0 +1,180 @@
+"""Incrementally maintained portfolio aggregates.
+
+Summary tables hold the counts and sums the dashboard needs, and triggers on
+properties and maintenance_issues keep them in step inside the same
+transaction as every write, so /api/analytics is one indexed read instead of
+a pass over the source tables. Sums carry a count of non-NULL inputs so they
+can report NULL exactly where SUM() would.
+
+Existing databases are populated once when the tables are first created. To
+compare the maintained values with a fresh computation from the source
+tables, or to recompute them:
+
+    python aggregates.py check
+    python aggregates.py rebuild
+"""
+import json
+import sys
+
+import changes
+
+# Floating-point sums built up incrementally can differ from a fresh SUM() in
+# the last few bits
+TOLERANCE = 1e-6
+
+# (table, key columns) for each maintenance roll-up
+ISSUE_TABLES = [
+    ("property_stats", ("property_id", "status")),
+    ("category_stats", ("category",)),
+    ("status_stats", ("status",)),
+]
+
+# Fresh values computed from the source tables, keyed like the summary tables
+SOURCE_QUERIES = {
+    "portfolio_stats": """
+        SELECT 1 AS id, COUNT(*) AS property_count, COUNT(rent_amount) AS rent_count,
+               IFNULL(SUM(rent_amount), 0) AS total_rent,
+               (SELECT COUNT(*) FROM maintenance_issues) AS issue_count,
+               (SELECT COUNT(cost) FROM maintenance_issues) AS cost_count,
+               (SELECT IFNULL(SUM(cost), 0) FROM maintenance_issues) AS total_cost
+        FROM properties
+    """,
+    **{
+        table: f"""
+            SELECT {", ".join(keys)}, COUNT(*) AS issue_count, COUNT(cost) AS cost_count,
+                   IFNULL(SUM(cost), 0) AS total_cost
+            FROM maintenance_issues
+            GROUP BY {", ".join(keys)}
+        """
+        for table, keys in ISSUE_TABLES
+    },
+}
+TABLE_KEYS = {"portfolio_stats": ("id",), **dict(ISSUE_TABLES)}
+
+
+def _fill(cursor):
+    for table, sql in SOURCE_QUERIES.items():
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(f"INSERT INTO {table} {sql}")
+
+
+def rebuild(conn):
+    """Recompute every summary table from the source tables in one transaction."""
+    with conn:
+        _fill(conn.cursor())
+        # Analytics served from the response cache must not outlive the drift this fixes
+        changes.record(conn, "maintenance", "rebuilt")
+
+
+def check(conn):
+    """Compare the maintained aggregates with a fresh computation; returns a list of differences."""
+    problems = []
+    # One read transaction, so a writer can't slip in between the two sides
+    conn.execute("BEGIN")
+    try:
+        for table, sql in SOURCE_QUERIES.items():
+            keys = TABLE_KEYS[table]
+            expected = {tuple(row[k] for k in keys): dict(row) for row in conn.execute(sql)}
+            stored = {tuple(row[k] for k in keys): dict(row) for row in conn.execute(f"SELECT * FROM {table}")}
+            for key in sorted(expected.keys() | stored.keys(), key=repr):
+                want, have = expected.get(key), stored.get(key)
+                if want is None or have is None:
+                    problems.append(f"{table} {key}: expected {want}, stored {have}")
+                    continue
+                for column, value in want.items():
+                    if isinstance(value, float) or isinstance(have[column], float):
+                        same = abs(value - have[column]) <= TOLERANCE * max(1.0, abs(value))
+                    else:
+                        same = value == have[column]
+                    if not same:
+                        problems.append(f"{table} {key} {column}: expected {value}, stored {have[column]}")
+    finally:
+        conn.rollback()
+    return problems
+
+
+def load_analytics(conn):
+    """The whole /api/analytics payload, read in a single statement."""
+    row = conn.execute("""
+        SELECT p.property_count,
+               CASE WHEN p.rent_count THEN p.total_rent END AS total_rent,
+               IFNULL((SELECT issue_count FROM status_stats WHERE status = 'In Progress'), 0) AS active_issues,
+               CASE WHEN p.cost_count THEN p.total_cost END AS total_cost,
+               (
+                   SELECT json_group_array(json_object(
+                       'category', category, 'count', issue_count,
+                       'total_cost', CASE WHEN cost_count THEN total_cost END
+                   ))
+                   FROM (SELECT * FROM category_stats ORDER BY category)
+               ) AS by_category
+        FROM portfolio_stats p
+        WHERE p.id = 1
+    """).fetchone()
+    return {
+        "total_properties": row["property_count"],
+        "total_monthly_rent": row["total_rent"],
+        "active_issues": row["active_issues"],
+        "total_maintenance_cost": row["total_cost"],
+        "issues_by_category": json.loads(row["by_category"]),
+    }
+
+
+def load_property_analytics(conn, property_id):
+    """One property's issue counts and costs, from its property_stats rows."""
+    rows = conn.execute("""
+        SELECT status, issue_count, CASE WHEN cost_count THEN total_cost END AS total_cost
+        FROM property_stats
+        WHERE property_id = ?
+        ORDER BY status
+    """, (property_id,)).fetchall()
+    total_cost = None
+    for row in rows:
+        total_cost = _add(total_cost, row["total_cost"])
+    return {
+        "total_issues": sum(row["issue_count"] for row in rows),
+        "active_issues": sum(row["issue_count"] for row in rows if row["status"] == "In Progress"),
+        "total_maintenance_cost": total_cost,
+        "issues_by_status": [{"status": row["status"], "count": row["issue_count"], "total_cost": row["total_cost"]}
+                             for row in rows],
+    }
+
+
+def _add(a, b):
+    # NULL only when every part is NULL, like SUM()
+    return b if a is None else a if b is None else a + b
+
+
+def merge_analytics(parts):
+    """The /api/analytics payload for several databases together."""
+    if len(parts) == 1:
+        return parts[0]
+    merged = {"total_properties": 0, "total_monthly_rent": None, "active_issues": 0,
+              "total_maintenance_cost": None}
+    categories = {}
+    for part in parts:
+        for key in merged:
+            merged[key] = _add(merged[key], part[key])
+        for row in part["issues_by_category"]:
+            total = categories.setdefault(row["category"], {"category": row["category"], "count": 0,
+                                                            "total_cost": None})
+            total["count"] += row["count"]
+            total["total_cost"] = _add(total["total_cost"], row["total_cost"])
+    merged["issues_by_category"] = [categories[c] for c in sorted(categories, key=lambda c: (c is not None, c))]
+    return merged
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] not in (["check"], ["rebuild"]):
+        sys.exit("usage: python aggregates.py check|rebuild")
+    import main
+    main.init_db()
+    with main.get_db() as conn:
+        if sys.argv[1] == "rebuild":
+            rebuild(conn)
+            print("Aggregates rebuilt")
+        else:
+            problems = check(conn)
+            for problem in problems:
+                print(problem)
+            print(f"{len(problems)} aggregate mismatches")
+            sys.exit(1 if problems else 0)
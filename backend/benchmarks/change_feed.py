@@ -0,0 +1,116 @@
+"""Change feed fan-out to thousands of idle subscribers.
+
+Run from backend/:  python -m benchmarks.change_feed --subscribers 1000 5000 10000 --writes 200
+
+Subscribers read the same server-sent event streams /api/changes returns,
+minus the HTTP layer. A few are owners and the rest are tenants spread over
+--properties properties. Writes go through the app's write path at a fixed
+rate, each to a random property. Reported per subscriber count:
+- memory per idle stream
+- time spent handing each change to its subscribers
+- delivery latency from commit to a stream producing the event, which
+  includes the coalescing window (CHANGE_COALESCE_MS)
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="change_bench_"))
+os.environ.setdefault("INGEST_ENABLED", "0")
+os.environ.setdefault("METRICS_ENABLED", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import changes  # noqa: E402
+import main  # noqa: E402
+
+OWNER_SHARE = 0.01
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] if ordered else float("nan")
+
+
+async def subscriber(feed, property_id, committed, latencies, received):
+    async for event in feed.stream(property_id):
+        now = time.perf_counter()
+        for line in event.split("\n"):
+            if line.startswith("id: ") and "event: change" in event:
+                latencies.append(now - committed.get(int(line[4:]), now))
+                received[0] += 1
+
+
+async def run(count, properties, writes, rate, seed):
+    main.init_db()
+    rng = random.Random(seed)
+    feed = changes.ChangeFeed(main.db)
+    await feed.start()
+    committed, latencies, received = {}, [], [0]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tasks = []
+    for _ in range(count):
+        property_id = None if rng.random() < OWNER_SHARE else f"bench_{rng.randrange(properties)}"
+        tasks.append(asyncio.create_task(subscriber(feed, property_id, committed, latencies, received)))
+    while feed.stats()["subscribers"] < count:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.2)
+    per_stream = (tracemalloc.get_traced_memory()[0] - before) / count
+    tracemalloc.stop()
+
+    dispatch = []
+    original = feed._dispatch
+
+    def timed(change):
+        started = time.perf_counter()
+        original(change)
+        dispatch.append(time.perf_counter() - started)
+
+    feed._dispatch = timed
+    interval = 1 / rate
+    for _ in range(writes):
+        property_id = f"bench_{rng.randrange(properties)}"
+        change_id = await main.db.write(_report, property_id)
+        committed[change_id] = time.perf_counter()
+        feed.notify()
+        await asyncio.sleep(interval)
+    await asyncio.sleep(changes.COALESCE_SECONDS + 0.5)
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await feed.stop()
+    expected = feed.delivered
+    latencies.sort()
+    dispatch.sort()
+    print(f"{count:>6} subscribers  {per_stream / 1024:5.1f} KiB/stream  "
+          f"fan-out p50 {percentile(dispatch, 50) * 1e6:7.1f} p99 {percentile(dispatch, 99) * 1e6:7.1f} us/change  "
+          f"delivery p50 {percentile(latencies, 50) * 1000:6.1f} p99 {percentile(latencies, 99) * 1000:6.1f} ms  "
+          f"events {received[0]}/{expected}")
+
+
+def _report(conn, property_id):
+    cursor = conn.execute(
+        "INSERT INTO maintenance_issues (property_id, category, description, date, status) VALUES (?, ?, ?, ?, ?)",
+        (property_id, "plumbing", "Benchmark report", "2024-01-01", "Open"),
+    )
+    changes.record(conn, "maintenance", "created", cursor.lastrowid, property_id)
+    return conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1000, 5000, 10000])
+    parser.add_argument("--properties", type=int, default=1000)
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=100.0, help="writes per second")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    for count in args.subscribers:
+        asyncio.run(run(count, args.properties, args.writes, args.rate, args.seed))
+    main.db.close()
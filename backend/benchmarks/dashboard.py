@@ -0,0 +1,127 @@
+"""/api/dashboard against the four requests the owner dashboard made before.
+
+Run from backend/:  python -m benchmarks.dashboard --issues 50000 --rounds 30
+
+Loads a synthetic portfolio and times a dashboard load both ways, with the
+response cache emptied before every load as after a write: one
+/api/dashboard request, and /api/properties, /api/maintenance,
+/api/documents and /api/analytics sent together, each timed until every
+body has arrived; and /api/dashboard?limit=100 for the newest lists only. It then loads both ways while new issues are written
+continuously, the separate requests one after another as a page sends
+them over a real network, and counts the loads whose analytics disagree
+with their maintenance list. Exits non-zero if /api/dashboard ever
+disagrees.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="dashboard_bench_"))
+os.environ.setdefault("INGEST_ENABLED", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks import synthetic  # noqa: E402
+
+SEPARATE = ("/api/properties", "/api/maintenance", "/api/documents", "/api/analytics")
+
+
+async def combined(client):
+    await client.get("/api/dashboard")
+
+
+async def newest(client):
+    await client.get("/api/dashboard?limit=100")
+
+
+async def separate(client):
+    await asyncio.gather(*(client.get(url) for url in SEPARATE))
+
+
+async def combined_counts(client):
+    body = (await client.get("/api/dashboard?include=maintenance,analytics&fields=maintenance.id")).json()
+    return body["maintenance"], body["analytics"]
+
+
+async def separate_counts(client):
+    maintenance = (await client.get("/api/maintenance")).json()
+    await asyncio.sleep(0.01)
+    return maintenance, (await client.get("/api/analytics")).json()
+
+
+def consistent(maintenance, analytics):
+    return len(maintenance) == sum(row["count"] for row in analytics["issues_by_category"])
+
+
+async def writer(stop):
+    def _insert(conn):
+        conn.execute("""
+            INSERT INTO maintenance_issues (property_id, category, description, date, status, cost, vendor)
+            VALUES ('bench_p', 'plumbing', 'Dripping tap', '2031-01-01', 'Open', 100, NULL)
+        """)
+    written = 0
+    while not stop.is_set():
+        await main.db.write(_insert)
+        main._changed(main.default_shard, "maintenance_issues")
+        written += 1
+        await asyncio.sleep(0.002)
+    return written
+
+
+async def run(args):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench",
+                                 timeout=None) as client:
+        for name, load in (("/api/dashboard", combined), ("4 separate requests", separate),
+                           ("/api/dashboard?limit=100", newest)):
+            await load(client)
+            timings = []
+            for _ in range(args.rounds):
+                main.response_cache.bump("properties", "maintenance_issues", "documents")
+                started = time.perf_counter()
+                await load(client)
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            print(f"  {name:<26} p50 {statistics.median(timings) * 1000:8.1f} ms"
+                  f"  p95 {timings[int(len(timings) * 0.95) - 1] * 1000:8.1f} ms")
+
+        print(f"\nwhile issues are being written ({args.rounds} loads each)")
+        failed = False
+        for name, load in (("/api/dashboard", combined_counts), ("separate requests", separate_counts)):
+            stop = asyncio.Event()
+            writing = asyncio.create_task(writer(stop))
+            mismatched = 0
+            for _ in range(args.rounds):
+                mismatched += not consistent(*await load(client))
+            stop.set()
+            written = await writing
+            print(f"  {name:<26} {mismatched:4d} inconsistent loads  ({written} issues written)")
+            failed |= name == "/api/dashboard" and mismatched > 0
+    return failed
+
+
+def main_(args):
+    main.init_db()
+    with main.get_db() as conn, main.db.untraced(conn):
+        counts = synthetic.populate(conn, args.seed, args.properties, args.issues, args.documents, 0)
+        conn.execute("INSERT INTO properties (id, address) VALUES ('bench_p', '1 Bench Rd')")
+        conn.commit()
+    print(f"{counts}\n\ndashboard load, cache emptied each time")
+    failed = asyncio.run(run(args))
+    main.db.close()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--properties", type=int, default=500)
+    parser.add_argument("--issues", type=int, default=20_000)
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    main_(parser.parse_args())
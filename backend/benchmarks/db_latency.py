@@ -0,0 +1,146 @@
+"""Concurrent-reader latency: per-request connections on the event loop vs the pooled Database.
+
+Run from backend/:  python -m benchmarks.db_latency --probes 32 --heavy-readers 2
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import Database  # noqa: E402
+
+HEAVY_SQL = """
+    SELECT m.*, p.address
+    FROM maintenance_issues m
+    JOIN properties p ON m.property_id = p.id
+    ORDER BY m.date DESC
+"""
+LIGHT_SQL = "SELECT * FROM properties WHERE id = ?"
+CATEGORIES = ["plumbing", "electrical", "painting", "gardening", "hvac", "roofing"]
+
+
+def build_database(path, properties, issues):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE properties (id TEXT PRIMARY KEY, address TEXT NOT NULL, rent_amount REAL);
+        CREATE TABLE maintenance_issues (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, property_id TEXT, category TEXT,
+            description TEXT, date TEXT, status TEXT, cost REAL, vendor TEXT, created_at TEXT
+        );
+    """)
+    rng = random.Random(7)
+    conn.executemany("INSERT INTO properties VALUES (?, ?, ?)", (
+        (f"prop_{i}", f"{i} Bench Street", rng.uniform(20000, 200000)) for i in range(properties)
+    ))
+    conn.executemany(
+        "INSERT INTO maintenance_issues (property_id, category, description, date, status, cost, vendor, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        ((
+            f"prop_{rng.randrange(properties)}", rng.choice(CATEGORIES), "Synthetic issue",
+            f"20{rng.randint(18, 24)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "Resolved", rng.uniform(100, 20000), "Bench Vendor", "2024-01-01T00:00:00",
+        ) for _ in range(issues)),
+    )
+    conn.commit()
+    conn.close()
+
+
+async def legacy_query(path, sql, params):
+    # What every handler did before: connect per request and query on the event loop
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+async def pooled_query(database, sql, params):
+    return await database.fetchall(sql, params)
+
+
+async def drive(query, heavy_readers, probes, rate, duration, properties):
+    """Point lookups arrive on a fixed schedule while heavy readers run the full join.
+
+    Probe latency is measured from the scheduled arrival time, so time spent
+    waiting for a blocked event loop is counted instead of silently omitted.
+    """
+    latencies = []
+    heavy_done = 0
+    deadline = time.perf_counter() + duration
+
+    async def heavy_reader():
+        nonlocal heavy_done
+        while time.perf_counter() < deadline:
+            await query(HEAVY_SQL, ())
+            heavy_done += 1
+            await asyncio.sleep(0)
+
+    async def probe(seed):
+        rng = random.Random(seed)
+        interval = 1 / rate
+        scheduled = time.perf_counter() + rng.random() * interval
+        while scheduled < deadline:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await query(LIGHT_SQL, (f"prop_{rng.randrange(properties)}",))
+            latencies.append(time.perf_counter() - scheduled)
+            scheduled += interval
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(heavy_reader() for _ in range(heavy_readers)),
+        *(probe(i) for i in range(probes)),
+    )
+    return latencies, heavy_done, time.perf_counter() - start
+
+
+def summarize(name, latencies, heavy_done, elapsed):
+    ordered = sorted(latencies)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+
+    print(f"{name:<7} lookups {len(ordered):>6}  p50 {pct(50):>8.2f} ms  p95 {pct(95):>8.2f} ms  "
+          f"p99 {pct(99):>8.2f} ms  mean {statistics.mean(ordered) * 1000:>8.2f} ms  "
+          f"joins {heavy_done / elapsed:>6.1f}/s")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--properties", type=int, default=2000)
+    parser.add_argument("--issues", type=int, default=50000)
+    parser.add_argument("--heavy-readers", type=int, default=2)
+    parser.add_argument("--probes", type=int, default=32)
+    parser.add_argument("--rate", type=float, default=20.0, help="lookups per second per probe")
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        build_database(path, args.properties, args.issues)
+        print(f"{args.probes} lookup readers at {args.rate:g}/s each, {args.heavy_readers} readers "
+              f"running the full maintenance join over {args.issues} issues, {args.duration:g}s")
+        workload = (args.heavy_readers, args.probes, args.rate, args.duration, args.properties)
+
+        results = await drive(lambda sql, params: legacy_query(path, sql, params), *workload)
+        summarize("before", *results)
+
+        database = Database(path)
+        try:
+            results = await drive(lambda sql, params: pooled_query(database, sql, params), *workload)
+            summarize("after", *results)
+        finally:
+            database.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,155 @@
+"""Entity resolution lookups over a large synthetic portfolio.
+
+Run from backend/:  python -m benchmarks.entities --properties 100000 --rounds 2000
+
+Loads --properties synthetic properties plus a few with distinctive names,
+builds the entity index and times the build. It then times resolve() for
+exact, prefix, typo and alias lookups and bind() for whole questions, per
+call, and checks that each finds the entity it should. Last it writes
+single properties and issues and times the catch-up from change_log that
+the next lookup pays. Exits non-zero if a lookup finds the wrong entity.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="entities_bench_"))
+os.environ.setdefault("INGEST_ENABLED", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import changes  # noqa: E402
+import entities  # noqa: E402
+import main  # noqa: E402
+from benchmarks import synthetic  # noqa: E402
+from router import VOCABULARY, tokenize  # noqa: E402
+
+NAMED = [
+    ("bench_zephyr", "12, Zephyr Court, Koramangala, Bangalore", "Innovate Solutions Pvt Ltd", "Farah Qureshi"),
+    ("bench_marigold", "4, Marigold Villas, Baner, Pune", "Northwind Traders", "Tobias Fernandes"),
+    ("bench_quayside", "88, Quayside Lofts, Worli, Mumbai", None, "Leela Banerjee"),
+]
+VENDORS = [("Voltwise Electricals", "electrical"), ("AquaFix Plumbing", "plumbing")]
+
+# (name, kind, text, expected best entity)
+LOOKUPS = [
+    ("exact place", None, "zephyr court", "place:zephyr court"),
+    ("exact tenant", None, "innovate solutions", "tenant:innovate solutions pvt ltd"),
+    ("exact vendor", None, "voltwise electricals", "vendor:voltwise electricals"),
+    ("prefix", None, "marigo", "place:marigold villas"),
+    ("prefix, two words", None, "quayside lo", "place:quayside lofts"),
+    ("typo", None, "zephir court", "place:zephyr court"),
+    ("typo, vendor", "vendor", "voltwize", "vendor:voltwise electricals"),
+    ("alias", None, "hq", "property:bench_zephyr"),
+    ("common area", "place", "koramangala", "place:koramangala"),
+]
+# (name, question, expected mentions); category words are the router's own vocabulary, never mentions
+QUESTIONS = [
+    ("place", "any electrical complaints at zephyr court", {"place:zephyr court"}),
+    ("tenant", "when does the lease for northwind traders end", {"tenant:northwind traders"}),
+    ("vendor, typo", "how much did we pay voltwize this year", {"vendor:voltwise electricals"}),
+    ("alias", "open plumbing issues at hq", {"property:bench_zephyr"}),
+    ("two entities", "issues at quayside lofts fixed by aquafix", {"place:quayside lofts", "vendor:aquafix plumbing"}),
+]
+
+
+def _key(entity):
+    return f"{entity['kind']}:{entity['id']}"
+
+
+def timed(call, rounds):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return statistics.median(timings) * 1e6, timings[int(len(timings) * 0.99) - 1] * 1e6
+
+
+def populate(conn, args):
+    counts = synthetic.populate(conn, args.seed, args.properties, args.issues, 0, 0)
+    conn.executemany("INSERT INTO properties (id, address, tenant_name, landlord_name) VALUES (?, ?, ?, ?)", NAMED)
+    conn.executemany("""
+        INSERT INTO maintenance_issues (property_id, category, description, date, status, cost, vendor)
+        VALUES ('bench_zephyr', ?, 'Bench issue', '2031-01-01', 'Open', 100, ?)
+    """, [(category, vendor) for vendor, category in VENDORS])
+    conn.execute("INSERT INTO entity_aliases (alias, kind, entity_key) VALUES ('HQ', 'property', 'bench_zephyr')")
+    conn.commit()
+    return counts
+
+
+def main_(args):
+    main.init_db()
+    failed = False
+    with main.get_db() as conn, main.db.untraced(conn):
+        print(populate(conn, args))
+        index = entities.EntityIndex()
+        started = time.perf_counter()
+        index.refresh(conn)
+        print(f"build          {(time.perf_counter() - started) * 1000:8.1f} ms  {index.stats()}")
+
+        print(f"\nresolve(), per call ({args.rounds} rounds)")
+        for name, kind, text, expected in LOOKUPS:
+            kinds = None if kind is None else {kind}
+            found = [_key(entity) for entity in index.resolve(text, kinds, 5)]
+            p50, p99 = timed(lambda: index.resolve(text, kinds, 5), args.rounds)
+            ok = bool(found) and found[0] == expected
+            failed |= not ok
+            print(f"  {name:<20} {text!r:<26} p50 {p50:8.1f} us  p99 {p99:8.1f} us  "
+                  f"{'ok' if ok else 'WRONG ' + str(found[:3])}")
+
+        print(f"\nbind(), per question ({args.rounds} rounds)")
+        for name, question, expected in QUESTIONS:
+            words = tokenize(question)
+            found = {_key(mention) for mention in index.bind(words, VOCABULARY)}
+            p50, p99 = timed(lambda: index.bind(words, VOCABULARY), args.rounds)
+            ok = found == expected
+            failed |= not ok
+            print(f"  {name:<20} p50 {p50:8.1f} us  p99 {p99:8.1f} us  {'ok' if ok else 'WRONG ' + str(found)}")
+
+        print(f"\ncatch up after one write ({args.writes} writes each)")
+        for name, write in (("property created", _write_property), ("issue created", _write_issue)):
+            timings = []
+            for i in range(args.writes):
+                write(conn, i)
+                conn.commit()
+                started = time.perf_counter()
+                index.refresh(conn)
+                timings.append(time.perf_counter() - started)
+            print(f"  {name:<20} p50 {statistics.median(timings) * 1e6:8.1f} us  {index.stats()['reloads']} reloads")
+        for text, kind, expected in (("ultramarine house", "place", "place:ultramarine house"),
+                                     (f"bench vendor {args.writes - 1}", "vendor",
+                                      f"vendor:bench vendor {args.writes - 1}")):
+            found = [_key(entity) for entity in index.resolve(text, {kind}, 1)]
+            ok = found == [expected]
+            failed |= not ok
+            print(f"  {text!r:<26} {'ok' if ok else 'WRONG ' + str(found)}")
+    main.db.close()
+    sys.exit(1 if failed else 0)
+
+
+def _write_property(conn, i):
+    conn.execute("INSERT INTO properties (id, address, tenant_name) VALUES (?, ?, 'Bench Tenant')",
+                 (f"bench_new_{i}", f"{i + 1}, Ultramarine House, Baner, Pune"))
+    changes.record(conn, "properties", "created", f"bench_new_{i}", f"bench_new_{i}")
+
+
+def _write_issue(conn, i):
+    cursor = conn.execute("""
+        INSERT INTO maintenance_issues (property_id, category, description, date, status, cost, vendor)
+        VALUES ('bench_zephyr', 'carpentry', 'Bench issue', '2031-01-01', 'Open', 100, ?)
+    """, (f"Bench Vendor {i}",))
+    changes.record(conn, "maintenance", "created", cursor.lastrowid, "bench_zephyr")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--properties", type=int, default=100_000)
+    parser.add_argument("--issues", type=int, default=20_000)
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--writes", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    main_(parser.parse_args())
@@ -0,0 +1,111 @@
+"""Bulk import rows per second at growing sizes, through the importer or the HTTP endpoint.
+
+Run from backend/:  python -m benchmarks.import_throughput --rows 10000 100000 1000000 [--http]
+
+Each size imports fresh rows into the same scratch database, so later sizes
+also pay for the indexes, search index and aggregates of everything before
+them. --baseline times the old one-INSERT-one-commit path for comparison.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="import_bench_"))
+os.environ.setdefault("INGEST_ENABLED", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+import importer  # noqa: E402
+import main  # noqa: E402
+
+CATEGORIES = ["plumbing", "electrical", "painting", "gardening", "hvac", "roofing"]
+STATUSES = ["Open", "In Progress", "Resolved"]
+
+
+def property_lines(prefix, count):
+    rng = random.Random(count)
+    yield "id,address,type,rent_amount,lease_start_date,lease_end_date,landlord_name\n"
+    for i in range(count):
+        yield (f'{prefix}_{i},"{i} Bench Street, Pune",Residential,{rng.randint(10000, 200000)},'
+               f"2024-01-01,2025-{rng.randint(1, 12):02d}-28,Bench Owner\n")
+
+
+def maintenance_lines(prefix, count):
+    rng = random.Random(count)
+    yield "source_key,property_id,category,description,date,status,cost,vendor\n"
+    for i in range(count):
+        yield (f"{prefix}-{i},{prefix}_{i % 5000},{rng.choice(CATEGORIES)},Work order {i} for unit {i % 97},"
+               f"20{rng.randint(15, 24)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d},"
+               f"{rng.choice(STATUSES)},{rng.randint(100, 50000)},Vendor {i % 40}\n")
+
+
+GENERATORS = {"properties": property_lines, "maintenance": maintenance_lines}
+
+
+def run_direct(kind, lines):
+    with main.get_db() as conn, main.db.untraced(conn):
+        return importer.import_rows(conn, kind, lines, "csv")
+
+
+async def run_http(kind, lines):
+    async def body():
+        batch = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) == 1000:
+                yield "".join(batch).encode()
+                batch = []
+        yield "".join(batch).encode()
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        response = await client.post(f"/api/import?kind={kind}&format=csv", content=body())
+        response.raise_for_status()
+        return response.json()
+
+
+def run_baseline(kind, lines):
+    # What onboarding did before: one INSERT and one commit per row
+    entity = importer.ENTITIES[kind]
+    records = importer.read_rows(lines, "csv")
+    with main.get_db() as conn:
+        for _, record in records:
+            with conn:
+                conn.execute(entity.sql, entity.parse(record))
+
+
+def main_(sizes, kinds, http, baseline):
+    main.init_db()
+    for kind in kinds:
+        for n, count in enumerate(sizes):
+            lines = GENERATORS[kind](f"{kind[:4]}{n}", count)
+            start = time.perf_counter()
+            if http:
+                report = asyncio.run(run_http(kind, lines))
+            else:
+                report = run_direct(kind, lines).as_dict()
+            elapsed = time.perf_counter() - start
+            assert report["rejected"] == 0, report["errors"][:5]
+            print(f"{kind:<12} {count:>9,} rows  {elapsed:>8.2f} s  {count / elapsed:>10,.0f} rows/s"
+                  + ("  (http)" if http else ""))
+        if baseline:
+            count = min(sizes)
+            start = time.perf_counter()
+            run_baseline(kind, GENERATORS[kind](f"{kind[:4]}b", count))
+            elapsed = time.perf_counter() - start
+            print(f"{kind:<12} {count:>9,} rows  {elapsed:>8.2f} s  {count / elapsed:>10,.0f} rows/s  (row at a time)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--kinds", nargs="+", choices=sorted(GENERATORS), default=["properties", "maintenance"])
+    parser.add_argument("--http", action="store_true", help="stream CSV through POST /api/import")
+    parser.add_argument("--baseline", action="store_true", help="also time one commit per row at the smallest size")
+    args = parser.parse_args()
+    main_(args.rows, args.kinds, args.http, args.baseline)
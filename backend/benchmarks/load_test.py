@@ -0,0 +1,294 @@
+"""Mixed read/write load test against the in-process app, with JSON results for regression gating.
+
+Requests go through an ASGI transport with no network, against a scratch
+database filled by benchmarks.synthetic. Each virtual user issues requests
+back to back, picking an operation by the workload's weights from its own
+seeded RNG, so a run is repeatable for a given seed. Latency includes the
+in-process client, which runs on the same event loop as the app.
+
+Run from backend/:
+    python -m benchmarks.load_test --concurrency 1 8 32 --duration 15 --out results.json
+    python -m benchmarks.load_test --compare baseline.json --max-regression 0.2
+
+With --compare the run exits non-zero when any endpoint's p95 or p99 grows,
+or its throughput drops, by more than --max-regression against the baseline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="load_test_"))
+os.environ.setdefault("INGEST_ENABLED", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks import synthetic  # noqa: E402
+
+SEARCH_TERMS = ["leakage", "geyser", "termite", "invoice", "paint", "compressor", "lease", "cctv"]
+QUERIES = [
+    "plumbing issues at galaxy heights", "which leases expire soon", "maintenance cost in 2024",
+    "triple net properties", "recurring issues", "overview", "electrical issues since 2023",
+]
+STATUSES = ["Open", "In Progress", "Resolved"]
+# Endpoints with fewer samples than this are reported but not gated
+MIN_GATED_SAMPLES = 50
+
+
+class State:
+    """What the virtual users know about the data: ids to pick from and ETags they've seen."""
+
+    def __init__(self, properties, issues):
+        self.properties = properties
+        self.issues = issues
+        self.etags = {}
+        self.created = 0
+
+    def property_id(self, rng):
+        return f"syn_{rng.randrange(self.properties):06d}"
+
+
+def _get(url):
+    return lambda rng, state: ("GET", url, {})
+
+
+def _property(rng, state):
+    return "GET", f"/api/properties/{state.property_id(rng)}", {}
+
+
+def _maintenance_page(rng, state):
+    return "GET", f"/api/maintenance?limit=50&property_id={state.property_id(rng)}", {}
+
+
+def _maintenance_status(rng, state):
+    return "GET", f"/api/maintenance?limit=100&status={rng.choice(STATUSES)}", {}
+
+
+def _conditional_analytics(rng, state):
+    # A dashboard refresh revalidating what it already has
+    etag = state.etags.get("/api/analytics")
+    return "GET", "/api/analytics", {"headers": {"If-None-Match": etag} if etag else {}}
+
+
+def _search(rng, state):
+    return "GET", f"/api/search?q={rng.choice(SEARCH_TERMS)}&limit=20", {}
+
+
+def _query(rng, state):
+    return "POST", "/api/query", {"json": {"query": rng.choice(QUERIES)}}
+
+
+def _report_issue(rng, state):
+    return "POST", "/api/maintenance", {"json": {
+        "property_id": state.property_id(rng), "category": rng.choice(synthetic.CATEGORIES)[0],
+        "description": "Load test issue",
+    }}
+
+
+def _update_status(rng, state):
+    return "PUT", f"/api/maintenance/{rng.randint(1, state.issues)}/status", {"json": {"status": rng.choice(STATUSES)}}
+
+
+def _onboard(rng, state):
+    state.created += 1
+    return "POST", "/api/tenants", {"json": {
+        "username": f"load_{os.getpid()}_{state.created}", "password": "x", "name": "Load Test",
+        "property_id": state.property_id(rng), "rent_amount": rng.randint(10000, 90000),
+        "lease_start": "2025-01-01", "lease_end": "2026-01-01",
+    }}
+
+
+def _upload(rng, state):
+    body = f"Invoice No: LT-{rng.getrandbits(48):x} Grand Total: Rs. {rng.randint(500, 90000)}".encode()
+    return "POST", f"/api/upload?property_id={state.property_id(rng)}", {
+        "files": {"file": ("invoice.txt", body, "text/plain")},
+    }
+
+
+# (name, builder) for every operation; workloads weight them
+OPERATIONS = {
+    "GET /api/properties": _get("/api/properties"),
+    "GET /api/properties/{id}": _property,
+    "GET /api/maintenance?property_id": _maintenance_page,
+    "GET /api/maintenance?status": _maintenance_status,
+    "GET /api/documents?limit": _get("/api/documents?limit=50"),
+    "GET /api/analytics": _get("/api/analytics"),
+    "GET /api/analytics (If-None-Match)": _conditional_analytics,
+    "GET /api/search": _search,
+    "POST /api/query": _query,
+    "POST /api/maintenance": _report_issue,
+    "PUT /api/maintenance/{id}/status": _update_status,
+    "POST /api/tenants": _onboard,
+    "POST /api/upload": _upload,
+}
+READS = {
+    "GET /api/properties": 10, "GET /api/properties/{id}": 20, "GET /api/maintenance?property_id": 15,
+    "GET /api/maintenance?status": 5, "GET /api/documents?limit": 5, "GET /api/analytics": 10,
+    "GET /api/analytics (If-None-Match)": 15, "GET /api/search": 10, "POST /api/query": 10,
+}
+WRITES = {"POST /api/maintenance": 4, "PUT /api/maintenance/{id}/status": 4, "POST /api/tenants": 1, "POST /api/upload": 1}
+WORKLOADS = {
+    "read": READS,
+    "mixed": {**READS, **{name: weight * 2.5 for name, weight in WRITES.items()}},
+    "write": WRITES,
+}
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def summarize(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    if not ordered:
+        return {"requests": 0, "errors": errors}
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / elapsed, 2),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+async def run_level(client, state, weights, concurrency, duration, warmup, seed):
+    names = list(weights)
+    cumulative = [weights[n] for n in names]
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    measure_from = time.perf_counter() + warmup
+    deadline = measure_from + duration
+
+    async def user(index):
+        rng = random.Random(seed * 1000 + index)
+        while True:
+            name = rng.choices(names, weights=cumulative)[0]
+            method, url, kwargs = OPERATIONS[name](rng, state)
+            start = time.perf_counter()
+            if start >= deadline:
+                return
+            try:
+                response = await client.request(method, url, **kwargs)
+                failed = response.status_code >= 400 and response.status_code != 404
+                if response.status_code == 200 and "etag" in response.headers:
+                    state.etags[url] = response.headers["etag"]
+            except httpx.HTTPError:
+                failed = True
+            if start >= measure_from:
+                latencies[name].append(time.perf_counter() - start)
+                errors[name] += failed
+
+    await asyncio.gather(*(user(i) for i in range(concurrency)))
+    endpoints = {name: summarize(latencies[name], errors[name], duration) for name in names if latencies[name]}
+    overall = summarize([x for values in latencies.values() for x in values], sum(errors.values()), duration)
+    return {"concurrency": concurrency, "overall": overall, "endpoints": endpoints}
+
+
+def compare(results, baseline, max_regression):
+    """Print the change against ``baseline`` per endpoint; returns the list of regressions."""
+    regressions = []
+    base_runs = {run["concurrency"]: run for run in baseline["runs"]}
+    for run in results["runs"]:
+        base = base_runs.get(run["concurrency"])
+        if base is None:
+            continue
+        print(f"\nconcurrency {run['concurrency']} vs baseline")
+        for name, now in run["endpoints"].items():
+            then = base["endpoints"].get(name)
+            if not then or min(now["requests"], then["requests"]) < MIN_GATED_SAMPLES:
+                continue
+            changes = {
+                "p95": now["p95_ms"] / then["p95_ms"] - 1,
+                "p99": now["p99_ms"] / then["p99_ms"] - 1,
+                "throughput": then["throughput_rps"] / now["throughput_rps"] - 1,
+            }
+            worst = max(changes, key=changes.get)
+            flag = "REGRESSION" if changes[worst] > max_regression else ""
+            print(f"  {name:<38} p95 {changes['p95']:>+7.1%}  p99 {changes['p99']:>+7.1%}  "
+                  f"rps {now['throughput_rps'] / then['throughput_rps'] - 1:>+7.1%}  {flag}")
+            if flag:
+                regressions.append((run["concurrency"], name, worst, changes[worst]))
+    return regressions
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+async def main_(args):
+    main.init_db()
+    with main.get_db() as conn, main.db.untraced(conn):
+        started = time.perf_counter()
+        counts = synthetic.populate(conn, args.seed, args.properties, args.issues, args.documents, args.users)
+        issues = conn.execute("SELECT MAX(id) FROM maintenance_issues").fetchone()[0]
+    print(f"synthetic portfolio {counts} loaded in {time.perf_counter() - started:.1f}s")
+
+    state = State(args.properties, issues)
+    results = {
+        "meta": {
+            "workload": args.workload, "seed": args.seed, "duration_s": args.duration, "warmup_s": args.warmup,
+            "properties": args.properties, "issues": args.issues, "documents": args.documents, "users": args.users,
+            "revision": _git_revision(), "python": platform.python_version(), "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "runs": [],
+    }
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=None) as client:
+        for concurrency in args.concurrency:
+            run = await run_level(client, state, WORKLOADS[args.workload], concurrency, args.duration,
+                                  args.warmup, args.seed)
+            results["runs"].append(run)
+            overall = run["overall"]
+            print(f"\nconcurrency {concurrency}: {overall['throughput_rps']:.1f} req/s  "
+                  f"p50 {overall['p50_ms']:.2f}  p95 {overall['p95_ms']:.2f}  p99 {overall['p99_ms']:.2f} ms  "
+                  f"errors {overall['errors']}")
+            for name, stats in sorted(run["endpoints"].items()):
+                print(f"  {name:<38} {stats['requests']:>7}  {stats['throughput_rps']:>8.1f}/s  "
+                      f"p50 {stats['p50_ms']:>8.2f}  p95 {stats['p95_ms']:>8.2f}  p99 {stats['p99_ms']:>8.2f} ms"
+                      + (f"  errors {stats['errors']}" if stats["errors"] else ""))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workload", choices=sorted(WORKLOADS), default="mixed")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--properties", type=int, default=1000)
+    parser.add_argument("--issues", type=int, default=20000)
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline results JSON to gate against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = asyncio.run(main_(args))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print(f"\n{len(regressions)} regressions beyond {args.max_regression:.0%}")
+            sys.exit(1)
@@ -0,0 +1,79 @@
+"""Rent-roll projection time for a large portfolio, checked against a per-lease loop.
+
+Run from backend/:  python -m benchmarks.rentroll --properties 100000 --months 60
+
+The cold run includes loading lease terms into arrays; warm runs reuse them,
+as requests do until a property write invalidates them.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="rentroll_bench_"))
+os.environ.setdefault("INGEST_ENABLED", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+import rentroll  # noqa: E402
+from benchmarks import synthetic  # noqa: E402
+
+
+def reference(conn, months, as_of, escalation_pct):
+    """Contracted rent, vacancy exposure and expiries per month, one lease at a time."""
+    first = rentroll.month_number(as_of)
+    rate = 1 + escalation_pct / 100
+    contracted, exposure, expiring = [0.0] * months, [0.0] * months, [0] * months
+    for start, end, rent in conn.execute("SELECT lease_start_date, lease_end_date, IFNULL(rent_amount, 0) FROM properties"):
+        s = rentroll.month_number(start) if start else None
+        e = rentroll.month_number(end) if end else None
+        for i in range(months):
+            month = first + i
+            if s is not None and e is not None and s <= month <= e:
+                steps = max(0, (month - s) // 12 - (max(first, s) - s) // 12)
+                contracted[i] += rent * rate ** steps
+            else:
+                exposure[i] += rent
+            expiring[i] += s is not None and e == month
+    return contracted, exposure, expiring
+
+
+def main_(args):
+    main.init_db()
+    with main.get_db() as conn, main.db.untraced(conn):
+        started = time.perf_counter()
+        synthetic.populate(conn, args.seed, args.properties, 0, 0, 0)
+        print(f"{args.properties:,} properties loaded in {time.perf_counter() - started:.1f}s")
+
+        roll = rentroll.RentRoll()
+        started = time.perf_counter()
+        result = roll.project(conn, args.months, args.as_of)
+        print(f"cold  {(time.perf_counter() - started) * 1000:8.1f} ms  ({result['leases']:,} leases, "
+              f"{args.months} months)")
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            roll.project(conn, args.months, args.as_of)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        print(f"warm  {timings[len(timings) // 2] * 1000:8.1f} ms median, {timings[-1] * 1000:.1f} ms max")
+
+        if args.verify:
+            contracted, exposure, expiring = reference(conn, args.months, args.as_of, result["escalation_pct"])
+            mismatches = [
+                row["month"] for row, c, x, n in zip(result["monthly"], contracted, exposure, expiring)
+                if abs(row["contracted_rent"] - c) > 1 or abs(row["vacancy_exposure"] - x) > 1 or row["expiring"] != n
+            ]
+            print(f"per-lease loop: {len(mismatches)} months differ" + (f" {mismatches[:5]}" if mismatches else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--properties", type=int, default=100_000)
+    parser.add_argument("--months", type=int, default=60)
+    parser.add_argument("--as-of", default=synthetic.TODAY.strftime("%Y-%m"))
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-verify", dest="verify", action="store_false")
+    main_(parser.parse_args())
@@ -0,0 +1,142 @@
+"""Maintenance cost rollups on the columnar snapshot, checked against SQL.
+
+Run from backend/:  python -m benchmarks.rollup --issues 200000 --scale 10000000
+
+Loads --issues synthetic issues and times the snapshot's cold load. It then
+checks a few rollups against GROUP BY queries and np.percentile, and checks
+that catching up after updates and inserts matches a fresh load. Query
+times are measured on the snapshot tiled in memory to --scale rows, since
+importing ten million issues through SQLite takes far longer than querying
+them.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="rollup_bench_"))
+os.environ.setdefault("INGEST_ENABLED", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+import changes  # noqa: E402
+import main  # noqa: E402
+import rollup  # noqa: E402
+from benchmarks import synthetic  # noqa: E402
+
+QUERIES = [
+    ("cost per property per month", dict(group_by=["property"], bucket="month", metrics=["count", "sum"])),
+    ("p90 repair cost by category", dict(group_by=["category"], metrics=["count", "avg", "p50", "p90"])),
+    ("vendor spend jumps by quarter", dict(group_by=["vendor"], bucket="quarter", metrics=["sum"], anomaly_z=2.0,
+                                          order_by="cost_z", limit=20)),
+    ("plumbing in 2024 by property", dict(group_by=["property"], metrics=["count", "avg", "p90"],
+                                          filters={"category": "plumbing"}, date_from="2024-01-01",
+                                          date_to="2024-12-31")),
+    ("issues by status", dict(group_by=["status"], metrics=["count"])),
+]
+
+
+def tiled(snapshot, rows):
+    """``snapshot`` repeated to ``rows`` rows, costs jittered so the copies don't tie."""
+    times = -(-rows // len(snapshot))
+
+    def tile(array):
+        return np.tile(array, times)[:rows]
+
+    cost = tile(snapshot.cost) * np.random.default_rng(0).uniform(0.9, 1.1, rows)
+    cost_bin = tile(snapshot.cost_bin)
+    cost_bin[cost_bin != rollup.NO_COST] = np.searchsorted(rollup.BIN_EDGES, cost[cost_bin != rollup.NO_COST],
+                                                           side="right")
+    counts = np.bincount(cost_bin, minlength=rollup.BINS)
+    return rollup.Snapshot(np.arange(1, rows + 1), {d: tile(c) for d, c in snapshot.codes.items()}, snapshot.labels,
+                           tile(snapshot.day), tile(snapshot.month), cost, cost_bin,
+                           np.argsort(cost_bin, kind="stable"), np.concatenate(([0], np.cumsum(counts))),
+                           np.zeros(0, dtype=np.int64), snapshot.undated * times, snapshot.uncosted * times)
+
+def verify(conn, snapshot):
+    problems = 0
+    got = rollup.rollup([snapshot], ["category"], "month", ["count", "sum"], limit=rollup.MAX_ROWS)["rows"]
+    want = conn.execute("""
+        SELECT category, substr(date, 1, 7) AS bucket, COUNT(*), SUM(cost) FROM maintenance_issues
+        WHERE date GLOB '[0-9][0-9][0-9][0-9]-[0-1][0-9]-[0-3][0-9]*'
+        GROUP BY category, bucket
+    """).fetchall()
+    expected = {(r[0], r[1]): (r[2], r[3]) for r in want}
+    for row in got:
+        count, total = expected.pop((row["category"], row["bucket"]), (None, None))
+        if count != row["count"] or (total is None) != (row["sum"] is None) or \
+                (total is not None and abs(total - row["sum"]) > 0.01):
+            problems += 1
+    problems += len(expected)
+    got = rollup.rollup([snapshot], ["category"], None, ["p50", "p90", "min", "max"])["rows"]
+    for row in got:
+        costs = np.array([r[0] for r in conn.execute(
+            "SELECT cost FROM maintenance_issues WHERE category IS ? AND cost IS NOT NULL", (row["category"],))])
+        for metric, q in (("p50", 50), ("p90", 90), ("min", 0), ("max", 100)):
+            want = round(float(np.percentile(costs, q)), 2) if len(costs) else None
+            problems += want != row[metric]
+    return problems
+
+
+def main_(args):
+    main.init_db()
+    with main.get_db() as conn, main.db.untraced(conn):
+        started = time.perf_counter()
+        synthetic.populate(conn, args.seed, args.properties, args.issues, 0, 0)
+        print(f"{args.issues:,} issues loaded in {time.perf_counter() - started:.1f}s")
+
+        columns = rollup.MaintenanceColumns()
+        started = time.perf_counter()
+        snapshot = columns.snapshot(conn)
+        stats = columns.stats()
+        print(f"cold snapshot  {(time.perf_counter() - started) * 1000:8.1f} ms  "
+              f"{stats['bytes'] / max(stats['rows'], 1):.0f} bytes/issue")
+        print(f"against SQL: {verify(conn, snapshot)} mismatches")
+
+        # Catch up after a few hundred updates and inserts, then compare with a fresh load
+        ids = [r[0] for r in conn.execute("SELECT id FROM maintenance_issues ORDER BY random() LIMIT 300")]
+        with conn:
+            for i, issue_id in enumerate(ids):
+                conn.execute("UPDATE maintenance_issues SET status = 'Resolved', cost = cost + ? WHERE id = ?",
+                             (i, issue_id))
+                changes.record(conn, "maintenance", "updated", issue_id)
+            for i in range(300):
+                cursor = conn.execute(
+                    "INSERT INTO maintenance_issues (property_id, category, vendor, date, status, cost) "
+                    "VALUES ('bench', 'plumbing', 'AquaPlumb', '2025-06-01', 'Open', ?)", (i * 10.0,))
+                changes.record(conn, "maintenance", "created", cursor.lastrowid, "bench")
+        started = time.perf_counter()
+        caught_up = columns.snapshot(conn)
+        print(f"catch up       {(time.perf_counter() - started) * 1000:8.1f} ms  "
+              f"(300 updates, 300 inserts, {columns.reloads} reloads)")
+        fresh = rollup.MaintenanceColumns().snapshot(conn)
+        same = all(
+            rollup.rollup([caught_up], ["property", "status"], "month", ["count", "sum", "p90"],
+                          limit=rollup.MAX_ROWS) ==
+            rollup.rollup([fresh], ["property", "status"], "month", ["count", "sum", "p90"], limit=rollup.MAX_ROWS)
+            for _ in range(1))
+        print(f"caught-up snapshot {'matches' if same else 'DIFFERS FROM'} a fresh load")
+
+    big = tiled(snapshot, args.scale)
+    print(f"\n{args.scale:,} issues in memory")
+    for name, query in QUERIES:
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = rollup.rollup([big], **query)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        print(f"  {name:<32} {timings[len(timings) // 2] * 1000:8.1f} ms median  "
+              f"{timings[-1] * 1000:8.1f} ms max  {result['groups']:,} groups")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--properties", type=int, default=2000)
+    parser.add_argument("--issues", type=int, default=200_000)
+    parser.add_argument("--scale", type=int, default=10_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    main_(parser.parse_args())
@@ -0,0 +1,137 @@
+"""Small writes in one portfolio while another portfolio bulk-imports.
+
+Run from backend/:  python -m benchmarks.shard_isolation --duration 10
+
+One worker process posts maintenance reports for a property of portfolio
+"small"; another keeps importing --rows maintenance rows per request into
+portfolio "bulk". Both go through the app in-process, like uvicorn workers
+sharing a data directory. Runs once on a single database (DB_SHARDING=0)
+and once with each portfolio in its own file (DB_SHARDING=1), and reports
+the small writer's latency and both sides' throughput. On one database the
+import's write transactions hold the only write lock the small writer needs.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _environ(data_dir, sharded):
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["DB_SHARDING"] = "1" if sharded else "0"
+    os.environ["INGEST_ENABLED"] = "0"
+    os.environ["METRICS_ENABLED"] = "0"
+
+
+def _portfolio(name, sharded):
+    return f"&portfolio={name}" if sharded else ""
+
+
+def setup(data_dir, sharded):
+    _environ(data_dir, sharded)
+    import asyncio
+
+    import httpx
+
+    import main
+
+    main.init_db()
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name in ("small", "bulk"):
+                if sharded:
+                    await main.shard_router.create_portfolio(name)
+                response = await client.post(f"/api/import?kind=properties{_portfolio(name, sharded)}",
+                                             content=f"id,address\n{name}_1,1 {name} St\n".encode())
+                response.raise_for_status()
+        await main.shard_router.close()
+
+    asyncio.run(run())
+    main.db.close()
+
+
+def worker(role, data_dir, sharded, rows, start_at, duration, results):
+    _environ(data_dir, sharded)
+    import asyncio
+
+    import httpx
+
+    import main
+
+    async def run():
+        latencies, written, errors = [], 0, 0
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            await asyncio.sleep(max(0.0, start_at - time.time()))
+            deadline = time.perf_counter() + duration
+            batch = 0
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                if role == "small":
+                    request = client.post("/api/maintenance", json={
+                        "property_id": "small_1", "category": "plumbing", "description": "Benchmark report",
+                    })
+                else:
+                    batch += 1
+                    body = "property_id,category,description,date\n" + "".join(
+                        f"bulk_1,hvac,Imported {batch}-{n},2024-01-01\n" for n in range(rows))
+                    request = client.post(f"/api/import?kind=maintenance{_portfolio('bulk', sharded)}",
+                                          content=body.encode())
+                try:
+                    response = await request
+                    failed = response.status_code >= 400
+                except Exception:
+                    failed = True
+                latencies.append(time.perf_counter() - started)
+                errors += failed
+                written += 0 if failed else (1 if role == "small" else rows)
+        await main.shard_router.close()
+        return role, latencies, written, errors
+
+    results.put(asyncio.run(run()))
+    main.db.close()
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] if ordered else float("nan")
+
+
+def run(sharded, rows, duration):
+    data_dir = tempfile.mkdtemp(prefix="shard_bench_")
+    context = multiprocessing.get_context("spawn")
+    process = context.Process(target=setup, args=(data_dir, sharded))
+    process.start()
+    process.join()
+    results = context.Queue()
+    start_at = time.time() + 5
+    processes = [context.Process(target=worker, args=(role, data_dir, sharded, rows, start_at, duration, results))
+                 for role in ("small", "bulk")]
+    for process in processes:
+        process.start()
+    outcome = {}
+    for _ in processes:
+        role, latencies, written, errors = results.get()
+        outcome[role] = (sorted(latencies), written, errors)
+    for process in processes:
+        process.join()
+    small, small_written, small_errors = outcome["small"]
+    _, bulk_written, bulk_errors = outcome["bulk"]
+    mode = "sharded" if sharded else "single db"
+    print(f"{mode:<9}  small writes {small_written / duration:>7.1f}/s  "
+          f"p50 {percentile(small, 50) * 1000:>7.1f}  p99 {percentile(small, 99) * 1000:>7.1f} ms  "
+          f"imported {bulk_written / duration:>8.0f} rows/s  errors {small_errors + bulk_errors}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000, help="rows per import request")
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+    for sharded in (False, True):
+        run(sharded, args.rows, args.duration)
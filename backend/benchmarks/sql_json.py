@@ -0,0 +1,167 @@
+"""List responses encoded by SQLite (sqljson) against the dict + json.dumps path.
+
+Run from backend/:  python -m benchmarks.sql_json --issues 200000
+
+Loads a synthetic portfolio plus a few rows with awkward values: quotes,
+control characters, non-ASCII text, and REALs that SQLite prints differently
+from Python. It then checks that every list query gives byte-identical
+bodies and the same next cursor both ways. The queries cover whole lists,
+pages, filters, a merge of several pages as across shards, and the
+endpoints through the app. Finally it reports rows serialized per second
+on each path.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="sql_json_bench_"))
+os.environ.setdefault("INGEST_ENABLED", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+import main  # noqa: E402
+import sqljson  # noqa: E402
+from benchmarks import synthetic  # noqa: E402
+
+AWKWARD_TEXT = ['He said "fix it"\\now', "line\nbreak\ttab\r\x01\x1f", "नमस्ते ✓ 🏠", "</script>", ""]
+AWKWARD_COSTS = [0.0, 4500.0, 1234567.89, 0.5, 99999999999999.0]
+# REALs json_object prints differently: too many digits, too large, too small
+INEXACT_COSTS = [0.1 + 0.2, 1e15, 1e-5]
+
+
+def add_awkward(conn):
+    with conn:
+        for i, text in enumerate(AWKWARD_TEXT):
+            conn.execute("INSERT INTO properties (id, address, type, rent_amount) VALUES (?, ?, ?, ?)",
+                         (f"awkward_{i}", text, None, i * 1000.5))
+            conn.execute("""
+                INSERT INTO maintenance_issues (property_id, category, description, date, status, cost, vendor)
+                VALUES (?, 'awkward', ?, '2030-01-01', 'Open', ?, NULL)
+            """, (f"awkward_{i}", text, AWKWARD_COSTS[i]))
+        for cost in INEXACT_COSTS:
+            conn.execute("""
+                INSERT INTO maintenance_issues (property_id, category, description, date, status, cost, vendor)
+                VALUES ('awkward_0', 'inexact', 'Odd cost', '1990-01-01', 'Disputed', ?, NULL)
+            """, (cost,))
+
+
+def python_body(listing, conn, filters, cursor=None, limit=None):
+    rows, next_cursor = listing.page(conn, filters, cursor, limit)
+    return JSONResponse(rows).body, next_cursor
+
+
+def verify(conn):
+    problems, fallbacks, checked = 0, 0, 0
+    cases = []
+    for listing, filter_sets in (
+        (main.MAINTENANCE_LISTING, [{}, {"category": "plumbing"}, {"status": "Open"}, {"category": "awkward"},
+                                    {"category": "inexact"}, {"property_id": "awkward_0"}]),
+        (main.DOCUMENTS_LISTING, [{}, {"category": "invoice"}]),
+    ):
+        for filters in filter_sets:
+            cases.append((listing, filters, None))
+            # Walk a few pages by cursor
+            cursor = None
+            for _ in range(3):
+                cases.append((listing, filters, (cursor, 250)))
+                cursor = python_body(listing, conn, filters, cursor, 250)[1]
+                if cursor is None:
+                    break
+    for listing, filters, paging in cases:
+        cursor, limit = paging or (None, None)
+        want = python_body(listing, conn, filters, cursor, limit)
+        got = listing.page_json(conn, filters, cursor, limit)
+        checked += 1
+        if got is None:
+            fallbacks += 1
+            # Falling back is only right when a row really has a REAL json_object prints differently
+            problems += not any(isinstance(row.get("cost"), float) and row["cost"] in INEXACT_COSTS
+                                for row in listing.page(conn, filters, cursor, limit)[0])
+        elif got != want:
+            problems += 1
+            print(f"  differs: {listing.name} {filters} {paging}")
+
+    # Pages of disjoint filters merge like pages of several shards
+    listing = main.MAINTENANCE_LISTING
+    parts = [{"status": "Open"}, {"status": "Resolved"}, {"status": "In Progress"}]
+    for limit in (None, 100):
+        want = listing.merge([listing.page(conn, f, None, limit) for f in parts], limit)
+        got = listing.merge_json([listing.page_json(conn, f, None, limit, keyed=True) for f in parts], limit)
+        checked += 1
+        problems += got != (JSONResponse(want[0]).body, want[1])
+
+    arrays = [sqljson.array(conn, "SELECT * FROM properties WHERE id LIKE ?", (pattern,)) for pattern in ("a%", "m%")]
+    want = [dict(r) for pattern in ("a%", "m%")
+            for r in conn.execute("SELECT * FROM properties WHERE id LIKE ?", (pattern,))]
+    checked += 1
+    problems += sqljson.concat(arrays) != JSONResponse(want).body
+    return checked, fallbacks, problems
+
+
+async def verify_endpoints():
+    problems = 0
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench") as client:
+        for url in ("/api/properties", "/api/maintenance", "/api/maintenance?limit=50",
+                    "/api/maintenance?category=awkward", "/api/maintenance?category=inexact",
+                    "/api/documents?limit=20"):
+            bodies = []
+            for enabled in (True, False):
+                sqljson.SQL_JSON_ENABLED = enabled
+                main.response_cache.bump("properties", "maintenance_issues", "documents")
+                response = await client.get(url)
+                bodies.append((response.status_code, response.content, response.headers.get("x-next-cursor")))
+            problems += bodies[0] != bodies[1]
+    sqljson.SQL_JSON_ENABLED = True
+    return problems
+
+
+def throughput(conn, repeat):
+    listing = main.MAINTENANCE_LISTING
+    filters = {"category": "plumbing"}
+    paths = {
+        "dicts + JSONResponse": lambda: python_body(listing, conn, filters)[0],
+        "sqljson array": lambda: listing.page_json(conn, filters)[0],
+        "sqljson rows (keyed)": lambda: sqljson.join(r[0] for r in listing.page_json(conn, filters, keyed=True)[0]),
+        "query only": lambda: conn.execute(*listing.query(filters)).fetchall(),
+    }
+    rows = conn.execute("SELECT COUNT(*) FROM maintenance_issues WHERE category = 'plumbing'").fetchone()[0]
+    for name, fn in paths.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+        best = min(timings)
+        print(f"  {name:<22} {best * 1000:8.1f} ms  {rows / best:>12,.0f} rows/s")
+
+
+def main_(args):
+    main.init_db()
+    with main.get_db() as conn, main.db.untraced(conn):
+        started = time.perf_counter()
+        counts = synthetic.populate(conn, args.seed, args.properties, args.issues, args.documents, 0)
+        add_awkward(conn)
+        print(f"{counts} loaded in {time.perf_counter() - started:.1f}s")
+        checked, fallbacks, problems = verify(conn)
+        print(f"identical bodies: {checked - problems}/{checked} queries ({fallbacks} fell back to Python)")
+        problems += asyncio.run(verify_endpoints())
+        print(f"endpoints: {'identical' if not problems else 'DIFFER'}")
+        print("\nserializing every plumbing issue")
+        throughput(conn, args.repeat)
+    main.db.close()
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--properties", type=int, default=2000)
+    parser.add_argument("--issues", type=int, default=200_000)
+    parser.add_argument("--documents", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    main_(parser.parse_args())
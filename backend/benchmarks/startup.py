@@ -0,0 +1,113 @@
+"""Cold start: how long the app takes to import and to answer its first request.
+
+Run from backend/:  python -m benchmarks.startup --runs 5 --budget-ms 4000
+
+Each run is a fresh interpreter, as after a deploy or a free-plan instance
+waking up. "import" times ``import main`` alone and checks that it creates
+no database file. "first response" starts uvicorn and polls GET / until it
+answers, measured from process start. It is measured twice: on an empty
+data directory, where startup creates the schema, and on one that is
+already migrated and seeded, the usual case. Exits non-zero when a median
+is over its budget.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_PROBE = """
+import json, os, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "databases": [f for f in os.listdir(os.environ["DATA_DIR"]) if f.endswith(".db")]}))
+"""
+
+
+def _environ(data_dir):
+    return {**os.environ, "DATA_DIR": data_dir, "INGEST_ENABLED": "0"}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_import(data_dir):
+    out = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=BACKEND, env=_environ(data_dir),
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def time_first_response(data_dir, timeout):
+    port = _free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level",
+                                "warning"], cwd=BACKEND, env=_environ(data_dir), stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE)
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise SystemExit(f"uvicorn exited with {process.returncode}: {process.stderr.read().decode()[-2000:]}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.005)
+        raise SystemExit(f"no response within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def seeded_dir():
+    data_dir = tempfile.mkdtemp(prefix="startup_bench_")
+    subprocess.run([sys.executable, "seed.py"], cwd=BACKEND, env=_environ(data_dir), check=True,
+                   stdout=subprocess.DEVNULL)
+    return data_dir
+
+
+def report(name, samples, budget):
+    median = statistics.median(samples) * 1000
+    over = budget is not None and median > budget
+    print(f"{name:<32} median {median:8.1f} ms  max {max(samples) * 1000:8.1f} ms"
+          + (f"  budget {budget:.0f} ms{'  OVER' if over else ''}" if budget is not None else ""))
+    return over
+
+
+def main_(args):
+    imports, touched = [], set()
+    for _ in range(args.runs):
+        probe = time_import(tempfile.mkdtemp(prefix="startup_bench_"))
+        imports.append(probe["seconds"])
+        touched.update(probe["databases"])
+    cold = [time_first_response(tempfile.mkdtemp(prefix="startup_bench_"), args.timeout) for _ in range(args.runs)]
+    warm_dir = seeded_dir()
+    warm = [time_first_response(warm_dir, args.timeout) for _ in range(args.runs)]
+
+    failed = report("import main", imports, args.import_budget_ms)
+    print(f"{'databases created by import':<32} {', '.join(sorted(touched)) or 'none'}")
+    failed |= bool(touched)
+    failed |= report("first response, empty data dir", cold, None)
+    failed |= report("first response, migrated", warm, args.budget_ms)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=4000,
+                        help="median time to first response on a migrated database")
+    parser.add_argument("--import-budget-ms", type=float, default=3000)
+    parser.add_argument("--timeout", type=float, default=60)
+    main_(parser.parse_args())
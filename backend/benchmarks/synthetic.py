@@ -0,0 +1,199 @@
+"""Deterministic synthetic portfolio: properties, users, maintenance history and documents.
+
+The same seed and sizes always produce the same rows (apart from generated
+user ids and created_at stamps), so benchmark runs on different commits load
+identical data. Properties, users and maintenance go through the bulk
+importer; documents are inserted directly because they normally arrive as
+uploads.
+
+    python -m benchmarks.synthetic --properties 5000 --issues 200000 --documents 20000
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import importer  # noqa: E402
+
+CITIES = [
+    ("Mumbai", ["Bandra West", "Andheri East", "Powai", "Worli", "Lower Parel"]),
+    ("Bangalore", ["Koramangala", "Indiranagar", "Whitefield", "HSR Layout", "Jayanagar"]),
+    ("Delhi", ["Green Park", "Saket", "Vasant Kunj", "Dwarka", "Hauz Khas"]),
+    ("Pune", ["Koregaon Park", "Baner", "Hinjewadi", "Kothrud", "Viman Nagar"]),
+    ("Hyderabad", ["Gachibowli", "Banjara Hills", "Madhapur", "Kondapur", "Jubilee Hills"]),
+]
+BUILDINGS = ["Galaxy Heights", "Tech Park View", "Green Residency", "Lakeview Towers", "Sunrise Enclave",
+             "Palm Court", "Orchid Plaza", "Silver Oaks", "Royal Arcade", "Harbour Point"]
+FIRST_NAMES = ["Aarav", "Vivaan", "Aditya", "Ishaan", "Ananya", "Diya", "Priya", "Rohan", "Kavya", "Arjun",
+               "Meera", "Rahul", "Sneha", "Vikram", "Neha", "Karan", "Pooja", "Siddharth", "Riya", "Amit"]
+LAST_NAMES = ["Sharma", "Mehta", "Iyer", "Reddy", "Chawla", "Kapoor", "Nair", "Gupta", "Rao", "Joshi"]
+# (type, share of portfolio, median monthly rent)
+PROPERTY_TYPES = [("Residential", 0.7, 45000), ("Commercial", 0.25, 180000), ("Industrial", 0.05, 400000)]
+LEASE_TYPES = ["11-Month Agreement", "Standard Lease", "Triple Net", "Gross Lease", "Modified Gross"]
+# (category, share of issues, median cost, months it peaks in, description templates)
+CATEGORIES = [
+    ("plumbing", 0.24, 3500, {6, 7, 8, 9}, ["Monsoon leakage in {room} wall", "Blocked drain in {room}",
+                                             "Burst pipe under {room} sink"]),
+    ("electrical", 0.2, 2500, {4, 5}, ["Geyser switch burnout", "Short circuit in {room}",
+                                       "UPS battery replacement"]),
+    ("hvac", 0.14, 8000, {3, 4, 5}, ["AC not cooling in {room}", "Compressor failure", "Duct cleaning"]),
+    ("painting", 0.1, 15000, {10, 11}, ["{room} touch-up paint", "Exterior repainting", "Damp patch repaint"]),
+    ("gardening", 0.08, 2000, {7, 8}, ["Seasonal lawn maintenance", "Tree pruning", "Irrigation repair"]),
+    ("pest control", 0.08, 1800, {6, 7}, ["Termite treatment in {room}", "Cockroach infestation",
+                                          "Rodent control"]),
+    ("carpentry", 0.08, 4000, set(), ["Broken {room} door hinge", "Wardrobe shutter repair",
+                                      "Window frame swelling"]),
+    ("security", 0.08, 6000, set(), ["CCTV camera offline", "Intercom not working", "Gate motor repair"]),
+]
+ROOMS = ["master bedroom", "kitchen", "living room", "bathroom", "balcony", "server room", "lobby"]
+VENDORS = ["QuickFix Utilities", "PowerSafe Ltd", "Green Thumbs", "Asian Paints Service", "CoolAir Services",
+           "PestGuard", "Local Electrician", "SecureTech", "WoodWorks", "AquaPlumb"]
+DOCUMENT_TYPES = [("lease", 0.35), ("invoice", 0.4), ("id_proof", 0.1), ("other", 0.15)]
+
+HISTORY_START = date(2016, 1, 1)
+TODAY = date(2025, 6, 30)
+
+
+def _weighted(rng, items, weight_index=1):
+    return rng.choices(items, weights=[item[weight_index] for item in items])[0]
+
+
+def _lognormal(rng, median, sigma=0.6):
+    return round(median * math.exp(rng.gauss(0, sigma)), -1)
+
+
+def _pan(rng):
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    return "".join(rng.choice(letters) for _ in range(5)) + f"{rng.randrange(10000):04d}" + rng.choice(letters)
+
+
+def property_rows(rng, count):
+    for i in range(count):
+        city, areas = rng.choice(CITIES)
+        kind, _, median_rent = _weighted(rng, PROPERTY_TYPES)
+        start = HISTORY_START + timedelta(days=rng.randrange((TODAY - HISTORY_START).days))
+        term = 335 if kind == "Residential" and rng.random() < 0.6 else 365 * rng.choice([1, 3, 5])
+        occupied = rng.random() < 0.9
+        yield {
+            "id": f"syn_{i:06d}",
+            "address": f"{rng.randint(1, 999)}, {rng.choice(BUILDINGS)}, {rng.choice(areas)}, {city}",
+            "type": kind,
+            "tenant_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" if occupied else None,
+            "lease_type": rng.choice(LEASE_TYPES) if occupied else None,
+            "rent_amount": _lognormal(rng, median_rent, 0.4),
+            "lease_start_date": start.isoformat() if occupied else None,
+            "lease_end_date": (start + timedelta(days=term)).isoformat() if occupied else None,
+            "landlord_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "pan_number": _pan(rng),
+        }
+
+
+def user_rows(rng, count, properties):
+    for i in range(count):
+        yield {
+            "username": f"syn_user_{i:06d}",
+            "password": f"pw{rng.randrange(10 ** 6):06d}",
+            "role": "owner" if rng.random() < 0.05 else "tenant",
+            "property_id": f"syn_{rng.randrange(properties):06d}" if properties else None,
+        }
+
+
+def _issue_date(rng, peak_months):
+    while True:
+        day = HISTORY_START + timedelta(days=rng.randrange((TODAY - HISTORY_START).days))
+        # Seasonal categories are three times as likely in their peak months
+        if not peak_months or day.month in peak_months or rng.random() < 1 / 3:
+            return day
+
+
+def maintenance_rows(rng, count, properties):
+    # A few problem properties account for a disproportionate share of work orders
+    hot = max(1, properties // 20)
+    for i in range(count):
+        category, _, median_cost, peaks, templates = _weighted(rng, CATEGORIES)
+        day = _issue_date(rng, peaks)
+        age = (TODAY - day).days
+        if age > 60:
+            status = "Resolved"
+        else:
+            status = rng.choices(["Open", "In Progress", "Resolved"], weights=[3, 4, 3])[0]
+        prop = rng.randrange(hot) if rng.random() < 0.3 else rng.randrange(properties)
+        yield {
+            "source_key": f"SYN-WO-{i:08d}",
+            "property_id": f"syn_{prop:06d}",
+            "category": category,
+            "description": rng.choice(templates).format(room=rng.choice(ROOMS)),
+            "date": day.isoformat(),
+            "status": status,
+            "cost": _lognormal(rng, median_cost) if status == "Resolved" or rng.random() < 0.5 else 0.0,
+            "vendor": rng.choice(VENDORS) if status != "Open" else "Pending Assignment",
+        }
+
+
+def document_rows(rng, count, properties):
+    for i in range(count):
+        kind = _weighted(rng, DOCUMENT_TYPES)[0]
+        prop = f"syn_{rng.randrange(properties):06d}"
+        uploaded = HISTORY_START + timedelta(days=rng.randrange((TODAY - HISTORY_START).days),
+                                             seconds=rng.randrange(86400))
+        filename = f"{kind}_{prop}_{i}.pdf"
+        amount = _lognormal(rng, 40000)
+        summary = (f"Invoice No: INV-{i} Grand Total: Rs. {amount:,.2f}" if kind == "invoice"
+                   else f"{kind.replace('_', ' ').title()} document for {prop}")
+        extracted = {"filename": filename, "type": "application/pdf", "size": rng.randint(20_000, 5_000_000),
+                     "text": summary}
+        yield (prop, kind, filename, uploaded.isoformat(), json.dumps(extracted), summary,
+               extracted["size"], f"{rng.getrandbits(256):064x}", "application/pdf")
+
+
+def _ndjson(rows):
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+def populate(conn, seed=42, properties=1000, issues=20000, documents=2000, users=500, batch_size=5000):
+    """Load a synthetic portfolio into ``conn``; returns the number of rows per kind."""
+    rng = random.Random(seed)
+    counts = {}
+    for kind, rows in (
+        ("properties", property_rows(rng, properties)),
+        ("users", user_rows(rng, users, properties)),
+        ("maintenance", maintenance_rows(rng, issues, properties)),
+    ):
+        report = importer.import_rows(conn, kind, _ndjson(rows), "ndjson", batch_size)
+        if report.error_count:
+            raise ValueError(f"synthetic {kind} rows rejected: {report.errors[:3]}")
+        counts[kind] = report.received
+    with conn:
+        conn.executemany("""
+            INSERT INTO documents (property_id, type, filename, upload_date, extracted_data, content_summary,
+                                   size, sha256, content_type)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, document_rows(rng, documents, properties))
+    counts["documents"] = documents
+    conn.execute("PRAGMA optimize")
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic portfolio into DATA_DIR's database")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--properties", type=int, default=1000)
+    parser.add_argument("--issues", type=int, default=20000)
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=500)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="synthetic_"))
+    import main
+
+    main.init_db()
+    with main.get_db() as conn, main.db.untraced(conn):
+        counts = populate(conn, args.seed, args.properties, args.issues, args.documents, args.users)
+    print(f"{counts} written to {main.DB_PATH}")
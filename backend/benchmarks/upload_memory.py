@@ -0,0 +1,79 @@
+"""Peak Python heap per upload for growing file sizes through the in-process app.
+
+Run from backend/:  python -m benchmarks.upload_memory --sizes 10 50 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="upload_bench_"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+
+BOUNDARY = "propnexa-bench-boundary"
+BODY_CHUNK = 64 * 1024
+
+
+def multipart_body(filename, size, seed):
+    head = (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="property_id"\r\n\r\nbench\r\n'
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: application/pdf\r\n\r\n"
+    ).encode()
+    tail = f"\r\n--{BOUNDARY}--\r\n".encode()
+    # Vary the content per run so every upload is a new blob rather than a dedupe hit
+    block = (seed.to_bytes(8, "big") * (BODY_CHUNK // 8))[:BODY_CHUNK]
+
+    async def stream():
+        yield head
+        remaining = size
+        while remaining:
+            chunk = block[:min(BODY_CHUNK, remaining)]
+            remaining -= len(chunk)
+            yield chunk
+        yield tail
+
+    return stream(), len(head) + size + len(tail)
+
+
+async def upload(client, size_mb, seed):
+    size = size_mb * 1024 * 1024
+    body, length = multipart_body(f"inspection_{size_mb}mb.pdf", size, seed)
+    headers = {"content-type": f"multipart/form-data; boundary={BOUNDARY}", "content-length": str(length)}
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    response = await client.post("/api/upload", content=body, headers=headers)
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    return tracemalloc.get_traced_memory()[1], elapsed
+
+
+async def main_(sizes):
+    main.init_db()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        seed = int(time.time())
+        for size_mb in sizes:
+            # Throughput is timed untraced; tracemalloc slows allocation-heavy code a lot
+            _, elapsed = await upload(client, size_mb, seed)
+            tracemalloc.start()
+            peak, _ = await upload(client, size_mb, seed + 1)
+            tracemalloc.stop()
+            seed += 2
+            print(f"{size_mb:>6} MB upload  peak heap {peak / 1024 / 1024:>7.2f} MB  "
+                  f"{size_mb / elapsed:>8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200], help="upload sizes in MB")
+    asyncio.run(main_(parser.parse_args().sizes))
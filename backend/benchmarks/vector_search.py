@@ -0,0 +1,121 @@
+"""Vector index build rate, top-k query latency and compaction time at a million chunks.
+
+Run from backend/:  python -m benchmarks.vector_search --chunks 1000000 --queries 200
+
+Chunks are synthetic work order descriptions appended straight into a
+scratch index. Each query's top k is checked against a dense scan of every
+dimension, so the sparse row reads are shown to find the same scores.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="vector_bench_"))
+os.environ.setdefault("INGEST_ENABLED", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+import main  # noqa: E402
+import vectors  # noqa: E402
+from benchmarks import synthetic  # noqa: E402
+
+QUESTIONS = [
+    "compressor failure in the server room", "water leaking through the bathroom wall", "cctv camera offline",
+    "termite damage kitchen", "geyser switch burnt", "door hinge broken", "who handles tree pruning",
+    "exterior repainting quote", "gate motor repair vendor", "blocked drain", "rodent problem in lobby",
+    "ac not cooling", "intercom not working at the gate", "damp patch", "ups battery",
+]
+BATCH = 20000
+
+
+def texts(rng, count):
+    for row in synthetic.maintenance_rows(rng, count, 1000):
+        yield f"{row['category']} {row['description']} {row['vendor']} {row['property_id']}"
+
+
+def build(index, conn, count, seed):
+    rng = random.Random(seed)
+    items = []
+    for i, text in enumerate(texts(rng, count)):
+        items.append(("maintenance", i + 1, 0, text))
+        if len(items) == BATCH:
+            with conn:
+                stale = index.append(conn, items)
+            if stale:
+                os.remove(stale)
+            items = []
+    with conn:
+        stale = index.append(conn, items)
+    if stale:
+        os.remove(stale)
+    index._matrix.flush()
+
+
+def dense_top(index, vector, k):
+    scores = vector @ index._matrix[:, :index.count]
+    top = np.sort(scores)[::-1][:k]
+    return top[top > 0]
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def main_(args):
+    main.init_db()
+    directory = os.path.join(os.environ["DATA_DIR"], "vector_bench")
+    with main.get_db() as conn, main.db.untraced(conn):
+        index = vectors.VectorIndex(directory)
+        index.rebuild(conn)
+
+        start = time.perf_counter()
+        build(index, conn, args.chunks, args.seed)
+        elapsed = time.perf_counter() - start
+        print(f"built {index.count:,} chunks in {elapsed:.1f} s ({index.count / elapsed:,.0f} chunks/s), "
+              f"{index.stats()['file_bytes'] / 2 ** 20:,.0f} MiB")
+
+        rng = random.Random(args.seed)
+        questions = [rng.choice(QUESTIONS) for _ in range(args.queries)]
+        query_vectors = index.vectorize(questions)
+        for vector in query_vectors[:5]:
+            index.top_rows(vector, args.k)  # warm the page cache
+        latencies, mismatches = [], 0
+        for vector in query_vectors:
+            started = time.perf_counter()
+            found = index.top_rows(vector, args.k)
+            latencies.append(time.perf_counter() - started)
+            if args.verify:
+                # Scores rather than rows are compared: ties may pick different rows
+                expected = dense_top(index, vector, args.k)
+                scores = np.array([score for _, score in found])
+                mismatches += len(scores) != len(expected) or not np.allclose(scores, expected, atol=1e-5)
+        ordered = sorted(latencies)
+        print(f"top-{args.k} over {index.count:,} chunks: p50 {percentile(ordered, 50) * 1000:.2f}  "
+              f"p95 {percentile(ordered, 95) * 1000:.2f}  p99 {percentile(ordered, 99) * 1000:.2f} ms"
+              + (f"  dense-scan mismatches {mismatches}/{len(query_vectors)}" if args.verify else ""))
+
+        start = time.perf_counter()
+        with conn:
+            for first in range(1, index.count // 4 + 1, 10000):
+                index._drop(conn, "maintenance", list(range(first, min(first + 10000, index.count // 4 + 1))))
+            index._save_meta(conn)
+        dropped = time.perf_counter() - start
+        start = time.perf_counter()
+        index.compact(conn)
+        print(f"dropped a quarter in {dropped:.1f} s, compacted to {index.count:,} chunks in "
+              f"{time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-verify", dest="verify", action="store_false",
+                        help="skip comparing each top k with a dense scan")
+    main_(parser.parse_args())
@@ -0,0 +1,122 @@
+"""Write throughput and tail latency with several worker processes on one database.
+
+Run from backend/:  python -m benchmarks.write_throughput --workers 1 4 8 --duration 10
+
+Each worker is a separate process importing the app, like a uvicorn worker,
+with its own virtual users posting maintenance reports and status updates
+through an in-process ASGI client. Every worker count runs twice: with the
+group-commit writer (DB_WRITE_QUEUE=1) and with one transaction per request
+on pooled connections (DB_WRITE_QUEUE=0), the way writes used to go.
+Failed requests, such as "database is locked", are counted as errors.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROPERTIES = ["mumbai_galaxy", "bangalore_tech", "delhi_villa"]
+
+
+def setup(data_dir):
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["INGEST_ENABLED"] = "0"
+    import main
+    import seed
+
+    # The workers report on the demo properties and update its issues
+    seed.seed(main)
+    main.db.close()
+
+
+def worker(index, data_dir, write_queue, users, start_at, duration, results):
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["DB_WRITE_QUEUE"] = "1" if write_queue else "0"
+    os.environ["INGEST_ENABLED"] = "0"
+    os.environ["METRICS_ENABLED"] = "0"
+    import asyncio
+    import random
+
+    import httpx
+
+    import main
+
+    async def run():
+        latencies, errors = [], 0
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            await asyncio.sleep(max(0.0, start_at - time.time()))
+            deadline = time.perf_counter() + duration
+
+            async def user(n):
+                nonlocal errors
+                rng = random.Random(index * 1000 + n)
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    if rng.random() < 0.7:
+                        request = client.post("/api/maintenance", json={
+                            "property_id": rng.choice(PROPERTIES), "category": "plumbing",
+                            "description": f"Benchmark report {index}-{n}",
+                        })
+                    else:
+                        request = client.put(f"/api/maintenance/{rng.randint(1, 5)}/status",
+                                             json={"status": rng.choice(["Open", "Resolved"])})
+                    try:
+                        response = await request
+                        failed = response.status_code >= 400
+                    except Exception:
+                        failed = True
+                    latencies.append(time.perf_counter() - started)
+                    errors += failed
+
+            await asyncio.gather(*(user(n) for n in range(users)))
+        return latencies, errors
+
+    results.put(asyncio.run(run()))
+    main.db.close()
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def run(workers, write_queue, users, duration):
+    data_dir = tempfile.mkdtemp(prefix="write_bench_")
+    context = multiprocessing.get_context("spawn")
+    process = context.Process(target=setup, args=(data_dir,))
+    process.start()
+    process.join()
+    results = context.Queue()
+    # Leave every worker time to import the app before the clock starts
+    start_at = time.time() + 3 + workers
+    processes = [context.Process(target=worker, args=(i, data_dir, write_queue, users, start_at, duration, results))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    latencies, errors = [], 0
+    for _ in processes:
+        values, failed = results.get()
+        latencies += values
+        errors += failed
+    for process in processes:
+        process.join()
+    ordered = sorted(latencies)
+    mode = "group commit" if write_queue else "per request"
+    print(f"{workers} workers  {mode:<12}  {len(ordered) / duration:>8.1f} writes/s  "
+          f"p50 {percentile(ordered, 50) * 1000:>7.1f}  p95 {percentile(ordered, 95) * 1000:>7.1f}  "
+          f"p99 {percentile(ordered, 99) * 1000:>7.1f} ms  errors {errors}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--users", type=int, default=16, help="concurrent virtual users per worker")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--mode", choices=["both", "queue", "direct"], default="both")
+    args = parser.parse_args()
+    for workers in args.workers:
+        for write_queue in {"both": (False, True), "queue": (True,), "direct": (False,)}[args.mode]:
+            run(workers, write_queue, args.users, args.duration)
@@ -0,0 +1,124 @@
+import os
+import threading
+import uuid
+from collections import Counter, OrderedDict
+
+from fastapi.responses import JSONResponse, Response
+
+CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 1024))
+# Rough per-entry cost of the key, tuple and OrderedDict node on top of the body
+ENTRY_OVERHEAD = 200
+
+
+class ResponseCache:
+    """LRU cache of serialized JSON bodies, validated by per-table version counters.
+
+    Every write path bumps the versions of the tables it touched, and so does
+    the change feed for each change_log row it reads, which covers writes by
+    other processes within a poll. A response's ETag is built from the versions of the tables it reads plus a per-process
+    epoch, so a conditional GET can be answered with 304 from the counters
+    alone, and a cached body is only served while its ETag is still current.
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, max_entries=CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        # Counters restart with the process, the epoch keeps old ETags from matching
+        self.epoch = uuid.uuid4().hex[:8]
+        self.versions = Counter()
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = self.misses = self.not_modified = self.evictions = 0
+        self._lock = threading.Lock()
+
+    def bump(self, *tables):
+        with self._lock:
+            for table in tables:
+                self.versions[table] += 1
+
+    def etag(self, tables):
+        with self._lock:
+            stamp = ".".join(str(self.versions[t]) for t in tables)
+        return f'"{self.epoch}-{stamp}"'
+
+    def revalidated(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def get(self, key, etag):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != etag:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key, etag, body, headers=None):
+        size = len(body) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old[1]) + ENTRY_OVERHEAD
+            self.entries[key] = (etag, body, headers or {})
+            self.bytes += size
+            while self.bytes > self.max_bytes or len(self.entries) > self.max_entries:
+                _, (_, evicted, _) = self.entries.popitem(last=False)
+                self.bytes -= len(evicted) + ENTRY_OVERHEAD
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            requests = lookups + self.not_modified
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                # Share of requests answered without touching SQLite
+                "served_from_cache_ratio": round((self.hits + self.not_modified) / requests, 4) if requests else None,
+                "versions": dict(self.versions),
+            }
+
+
+def etag_matches(request, etag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    candidates = (tag.strip().removeprefix("W/") for tag in header.split(","))
+    return etag in candidates
+
+
+async def cached_json(request, cache, key, tables, load):
+    """Serve ``await load()`` as JSON, from the cache or as a 304 when nothing changed.
+
+    ``load`` may return ``(content, headers)`` to cache extra response headers
+    along with the body, and ``content`` may be bytes already encoded as JSON.
+    """
+    etag = cache.etag(tables)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        cache.revalidated()
+        return Response(status_code=304, headers=headers)
+    cached = cache.get(key, etag)
+    if cached is None:
+        content, extra = await load(), {}
+        if isinstance(content, tuple):
+            content, extra = content
+        cached = content if isinstance(content, bytes) else JSONResponse(content).body, extra
+        cache.put(key, etag, *cached)
+    body, extra = cached
+    return Response(body, media_type="application/json", headers={**extra, **headers})
@@ -0,0 +1,322 @@
+"""Change feed: a compact log of writes, pushed to subscribers as server-sent events.
+
+Write paths call ``record`` inside their transaction, so change_log ids
+follow commit order (SQLite has one writer at a time) and a change is
+logged exactly when its write commits. After committing they call
+``ChangeFeed.notify``. The feed then reads the new rows and hands each one
+to the subscribers whose filter matches: owners see everything, tenants
+only their property. Rows without a property, such as bulk imports, go to
+everyone. The feed also polls, so writes made by other worker processes
+and the command-line tools arrive too. ``on_change`` hears of every batch
+it reads, so caches in this process can drop what those writes changed.
+
+Each subscriber has a bounded queue in which changes to the same entity
+coalesce. A subscriber too slow to keep up gets a single ``reset`` event,
+meaning "refetch everything", in place of the backlog. A client that
+reconnects with Last-Event-ID gets what it missed replayed from the log,
+or a ``reset`` when that part of the log has been pruned.
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+
+CHANGE_LOG_MAX_ROWS = int(os.getenv("CHANGE_LOG_MAX_ROWS", 100_000))
+CHANGE_POLL_SECONDS = float(os.getenv("CHANGE_POLL_SECONDS", 1.0))
+# Distinct entities a subscriber may have waiting before it is reset
+SUBSCRIBER_MAX_PENDING = int(os.getenv("CHANGE_SUBSCRIBER_MAX_PENDING", 256))
+# How long a stream waits after the first change so a burst goes out as one batch
+COALESCE_SECONDS = float(os.getenv("CHANGE_COALESCE_MS", 50)) / 1000
+HEARTBEAT_SECONDS = 15
+REPLAY_MAX = 1000
+FETCH_BATCH = 1000
+ENTITIES = ("properties", "users", "maintenance", "documents")
+
+CHANGE_COLUMNS = "id, at, entity, entity_id, property_id, action"
+
+logger = logging.getLogger("changes")
+
+
+def record(conn, entity, action, entity_id=None, property_id=None):
+    """Log a change inside the caller's write transaction."""
+    conn.execute(
+        "INSERT INTO change_log (at, entity, entity_id, property_id, action) VALUES (?, ?, ?, ?, ?)",
+        (datetime.now().isoformat(), entity, None if entity_id is None else str(entity_id), property_id, action),
+    )
+
+
+def _fetch(conn, after, limit):
+    return conn.execute(
+        f"SELECT {CHANGE_COLUMNS} FROM change_log WHERE id > ? ORDER BY id LIMIT ?", (after, limit)
+    ).fetchall()
+
+
+def _replay(conn, after, until, property_id):
+    oldest = conn.execute("SELECT MIN(id) FROM change_log").fetchone()[0]
+    if oldest is not None and after < oldest - 1:
+        return None
+    if property_id is None:
+        sql = f"SELECT {CHANGE_COLUMNS} FROM change_log WHERE id > ? AND id <= ? ORDER BY id LIMIT ?"
+        params = (after, until, REPLAY_MAX + 1)
+    else:
+        sql = f"""
+            SELECT {CHANGE_COLUMNS} FROM change_log
+            WHERE id > ? AND id <= ? AND (property_id = ? OR property_id IS NULL)
+            ORDER BY id LIMIT ?
+        """
+        params = (after, until, property_id, REPLAY_MAX + 1)
+    rows = conn.execute(sql, params).fetchall()
+    return None if len(rows) > REPLAY_MAX else rows
+
+
+def _prune(conn, keep_after):
+    conn.execute("DELETE FROM change_log WHERE id <= ?", (keep_after,))
+
+
+class Change:
+    __slots__ = ("id", "entity", "entity_id", "property_id", "data")
+
+    def __init__(self, row):
+        self.id, at, self.entity, self.entity_id, self.property_id, action = row
+        # Serialized once, however many subscribers it goes to
+        self.data = json.dumps({"id": self.id, "at": at, "entity": self.entity, "entity_id": self.entity_id,
+                                "property_id": self.property_id, "action": action})
+
+    def sse(self, count=1):
+        data = self.data if count == 1 else f'{self.data[:-1]}, "coalesced": {count}}}'
+        return f"id: {self.id}\nevent: change\ndata: {data}\n\n"
+
+
+class Subscriber:
+    def __init__(self, property_id, entities, live_from, replay_from=None, max_pending=SUBSCRIBER_MAX_PENDING):
+        self.property_id = property_id
+        self.entities = entities
+        # Live changes start after live_from; a resuming client gets (replay_from, live_from] from the log
+        self.live_from = live_from
+        self.replay_from = replay_from
+        # Changes up to here were delivered or are being replayed
+        self.cursor = live_from
+        self.max_pending = max_pending
+        # (entity, entity_id) -> [latest change, how many it stands for]
+        self.pending = OrderedDict()
+        self.overflowed = False
+        self.closed = False
+        self.ready = asyncio.Event()
+
+    def push(self, change):
+        if change.id <= self.cursor or (self.entities and change.entity not in self.entities):
+            return False
+        key = (change.entity, change.entity_id)
+        merged = self.pending.pop(key, None)
+        if merged is not None:
+            merged[0] = change
+            merged[1] += 1
+            self.pending[key] = merged
+        elif len(self.pending) >= self.max_pending:
+            self.overflowed = True
+            self.pending.clear()
+        else:
+            self.pending[key] = [change, 1]
+        self.cursor = change.id
+        self.ready.set()
+        return True
+
+    def drain(self):
+        pending, overflowed = self.pending, self.overflowed
+        self.pending, self.overflowed = OrderedDict(), False
+        self.ready.clear()
+        return list(pending.values()), overflowed
+
+
+class ChangeFeed:
+    def __init__(self, db, poll_seconds=CHANGE_POLL_SECONDS, max_rows=CHANGE_LOG_MAX_ROWS, on_change=None):
+        self.db = db
+        self.on_change = on_change
+        self.poll_seconds = poll_seconds
+        self.max_rows = max_rows
+        self.last_id = 0
+        self.delivered = self.resets = 0
+        self._owners = set()
+        self._tenants = defaultdict(set)
+        self._wakeup = None
+        self._task = None
+        self._starting = None
+        # Set while the shard is paused for a split or move; the feed still reads, but doesn't prune
+        self.paused = False
+        self._pruning = None
+
+    async def start(self):
+        """Begin following the log from its current end; called lazily by ``subscribe``."""
+        if self._starting is None:
+            self._starting = asyncio.ensure_future(self._start())
+        await asyncio.shield(self._starting)
+
+    async def _start(self):
+        row = await self.db.fetchone("SELECT IFNULL(MAX(id), 0) FROM change_log")
+        self.last_id = row[0]
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._pruning is not None:
+            await asyncio.gather(self._pruning, return_exceptions=True)
+        self._task = self._starting = self._wakeup = self._pruning = None
+        # Open streams end, and their clients reconnect with Last-Event-ID
+        for subscriber in [*self._owners, *(s for t in self._tenants.values() for s in t)]:
+            subscriber.closed = True
+            subscriber.ready.set()
+
+    async def pause(self):
+        """Stop pruning the log; once this returns the feed writes nothing until resumed."""
+        self.paused = True
+        if self._pruning is not None:
+            await asyncio.gather(self._pruning, return_exceptions=True)
+            self._pruning = None
+
+    def resume(self):
+        self.paused = False
+
+    def notify(self):
+        """Wake the feed after a write committed; call from the event loop."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        since_prune = 0
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                while True:
+                    rows = await self.db.run(_fetch, self.last_id, FETCH_BATCH)
+                    for row in rows:
+                        self._dispatch(Change(tuple(row)))
+                    if rows:
+                        self.last_id = rows[-1][0]
+                        since_prune += len(rows)
+                        if self.on_change is not None:
+                            self.on_change({row[2] for row in rows})
+                    if len(rows) < FETCH_BATCH:
+                        break
+                if since_prune >= self.max_rows // 10 and not self.paused:
+                    since_prune = 0
+                    self._pruning = asyncio.ensure_future(self.db.write(_prune, self.last_id - self.max_rows))
+                    await asyncio.shield(self._pruning)
+            except Exception:
+                # A busy or failing database delays events; the next poll picks up from last_id
+                logger.exception("change feed poll failed")
+
+    def _dispatch(self, change):
+        if change.property_id is None:
+            targets = [self._owners, *self._tenants.values()]
+        else:
+            targets = [self._owners, self._tenants.get(change.property_id, ())]
+        for subscribers in targets:
+            for subscriber in subscribers:
+                self.delivered += subscriber.push(change)
+
+    async def subscribe(self, property_id=None, entities=None, last_event_id=None):
+        """A subscriber to changes for ``property_id`` (None: all of them) and ``entities`` (None: all)."""
+        await self.start()
+        subscriber = Subscriber(property_id, frozenset(entities or ()), self.last_id, last_event_id)
+        (self._owners if property_id is None else self._tenants[property_id]).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        if subscriber.property_id is None:
+            self._owners.discard(subscriber)
+        else:
+            tenants = self._tenants.get(subscriber.property_id)
+            if tenants is not None:
+                tenants.discard(subscriber)
+                if not tenants:
+                    del self._tenants[subscriber.property_id]
+
+    def reset_event(self, reason):
+        self.resets += 1
+        return f"id: {self.last_id}\nevent: reset\ndata: {json.dumps({'reason': reason})}\n\n"
+
+    async def stream(self, property_id=None, entities=None, last_event_id=None):
+        """Server-sent events for one client until it goes away; see ``subscribe`` for the filters."""
+        # Subscribing here rather than before the response starts means the
+        # finally below runs for every subscriber, even if the client is already gone
+        subscriber = await self.subscribe(property_id, entities, last_event_id)
+        try:
+            yield "retry: 3000\n\n"
+            if subscriber.replay_from is not None and subscriber.replay_from < subscriber.live_from:
+                rows = await self.db.run(_replay, subscriber.replay_from, subscriber.live_from,
+                                         subscriber.property_id)
+                if rows is None:
+                    yield self.reset_event("gap")
+                else:
+                    # Coalesced the same way as live changes
+                    missed = Subscriber(None, subscriber.entities, subscriber.replay_from, max_pending=REPLAY_MAX)
+                    for row in rows:
+                        missed.push(Change(tuple(row)))
+                    yield "".join(change.sse(count) for change, count in missed.drain()[0])
+            while True:
+                try:
+                    await asyncio.wait_for(subscriber.ready.wait(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if subscriber.closed:
+                    return
+                await asyncio.sleep(COALESCE_SECONDS)
+                changes, overflowed = subscriber.drain()
+                if overflowed:
+                    yield self.reset_event("overflow")
+                if changes:
+                    yield "".join(change.sse(count) for change, count in changes)
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        return {
+            "subscribers": len(self._owners) + sum(len(s) for s in self._tenants.values()),
+            "last_id": self.last_id,
+            "delivered": self.delivered,
+            "resets": self.resets,
+        }
+
+
+async def merge_streams(streams, reset_reason=None):
+    """Interleave the ``ChangeFeed.stream`` generators of several shards into one.
+
+    Each shard numbers its own changes, so a single Last-Event-ID can't
+    resume all of them: a resuming client gets a ``reset`` instead.
+    Ends as soon as any of the streams does, and the client reconnects.
+    """
+    # Small, so a slow client holds the shard streams back and their queues coalesce
+    chunks = asyncio.Queue(maxsize=2 * len(streams))
+
+    async def pump(stream):
+        try:
+            async for chunk in stream:
+                await chunks.put(chunk)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("change stream failed")
+        await chunks.put(None)
+
+    tasks = [asyncio.ensure_future(pump(stream)) for stream in streams]
+    try:
+        yield "retry: 3000\n\n"
+        if reset_reason:
+            yield f"event: reset\ndata: {json.dumps({'reason': reset_reason})}\n\n"
+        while (chunk := await chunks.get()) is not None:
+            if not chunk.startswith("retry:"):
+                yield chunk
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
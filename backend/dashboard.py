@@ -0,0 +1,126 @@
+"""Everything a dashboard shows in one response, read from one snapshot.
+
+The owner dashboard fetched properties, maintenance, documents and
+analytics with separate requests, each on its own connection at its own
+moment, so a write landing in between made the counts disagree with the
+lists. Here a database reads every section inside one read transaction,
+which in WAL mode pins a single snapshot while writers carry on. With
+several shards every shard is read at once, each on its own snapshot, and
+the lists are merged the way the list endpoints merge them. Within one
+database the sections run one after another, since a snapshot belongs to
+one connection.
+
+``include`` names the sections wanted and ``fields`` their columns, as
+``section.column`` entries, so a page can ask for only what it renders.
+``limit`` keeps the newest maintenance issues and documents only.
+"""
+from fastapi import HTTPException
+
+import sqljson
+from aggregates import load_analytics, load_property_analytics, merge_analytics
+
+OWNER_SECTIONS = ("properties", "maintenance", "documents", "analytics")
+TENANT_SECTIONS = ("property", "maintenance", "documents", "analytics")
+
+
+def selection(sections, include=None, fields=None):
+    """``{section: columns or None}`` for the include= and fields= parameters, in ``sections`` order."""
+    wanted = sections if include is None else [name.strip() for name in include.split(",") if name.strip()]
+    for name in wanted:
+        if name not in sections:
+            raise HTTPException(status_code=400,
+                                detail=f"Unknown section '{name}'; sections are {', '.join(sections)}")
+    selected = {name: None for name in sections if name in wanted}
+    for entry in filter(None, (entry.strip() for entry in (fields or "").split(","))):
+        section, _, column = entry.partition(".")
+        if section not in selected or not column:
+            raise HTTPException(status_code=400,
+                                detail=f"fields are section.column for an included section, not '{entry}'")
+        columns = selected[section] = selected[section] or []
+        if column not in columns:
+            columns.append(column)
+    return selected
+
+
+def _check(section, columns, known):
+    for column in columns or ():
+        if column not in known:
+            raise HTTPException(status_code=400, detail=f"Unknown field '{section}.{column}'")
+
+
+def _project(row, columns):
+    return row if columns is None else {column: row[column] for column in columns}
+
+
+class Dashboard:
+    """The sections of a dashboard over the listings of the list endpoints."""
+
+    def __init__(self, properties, maintenance, documents):
+        self.listings = {"properties": properties, "property": properties,
+                         "maintenance": maintenance, "documents": documents}
+
+    def read(self, conn, selected, property_id=None, limit=None, keyed=False):
+        """One database's part of a dashboard, every section read from the same snapshot.
+
+        A list section is ``("json", page_json result)`` or, when Python must
+        encode it, ``("rows", page result)``; ``keyed`` asks for rows to merge.
+        """
+        filters = {"property_id": property_id}
+        part = {}
+        conn.execute("BEGIN")
+        try:
+            for section, columns in selected.items():
+                if section == "analytics":
+                    part[section] = (load_analytics(conn) if property_id is None
+                                     else load_property_analytics(conn, property_id))
+                    continue
+                listing = self.listings[section]
+                _check(section, columns, listing.columns(conn))
+                size = limit if section in ("maintenance", "documents") else None
+                page = sqljson.SQL_JSON_ENABLED and listing.page_json(conn, filters, None, size, keyed, columns)
+                part[section] = ("json", page) if page else ("rows", listing.page(conn, filters, None, size))
+        finally:
+            conn.rollback()
+        return part
+
+    def combine(self, parts, selected, limit=None):
+        """The dashboard body, as JSON bytes, from the ``read`` parts of one or more databases."""
+        members = {}
+        for section, columns in selected.items():
+            values = [part[section] for part in parts]
+            if section == "analytics":
+                merged = merge_analytics(values) if len(values) > 1 else values[0]
+                _check(section, columns, merged)
+                members[section] = merged if columns is None else {column: merged[column] for column in columns}
+                continue
+            size = limit if section in ("maintenance", "documents") else None
+            if len(values) == 1:
+                kind, (content, _) = values[0]
+                body = content if kind == "json" else [_project(row, columns) for row in content]
+            else:
+                body = self._merge(self.listings[section], values, columns, size)
+            if section == "property":
+                body = _only(body)
+            members[section] = body
+        return sqljson.document(members)
+
+    def _merge(self, listing, values, columns, limit):
+        # Rows Python encodes merge with the ones SQLite encoded: both are the text the endpoint would send
+        keys = [k.split(".")[-1] for k in listing.keys]
+        pages = []
+        for kind, (rows, cursor) in values:
+            if kind == "rows":
+                rows = [(sqljson.dumps(_project(row, columns)).decode(), *(row[k] for k in keys)) for row in rows]
+            pages.append((rows, cursor))
+        return listing.merge_json(pages, limit)[0]
+
+
+def _only(body):
+    # The tenant's property: the one element of its list, which must exist
+    if isinstance(body, bytes):
+        body = body[1:-1] or None
+    else:
+        body = body[0] if body else None
+    if body is None:
+        raise HTTPException(status_code=404, detail="Property not found")
+    return body
@@ -0,0 +1,339 @@
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 8))
+BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", 5000))
+MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", 256 * 1024 * 1024))
+# Negative cache_size is in KiB, so this is 64 MiB of page cache per connection
+CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", -64 * 1024))
+STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 256))
+# Streams hold a pooled connection until the client has read everything, so
+# only a few may run at once or they could starve ordinary requests
+MAX_STREAMS = int(os.getenv("DB_MAX_STREAMS", max(1, POOL_SIZE // 4)))
+# Writes go through one writer thread per process that commits them in groups;
+# 0 gives every write its own pooled connection and transaction instead
+WRITE_QUEUE_ENABLED = os.getenv("DB_WRITE_QUEUE", "1") != "0"
+WRITE_BATCH_MAX = int(os.getenv("DB_WRITE_BATCH_MAX", 64))
+# How long the writer waits for more commands after the first of a group
+WRITE_BATCH_WINDOW_MS = float(os.getenv("DB_WRITE_BATCH_WINDOW_MS", 1))
+
+PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("busy_timeout", BUSY_TIMEOUT_MS),
+    ("mmap_size", MMAP_SIZE),
+    ("cache_size", CACHE_SIZE),
+    ("temp_store", "MEMORY"),
+    ("foreign_keys", "OFF"),
+)
+
+
+class GroupCommitWriter:
+    """One connection that applies queued write commands in group commits.
+
+    The writer takes the first queued command, gathers whatever else arrives
+    within the batch window (up to ``batch_max``), and runs them all in one
+    ``BEGIN IMMEDIATE`` transaction. Each command gets a savepoint, so one
+    that raises is rolled back alone and its caller gets the exception,
+    while the rest commit together. Callers learn their result only once
+    the COMMIT has succeeded. Commands must not commit themselves.
+
+    BEGIN IMMEDIATE takes the write lock up front, so with several worker
+    processes the writers queue on busy_timeout rather than failing the way
+    a read transaction upgraded to a write does.
+    """
+
+    def __init__(self, db, batch_max=WRITE_BATCH_MAX, window_ms=WRITE_BATCH_WINDOW_MS):
+        self.db = db
+        self.batch_max = batch_max
+        self.window = window_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = self.commands = self.failed = self.largest = 0
+
+    def submit(self, fn, args):
+        future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+        self._queue.put((fn, args, future))
+        return future
+
+    def _next_batch(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.batch_max:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is None:
+                # Stop after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        conn = self.db.connect()
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    break
+                self._apply(conn, batch)
+        finally:
+            self.db._close(conn)
+
+    def _apply(self, conn, batch):
+        # Commands whose caller went away before they started are skipped
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, args, future in batch:
+                conn.execute("SAVEPOINT command")
+                try:
+                    result = fn(conn, *args)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO command")
+                    conn.execute("RELEASE command")
+                    outcomes.append((future, None, e))
+                else:
+                    conn.execute("RELEASE command")
+                    outcomes.append((future, result, None))
+            conn.execute("COMMIT")
+        except Exception as e:
+            # Nothing was committed: every caller in the group gets the error
+            if conn.in_transaction:
+                conn.rollback()
+            outcomes = [(future, None, e) for _, _, future in batch]
+        finally:
+            if self.db.tracer is not None:
+                self.db.tracer.finish(conn)
+        with self._lock:
+            self.batches += 1
+            self.commands += len(batch)
+            self.failed += sum(error is not None for _, _, error in outcomes)
+            self.largest = max(self.largest, len(batch))
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "commands": self.commands,
+                "failed": self.failed,
+                "largest_batch": self.largest,
+                "queued": self._queue.qsize(),
+            }
+
+    def stop(self, timeout=5):
+        """Apply everything already queued, then close the connection."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+
+class Database:
+    """Bounded pool of long-lived SQLite connections served from a thread pool.
+
+    Every connection is opened once in WAL mode with the pragmas above, so
+    readers never block the writer, and keeps its own prepared-statement
+    cache. Async callers go through ``run``/``fetchall``, which hand the
+    work to a dedicated executor sized to the pool so a slow query only ever
+    occupies one worker thread instead of the event loop. Writes go through
+    ``write``/``execute`` and the group-commit writer, so reads stay
+    concurrent while writes are serialized and committed in groups.
+    """
+
+    def __init__(self, path, pool_size=POOL_SIZE, tracer=None, write_queue=WRITE_QUEUE_ENABLED):
+        self.path = path
+        self.pool_size = pool_size
+        # Optional statement timer with attach/finish/detach (metrics.SqlTimer)
+        self.tracer = tracer
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="db")
+        self._streams = asyncio.Semaphore(MAX_STREAMS)
+        self.writer = GroupCommitWriter(self) if write_queue else None
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in PRAGMAS:
+            conn.execute(f"PRAGMA {name} = {value}")
+        if self.tracer is not None:
+            self.tracer.attach(conn)
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.pool_size:
+                self._opened += 1
+                try:
+                    return self.connect()
+                except Exception:
+                    self._opened -= 1
+                    raise
+        return self._idle.get()
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        if self.tracer is not None:
+            self.tracer.finish(conn)
+        if self._closed:
+            self._close(conn)
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def _call(self, fn, args):
+        with self.connection() as conn:
+            return fn(conn, *args)
+
+    async def run(self, fn, *args):
+        """Run ``fn(conn, *args)`` on a pooled connection in the DB executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._call, fn, args)
+
+    async def fetchall(self, sql, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def fetchone(self, sql, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchone())
+
+    def _call_write(self, fn, args):
+        with self.connection() as conn, conn:
+            return fn(conn, *args)
+
+    async def write(self, fn, *args):
+        """Run ``fn(conn, *args)`` in a write transaction and return its result once committed.
+
+        ``fn`` must not commit; if it raises, its changes are rolled back and
+        the exception propagates here.
+        """
+        if self.writer is None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self._call_write, fn, args)
+        return await asyncio.wrap_future(self.writer.submit(fn, args))
+
+    async def execute(self, sql, params=()):
+        def _execute(conn):
+            cursor = conn.execute(sql, params)
+            return cursor.lastrowid, cursor.rowcount
+        return await self.write(_execute)
+
+    async def stream(self, sql, params=(), batch_size=500):
+        """Yield ``(columns, rows)`` batches from one server-side cursor.
+
+        The statement reads a single snapshot, and only one batch is in memory
+        at a time however many rows it returns.
+        """
+        loop = asyncio.get_running_loop()
+        async with self._streams:
+            conn = await loop.run_in_executor(self.executor, self._acquire)
+            # A cancelled await doesn't stop a fetch already running in the
+            # executor, so the cleanup waits for it on this lock
+            state = {"lock": threading.Lock(), "cursor": None}
+            try:
+                await loop.run_in_executor(self.executor, self._open_cursor, conn, state, sql, params)
+                columns = [d[0] for d in state["cursor"].description]
+                while True:
+                    rows = await loop.run_in_executor(self.executor, self._fetch_batch, state, batch_size)
+                    if not rows:
+                        break
+                    yield columns, rows
+            finally:
+                await loop.run_in_executor(self.executor, self._finish_stream, conn, state)
+
+    def _open_cursor(self, conn, state, sql, params):
+        with state["lock"]:
+            state["cursor"] = conn.execute(sql, params)
+            # Time a stream's statement to its first row, not to the client's last read
+            if self.tracer is not None:
+                self.tracer.finish(conn)
+
+    def _fetch_batch(self, state, batch_size):
+        with state["lock"]:
+            return state["cursor"].fetchmany(batch_size)
+
+    def _finish_stream(self, conn, state):
+        with state["lock"]:
+            if state["cursor"] is not None:
+                state["cursor"].close()
+            self._release(conn)
+
+    def untraced(self, conn):
+        """Context manager that suspends the tracer on ``conn``, for bulk writes."""
+        if self.tracer is None:
+            return nullcontext(conn)
+        return self.tracer.untraced(conn)
+
+    def pool_stats(self):
+        return {"size": self.pool_size, "open": self._opened, "idle": self._idle.qsize()}
+
+    def _close(self, conn):
+        if self.tracer is not None:
+            self.tracer.detach(conn)
+        conn.close()
+
+    def write_stats(self):
+        if self.writer is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.writer.stats()}
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.stop()
+        self._closed = True
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        self.executor.shutdown(wait=False)
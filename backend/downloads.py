@@ -0,0 +1,138 @@
+"""Serving stored files: Range requests, conditional requests and zero-copy sends.
+
+Stored blobs are content-addressed, so a document's SHA-256 is a strong
+ETag. ``file_response`` answers If-None-Match / If-Modified-Since with 304,
+a single ``bytes=`` range (honouring If-Range) with 206, and an
+unsatisfiable one with 416; anything else gets the whole file. The body is
+sent with the ASGI zero-copy extension (sendfile) when the server offers it,
+and otherwise read in chunks with ``os.pread`` off the event loop.
+"""
+import asyncio
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+
+from fastapi.responses import Response
+
+from cache import etag_matches
+
+SEND_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", 256 * 1024))
+# Anything else is sent as an attachment so uploaded HTML or SVG never renders in the app's origin
+INLINE_TYPES = {"application/pdf", "image/png", "image/jpeg", "image/gif", "image/webp", "text/plain"}
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """``(start, end)`` inclusive for a single ``bytes=`` range, or None to send everything.
+
+    Multiple ranges and malformed headers are ignored, as RFC 9110 allows.
+    """
+    match = _RANGE.match(header.replace(" ", ""))
+    if not match or match[1] == match[2] == "":
+        return None
+    if match[1] == "":
+        # The last N bytes
+        length = int(match[2])
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - length), size - 1
+    start = int(match[1])
+    if start >= size:
+        raise RangeNotSatisfiable()
+    end = int(match[2]) if match[2] else size - 1
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _not_modified_since(request, mtime):
+    header = request.headers.get("if-modified-since")
+    if not header or "if-none-match" in request.headers:
+        return False
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def _if_range_allows(request, etag, last_modified):
+    header = request.headers.get("if-range")
+    if header is None:
+        return True
+    # Only a strong comparison counts here
+    return header.strip() in (etag, last_modified)
+
+
+def content_disposition(filename, content_type, download=False):
+    kind = "inline" if content_type in INLINE_TYPES and not download else "attachment"
+    if not filename:
+        return kind
+    fallback = filename.encode("ascii", "replace").decode().replace('"', "").replace("\\", "")
+    return f"{kind}; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def file_response(request, path, etag, content_type, headers=None):
+    """The response for ``path`` given the request's Range and conditional headers."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    size = stat.st_size
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Accept-Ranges": "bytes",
+        "X-Content-Type-Options": "nosniff",
+        **(headers or {}),
+    }
+    if etag_matches(request, etag) or _not_modified_since(request, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+    start, end, status = 0, size - 1, 200
+    range_header = request.headers.get("range")
+    if range_header and request.method in ("GET", "HEAD") and _if_range_allows(request, etag, last_modified):
+        try:
+            requested = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if requested is not None:
+            (start, end), status = requested, 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return FileRangeResponse(path, start, end - start + 1, status, content_type, headers)
+
+
+class FileRangeResponse(Response):
+    """``count`` bytes of ``path`` from ``offset``, sent with sendfile when the server supports it."""
+
+    def __init__(self, path, offset, count, status_code, media_type, headers):
+        super().__init__(status_code=status_code, media_type=media_type, headers=headers)
+        self.path = path
+        self.offset = offset
+        self.count = count
+        self.headers["content-length"] = str(count)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD" or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        with open(self.path, "rb", buffering=0) as file:
+            if "http.response.zerocopy" in scope.get("extensions", {}):
+                await send({"type": "http.response.zerocopy", "file": file, "offset": self.offset,
+                            "count": self.count, "more_body": False})
+                return
+            position, remaining = self.offset, self.count
+            while remaining:
+                chunk = await asyncio.to_thread(os.pread, file.fileno(), min(SEND_CHUNK_SIZE, remaining), position)
+                if not chunk:
+                    # Truncated underneath us; the declared length can't be met
+                    raise OSError(f"{self.path} ended at byte {position}")
+                position += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
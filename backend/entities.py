@@ -0,0 +1,474 @@
+"""Entity resolution: the properties, places, people, vendors and categories a question names.
+
+The index holds one entity per property (its address and id), per place
+(the parts of addresses without numbers, "Koramangala" or "Galaxy
+Heights"), per tenant and landlord name, per vendor and per maintenance
+category. Every word of an entity's name is a term. Three structures find
+the terms a typed word may stand for:
+
+* a dict from each term to the entities holding it, per kind, for exact words
+* a prefix trie over the terms, for a word still being typed
+* a character-trigram inverted index over the terms, for typos: the
+  terms sharing enough trigrams with the word are checked with a bounded
+  edit distance
+
+An entity scores by the inverse document frequency of the words it
+matched, so "Koramangala" outweighs "Road". A candidate must hold a term
+shared by at most CANDIDATE_MAX entities of its kind, and the rest of its
+score is checked by membership, so a word in half the addresses never
+makes a query walk half the index.
+
+Aliases are rows of entity_aliases. An alias's words count as terms of its
+entity, and a question that is exactly an alias resolves to its entity
+outright. The index catches up from change_log on every use, the way the
+rollup columns do: written properties are re-read and new issues add
+their vendor and category. A bulk import, or a log pruned past the last
+change applied, means a full reload.
+"""
+import math
+import threading
+
+from router import ADDRESS_STOPWORDS, tokenize
+
+# Entities of one kind sharing a term beyond which the term can't seed candidates
+CANDIDATE_MAX = 1000
+# Completions of a word being typed that are considered
+PREFIX_MAX = 32
+# Properties a mention lists in full; a place or name with more is too broad to filter a question by
+BIND_MAX_PROPERTIES = 500
+# Scale on a term's weight by how it was matched
+EXACT, PREFIX, FUZZY = 1.0, 0.9, 0.75
+KINDS = ("property", "place", "tenant", "landlord", "vendor", "category")
+# Company suffixes that say nothing about which company
+NAME_STOPWORDS = {"pvt", "private", "ltd", "limited", "llp", "inc", "co", "and", "the"}
+
+
+def create_alias_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS entity_aliases (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            alias TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            entity_key TEXT NOT NULL,
+            UNIQUE (alias, kind, entity_key)
+        )
+    """)
+
+
+def _trigrams(word):
+    padded = f"^{word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _max_edits(word):
+    return 2 if len(word) >= 8 else 1 if len(word) >= 5 else 0
+
+
+def _within(a, b, limit):
+    """Whether a and b are at most ``limit`` edits apart, transpositions counting as one."""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    before, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return False
+        before, previous = previous, current
+    return previous[-1] <= limit
+
+
+def _terms(text, stopwords):
+    return tuple(dict.fromkeys(t for t in tokenize(text or "") if t not in stopwords))
+
+
+def _places(address):
+    # Parts of the address without a number: building, locality, city
+    for part in (address or "").split(","):
+        part = part.strip()
+        if part and not any(c.isdigit() for c in part) and any(c.isalpha() for c in part):
+            yield part
+
+
+class Entity:
+    __slots__ = ("id", "kind", "key", "name", "terms", "alias_terms", "property_ids", "_sorted")
+
+    def __init__(self, id, kind, key, name, terms):
+        self.id = id
+        self.kind = kind
+        self.key = key
+        self.name = name
+        self.terms = terms
+        self.alias_terms = ()
+        self.property_ids = set()
+        self._sorted = None
+
+    def add_property(self, property_id):
+        self.property_ids.add(property_id)
+        self._sorted = None
+
+    def discard_property(self, property_id):
+        self.property_ids.discard(property_id)
+        self._sorted = None
+
+    def describe(self, addresses, max_ids=20):
+        found = {"kind": self.kind, "id": self.key, "name": self.name}
+        if self.kind in ("place", "tenant", "landlord"):
+            # Sorted once per change, not per lookup: a city can hold most of the portfolio
+            if self._sorted is None:
+                self._sorted = sorted(self.property_ids)
+            ids = self._sorted
+            found["property_count"] = len(ids)
+            found["property_ids"] = ids[:max_ids]
+            if len(ids) == 1:
+                found["address"] = addresses.get(ids[0])
+        return found
+
+
+class EntityIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.reloads = self.caught_up = 0
+
+    def _reset(self):
+        self.entities = {}
+        self._by_key = {}
+        # term -> {kind: set of entity ids}
+        self._postings = {}
+        # char -> child node; a node's "" entry is the term ending there
+        self._trie = {}
+        self._trigrams = {}
+        # alias words -> entity ids, for questions that are exactly an alias
+        self._aliases = {}
+        self._alias_version = None
+        self._addresses = {}
+        # property id -> ids of the entities it is part of
+        self._by_property = {}
+        self._aliased = set()
+        self._next_id = 0
+        self.last_change = 0
+
+    # Building
+
+    def _add_term(self, term, entity):
+        kinds = self._postings.get(term)
+        if kinds is None:
+            kinds = self._postings[term] = {}
+            node = self._trie
+            for char in term:
+                node = node.setdefault(char, {})
+            node[""] = term
+            if not term.isdigit():
+                for gram in _trigrams(term):
+                    self._trigrams.setdefault(gram, set()).add(term)
+        kinds.setdefault(entity.kind, set()).add(entity.id)
+
+    def _remove_term(self, term, entity):
+        # Terms left without entities stay in the trie and trigrams; lookups skip them
+        kinds = self._postings[term]
+        ids = kinds.get(entity.kind, set())
+        ids.discard(entity.id)
+        if not ids:
+            kinds.pop(entity.kind, None)
+
+    def _entity(self, kind, key, name, stopwords=()):
+        entity_id = self._by_key.get((kind, key))
+        if entity_id is not None:
+            return self.entities[entity_id]
+        entity = Entity(self._next_id, kind, key, name, _terms(name, stopwords))
+        self._next_id += 1
+        self.entities[entity.id] = entity
+        self._by_key[(kind, key)] = entity.id
+        for term in entity.terms:
+            self._add_term(term, entity)
+        return entity
+
+    def _drop(self, entity):
+        for term in set(entity.terms) | set(entity.alias_terms):
+            self._remove_term(term, entity)
+        del self.entities[entity.id]
+        del self._by_key[(entity.kind, entity.key)]
+        if entity.id in self._aliased:
+            # Re-read the aliases: one may name an entity added again under the same key
+            self._aliased.discard(entity.id)
+            for ids in self._aliases.values():
+                ids.discard(entity.id)
+            self._alias_version = None
+
+    def _add_property(self, row):
+        property_id, address, tenant, landlord = row
+        self._addresses[property_id] = address
+        entity = self._entity("property", property_id, address, ADDRESS_STOPWORDS)
+        for term in _terms(property_id.replace("_", " "), ADDRESS_STOPWORDS):
+            if term not in entity.terms:
+                entity.terms += (term,)
+                self._add_term(term, entity)
+        entity.add_property(property_id)
+        members = self._by_property[property_id] = {entity.id}
+        named = [("place", place.lower(), place, ADDRESS_STOPWORDS) for place in _places(address)]
+        named += [(kind, name.strip().lower(), name.strip(), NAME_STOPWORDS)
+                  for kind, name in (("tenant", tenant), ("landlord", landlord)) if name and name.strip()]
+        for kind, key, name, stopwords in named:
+            entity = self._entity(kind, key, name, stopwords)
+            entity.add_property(property_id)
+            members.add(entity.id)
+
+    def _remove_property(self, property_id):
+        self._addresses.pop(property_id, None)
+        for entity_id in self._by_property.pop(property_id, ()):
+            entity = self.entities[entity_id]
+            entity.discard_property(property_id)
+            if not entity.property_ids:
+                self._drop(entity)
+
+    def _add_issue(self, vendor, category):
+        if vendor and vendor.strip():
+            self._entity("vendor", vendor.strip().lower(), vendor.strip(), NAME_STOPWORDS)
+        if category and category.strip():
+            self._entity("category", category.strip().lower(), category.strip())
+
+    def _load(self, conn):
+        self._reset()
+        self.last_change = conn.execute("SELECT IFNULL(MAX(id), 0) FROM change_log").fetchone()[0]
+        for row in conn.execute("SELECT id, address, tenant_name, landlord_name FROM properties"):
+            self._add_property(tuple(row))
+        for vendor, category in conn.execute("SELECT DISTINCT vendor, category FROM maintenance_issues"):
+            self._add_issue(vendor, category)
+        self._loaded = True
+
+    def _catch_up(self, conn):
+        """Apply what changed since the last refresh; False if only a reload will do."""
+        oldest = conn.execute("SELECT MIN(id) FROM change_log").fetchone()[0]
+        if oldest is not None and self.last_change < oldest - 1:
+            return False
+        rows = conn.execute("""
+            SELECT id, entity, entity_id, action FROM change_log
+            WHERE id > ? AND entity IN ('properties', 'maintenance')
+        """, (self.last_change,)).fetchall()
+        properties, issues = set(), set()
+        for _, entity, entity_id, action in rows:
+            if entity_id is None:
+                return False
+            if entity == "properties":
+                properties.add(entity_id)
+            elif action == "created":
+                issues.add(int(entity_id))
+        self.last_change = conn.execute("SELECT IFNULL(MAX(id), 0) FROM change_log").fetchone()[0]
+        for property_id in properties:
+            self._remove_property(property_id)
+            row = conn.execute("SELECT id, address, tenant_name, landlord_name FROM properties WHERE id = ?",
+                               (property_id,)).fetchone()
+            if row is not None:
+                self._add_property(tuple(row))
+        for issue_id in issues:
+            row = conn.execute("SELECT vendor, category FROM maintenance_issues WHERE id = ?", (issue_id,)).fetchone()
+            if row is not None:
+                self._add_issue(*row)
+        return True
+
+    def _refresh_aliases(self, conn):
+        version = tuple(conn.execute("SELECT IFNULL(MAX(id), 0), COUNT(*) FROM entity_aliases").fetchone())
+        if version == self._alias_version:
+            return
+        for entity_id in self._aliased:
+            entity = self.entities[entity_id]
+            for term in entity.alias_terms:
+                self._remove_term(term, entity)
+            entity.alias_terms = ()
+        self._aliases, self._aliased = {}, set()
+        for alias, kind, key in conn.execute("SELECT alias, kind, entity_key FROM entity_aliases"):
+            entity_id = self._by_key.get((kind, key.lower() if kind != "property" else key))
+            words = tuple(tokenize(alias))
+            if entity_id is None or not words:
+                continue
+            entity = self.entities[entity_id]
+            self._aliases.setdefault(words, set()).add(entity_id)
+            self._aliased.add(entity_id)
+            for term in words:
+                if term not in entity.terms and term not in entity.alias_terms:
+                    entity.alias_terms += (term,)
+                    self._add_term(term, entity)
+        self._alias_version = version
+
+    def refresh(self, conn):
+        """Catch up with the database; ``conn`` reads the rows and change_log in one transaction."""
+        with self._lock:
+            conn.execute("BEGIN")
+            try:
+                if not self._loaded or not self._catch_up(conn):
+                    self.reloads += 1
+                    self._load(conn)
+                else:
+                    self.caught_up += 1
+                self._refresh_aliases(conn)
+            finally:
+                conn.rollback()
+
+    def find(self, kind, key):
+        """The entity of ``kind`` named ``key``, which aliases point at; None if there is none."""
+        with self._lock:
+            entity_id = self._by_key.get((kind, key if kind == "property" else key.strip().lower()))
+            return None if entity_id is None else self.entities[entity_id].describe(self._addresses)
+
+    # Lookup
+
+    def _weight(self, term):
+        df = sum(len(ids) for ids in self._postings[term].values())
+        return math.log(1 + len(self.entities) / df) if df else 0.0
+
+    def _completions(self, prefix):
+        node = self._trie
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        found, stack = [], [node]
+        while stack and len(found) < PREFIX_MAX:
+            node = stack.pop()
+            for char, child in node.items():
+                if char == "":
+                    if child != prefix and self._postings[child]:
+                        found.append(child)
+                else:
+                    stack.append(child)
+        return found
+
+    def _similar(self, word):
+        limit = _max_edits(word)
+        if not limit:
+            return []
+        grams = _trigrams(word)
+        needed = max(1, len(grams) - 3 * limit - 1)
+        shared = {}
+        for gram in grams:
+            for term in self._trigrams.get(gram, ()):
+                shared[term] = shared.get(term, 0) + 1
+        return [term for term, count in shared.items()
+                if count >= needed and term != word and self._postings[term] and _within(word, term, limit)]
+
+    def _match(self, words, complete_last=False, fuzzy=True):
+        """Per word, ``{term: scale}`` for the indexed terms it may stand for."""
+        matched = []
+        for i, word in enumerate(words):
+            terms = {}
+            if self._postings.get(word):
+                terms[word] = EXACT
+            if complete_last and i == len(words) - 1:
+                terms.update((term, PREFIX) for term in self._completions(word) if term not in terms)
+            if not terms and fuzzy and not word.isdigit():
+                terms.update((term, FUZZY) for term in self._similar(word))
+            matched.append(terms)
+        return matched
+
+    def _candidates(self, matched, kinds=None, skip=()):
+        """``{entity id: (score, words matched)}`` over the entities some rare term of ``matched`` names."""
+        weights = {term: self._weight(term) for terms in matched for term in terms}
+        seeds = set()
+        for i, terms in enumerate(matched):
+            if i in skip:
+                continue
+            for term in terms:
+                for kind, ids in self._postings[term].items():
+                    if (kinds is None or kind in kinds) and len(ids) <= CANDIDATE_MAX:
+                        seeds |= ids
+        scored = {}
+        for entity_id in seeds:
+            kind = self.entities[entity_id].kind
+            score, words = 0.0, []
+            for i, terms in enumerate(matched):
+                if i in skip:
+                    continue
+                best = max((weights[term] * scale for term, scale in terms.items()
+                            if entity_id in self._postings[term].get(kind, ())), default=0.0)
+                if best:
+                    score += best
+                    words.append(i)
+            scored[entity_id] = (score, words)
+        return scored
+
+    def _coverage(self, entity, words, matched):
+        # Share of the entity's own name the words matched
+        names = set(entity.terms)
+        hit = {term for i in words for term in matched[i] if term in names}
+        return len(hit) / len(names) if names else 0.0
+
+    def resolve(self, text, kinds=None, limit=10):
+        """The entities ``text`` most likely names, best first, as dicts with a 0-1 score.
+
+        The last word may be unfinished and any word may have a typo or two.
+        """
+        with self._lock:
+            words = [word for word in tokenize(text) if word not in NAME_STOPWORDS]
+            if not words:
+                return []
+            results = {}
+            for entity_id in self._aliases.get(tuple(tokenize(text)), ()):
+                entity = self.entities[entity_id]
+                if kinds is None or entity.kind in kinds:
+                    results[entity_id] = (1.0, 1.0, "alias")
+            matched = self._match(words, complete_last=True)
+            possible = sum(max((self._weight(term) for term in terms), default=1.0) for terms in matched)
+            for entity_id, (score, hit) in self._candidates(matched, kinds).items():
+                if entity_id in results:
+                    continue
+                entity = self.entities[entity_id]
+                how = min((scale for i in hit for term, scale in matched[i].items()
+                           if entity_id in self._postings[term].get(entity.kind, ())), default=EXACT)
+                results[entity_id] = (score / possible, self._coverage(entity, hit, matched),
+                                      {EXACT: "exact", PREFIX: "prefix", FUZZY: "fuzzy"}[how])
+            ranked = sorted(results.items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))[:limit]
+            return [{**self.entities[entity_id].describe(self._addresses),
+                     "score": round(0.8 * share + 0.2 * coverage, 4), "match": how}
+                    for entity_id, (share, coverage, how) in ranked]
+
+    def bind(self, words, ignore=()):
+        """The entity mentions in a tokenized question, each as a dict naming the words it used.
+
+        Words in ``ignore`` (the router's own vocabulary) are never read as
+        names. Mentions are taken greedily, best first; words two equally
+        good entities share are left unbound.
+        """
+        with self._lock:
+            mentions, used = [], set()
+            # Aliases first, longest first
+            for size in range(min(len(words), max(map(len, self._aliases), default=0)), 0, -1):
+                for start in range(len(words) - size + 1):
+                    span = set(range(start, start + size))
+                    ids = self._aliases.get(tuple(words[start:start + size]))
+                    if ids and len(ids) == 1 and not span & used:
+                        mentions.append(self._mention(next(iter(ids)), span, words))
+                        used |= span
+            usable = [word if i not in used and word not in ignore and word not in NAME_STOPWORDS
+                      and (len(word) > 2 or word.isdigit()) else "" for i, word in enumerate(words)]
+            matched = self._match(usable)
+            skip = {i for i, word in enumerate(usable) if not word}
+            while True:
+                scored = self._candidates(matched, skip=skip)
+                # A name has to match a word, not only a house number
+                ranked = sorted(((score, self._coverage(self.entities[e], hit, matched), e, hit)
+                                 for e, (score, hit) in scored.items()
+                                 if any(not words[i].isdigit() for i in hit)), reverse=True)
+                if not ranked:
+                    break
+                score, coverage, entity_id, hit = ranked[0]
+                if len(ranked) < 2 or ranked[1][:2] != (score, coverage):
+                    mentions.append(self._mention(entity_id, hit, words))
+                skip |= set(hit)
+            return mentions
+
+    def _mention(self, entity_id, positions, words):
+        entity = self.entities[entity_id]
+        return {**entity.describe(self._addresses, BIND_MAX_PROPERTIES),
+                "text": " ".join(words[i] for i in sorted(positions))}
+
+    def stats(self):
+        with self._lock:
+            counts = {kind: 0 for kind in KINDS}
+            for entity in self.entities.values() if self._loaded else ():
+                counts[entity.kind] += 1
+            return {"entities": counts, "terms": len(self._postings) if self._loaded else 0,
+                    "reloads": self.reloads, "caught_up": self.caught_up}
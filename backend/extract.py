@@ -0,0 +1,237 @@
+"""Content extraction for uploaded documents.
+
+Everything here is a plain function of a file on disk so it can run in a
+worker process. pypdf is used for PDFs when installed; otherwise a small
+fallback reads text operators straight out of the page content streams.
+"""
+import json
+import re
+import struct
+import zlib
+from datetime import datetime
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+MAX_TEXT_CHARS = 100_000
+SUMMARY_CHARS = 300
+
+PAN = re.compile(r"\b[A-Z]{5}[0-9]{4}[A-Z]\b")
+AMOUNT = r"(?:rs\.?|inr|₹|\$)?\s*([0-9][0-9,]*(?:\.[0-9]{1,2})?)"
+RENT = re.compile(r"(?:monthly rent|rent amount|rent|license fee)\b[^0-9₹$\n]{0,40}" + AMOUNT, re.I)
+INVOICE_TOTAL = re.compile(r"(?:grand total|total amount|amount due|amount payable|total)\b[^0-9₹$\n]{0,20}" + AMOUNT, re.I)
+INVOICE_NUMBER = re.compile(r"invoice\s*(?:no\.?|number|#)\s*[:#]?\s*([A-Z0-9][A-Z0-9/-]{2,})", re.I)
+
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+MONTH = "|".join(MONTHS)
+DATE_PATTERNS = [
+    (re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b"), lambda m: (m[1], m[2], m[3])),
+    (re.compile(r"\b(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})\b"), lambda m: (m[3], m[2], m[1])),
+    (re.compile(rf"\b(\d{{1,2}})(?:st|nd|rd|th)?\s+({MONTH})[a-z]*\.?,?\s+(\d{{4}})\b", re.I),
+     lambda m: (m[3], MONTHS.index(m[2].lower()) + 1, m[1])),
+    (re.compile(rf"\b({MONTH})[a-z]*\.?\s+(\d{{1,2}})(?:st|nd|rd|th)?,?\s+(\d{{4}})\b", re.I),
+     lambda m: (m[3], MONTHS.index(m[1].lower()) + 1, m[2])),
+]
+LEASE_START = re.compile(r"commenc|start|effective|from|beginning", re.I)
+LEASE_END = re.compile(r"expir|end|until|terminat|till|to\b", re.I)
+
+
+def _amount(text):
+    try:
+        return float(text.replace(",", ""))
+    except ValueError:
+        return None
+
+
+def find_dates(text):
+    """Return [(offset, iso_date)] for every recognisable date, in text order."""
+    found = []
+    for pattern, parts in DATE_PATTERNS:
+        for match in pattern.finditer(text):
+            year, month, day = (int(p) for p in parts(match))
+            try:
+                found.append((match.start(), datetime(year, month, day).date().isoformat()))
+            except ValueError:
+                continue
+    return sorted(found)
+
+
+def extract_fields(text):
+    fields = {}
+    pans = sorted(set(PAN.findall(text)))
+    if pans:
+        fields["pan_numbers"] = pans
+    rents = [a for a in (_amount(m) for m in RENT.findall(text)) if a]
+    if rents:
+        fields["rent_amounts"] = rents
+    totals = [a for a in (_amount(m) for m in INVOICE_TOTAL.findall(text)) if a]
+    if totals:
+        # The grand total is the largest "total" on an invoice
+        fields["invoice_total"] = max(totals)
+    number = INVOICE_NUMBER.search(text)
+    if number:
+        fields["invoice_number"] = number[1]
+
+    dates = find_dates(text)
+    if dates:
+        fields["dates"] = sorted({d for _, d in dates})
+        for offset, iso in dates:
+            context = text[max(0, offset - 60):offset]
+            if "lease_start" not in fields and LEASE_START.search(context):
+                fields["lease_start"] = iso
+            elif "lease_end" not in fields and LEASE_END.search(context):
+                fields["lease_end"] = iso
+    return fields
+
+
+# --- PDF -------------------------------------------------------------------
+
+PDF_STREAM = re.compile(rb"stream\r?\n(.*?)\r?\nendstream", re.S)
+PDF_TEXT = re.compile(rb"\((.*?)(?<!\\)\)\s*Tj|\[(.*?)\]\s*TJ", re.S)
+PDF_STRING = re.compile(rb"\((.*?)(?<!\\)\)", re.S)
+PDF_ESCAPES = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"(": b"(", b")": b")", b"\\": b"\\"}
+
+
+def _pdf_unescape(raw):
+    return re.sub(rb"\\(.)", lambda m: PDF_ESCAPES.get(m[1], m[1]), raw)
+
+
+def _pdf_text_fallback(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    pages = data.count(b"/Type /Page") - data.count(b"/Type /Pages") or None
+    chunks = []
+    for stream in PDF_STREAM.finditer(data):
+        body = stream[1]
+        try:
+            body = zlib.decompress(body)
+        except zlib.error:
+            pass
+        for match in PDF_TEXT.finditer(body):
+            if match[1] is not None:
+                chunks.append(_pdf_unescape(match[1]))
+            else:
+                chunks.extend(_pdf_unescape(s) for s in PDF_STRING.findall(match[2]))
+            chunks.append(b" ")
+    return b"".join(chunks).decode("latin-1", "replace"), pages
+
+
+def extract_pdf(path):
+    if PdfReader is not None:
+        reader = PdfReader(path)
+        text = "\n".join(page.extract_text() or "" for page in reader.pages)
+        return text, len(reader.pages)
+    return _pdf_text_fallback(path)
+
+
+# --- Images ----------------------------------------------------------------
+
+EXIF_TAGS = {0x010F: "make", 0x0110: "model", 0x0132: "datetime", 0x9003: "datetime_original",
+             0x0112: "orientation"}
+
+
+def _exif(tiff):
+    if tiff[:2] not in (b"II", b"MM"):
+        return {}
+    order = "<" if tiff[:2] == b"II" else ">"
+    found = {}
+
+    def read_ifd(offset, depth=0):
+        if offset + 2 > len(tiff) or depth > 2:
+            return
+        (count,) = struct.unpack_from(order + "H", tiff, offset)
+        for i in range(count):
+            entry = offset + 2 + i * 12
+            if entry + 12 > len(tiff):
+                return
+            tag, kind, n, value = struct.unpack_from(order + "HHII", tiff, entry)
+            if tag == 0x8769:  # Exif sub-IFD
+                read_ifd(value, depth + 1)
+            elif tag in EXIF_TAGS and kind == 2:  # ASCII
+                raw = tiff[entry + 8:entry + 8 + n] if n <= 4 else tiff[value:value + n]
+                found[EXIF_TAGS[tag]] = raw.rstrip(b"\x00").decode("latin-1").strip()
+            elif tag in EXIF_TAGS and kind == 3:  # SHORT
+                found[EXIF_TAGS[tag]] = struct.unpack_from(order + "H", tiff, entry + 8)[0]
+
+    read_ifd(struct.unpack_from(order + "I", tiff, 4)[0])
+    return found
+
+
+def _jpeg_info(f):
+    info = {"format": "jpeg"}
+    f.read(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            break
+        if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+            continue
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            break
+        segment = f.read(struct.unpack(">H", length_bytes)[0] - 2)
+        if marker[1] == 0xE1 and segment.startswith(b"Exif\x00\x00"):
+            exif = _exif(segment[6:])
+            if exif:
+                info["exif"] = exif
+        elif marker[1] in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+            info["height"], info["width"] = struct.unpack(">HH", segment[1:5])
+            break
+    return info
+
+
+def extract_image(path):
+    with open(path, "rb") as f:
+        head = f.read(32)
+        if head.startswith(b"\x89PNG\r\n\x1a\n"):
+            width, height = struct.unpack(">II", head[16:24])
+            return {"format": "png", "width": width, "height": height}
+        if head[:6] in (b"GIF87a", b"GIF89a"):
+            width, height = struct.unpack("<HH", head[6:10])
+            return {"format": "gif", "width": width, "height": height}
+        if head.startswith(b"\xff\xd8"):
+            f.seek(0)
+            return _jpeg_info(f)
+    return None
+
+
+# --- Entry point -------------------------------------------------------------
+
+def extract_document(path, filename, content_type):
+    """Extract text, structured fields and image metadata from one stored file.
+
+    Returns ``(extracted, summary)``; runs in a worker process.
+    """
+    content_type = content_type or ""
+    name = (filename or "").lower()
+    extracted, text = {}, ""
+
+    if content_type == "application/pdf" or name.endswith(".pdf"):
+        text, pages = extract_pdf(path)
+        if pages:
+            extracted["pages"] = pages
+    elif content_type.startswith("image/") or name.endswith((".png", ".jpg", ".jpeg", ".gif")):
+        image = extract_image(path)
+        if image:
+            extracted["image"] = image
+    elif content_type.startswith("text/") or name.endswith((".txt", ".csv", ".md", ".json")):
+        with open(path, "rb") as f:
+            text = f.read(MAX_TEXT_CHARS * 4).decode("utf-8", "replace")
+
+    text = " ".join(text.split())[:MAX_TEXT_CHARS]
+    if text:
+        extracted["text"] = text
+        extracted.update(extract_fields(text))
+        summary = text[:SUMMARY_CHARS]
+    elif "image" in extracted:
+        image = extracted["image"]
+        summary = f"{image['format'].upper()} image {image.get('width', '?')}x{image.get('height', '?')}"
+        taken = image.get("exif", {}).get("datetime_original")
+        if taken:
+            summary += f" taken {taken}"
+    else:
+        summary = None
+    # Round-trip so the worker never hands back something json.dumps would reject
+    return json.loads(json.dumps(extracted)), summary
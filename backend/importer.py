@@ -0,0 +1,335 @@
+"""Bulk import of properties, users and maintenance history from CSV or NDJSON.
+
+Rows are parsed and validated in batches, written with ``executemany`` one
+transaction per batch, and upserted on their natural keys, so re-running an
+import converges instead of duplicating rows and unchanged rows aren't
+rewritten. A bad row is reported with its line number and skipped; it never
+aborts the rest of its batch. Every batch that writes rows also records an
+``imported`` change in its own transaction, so whatever catches up from
+change_log reloads after an import, whether it came over HTTP or from here.
+
+    python importer.py properties portfolio.csv [--batch-size 5000]
+    python importer.py maintenance work_orders.ndjson
+"""
+import asyncio
+import codecs
+import csv
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import sys
+import uuid
+from datetime import date, datetime
+
+import changes
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 5000))
+# Per-row errors beyond this are counted but not listed
+MAX_REPORTED_ERRORS = 1000
+FORMATS = ("csv", "ndjson")
+USER_ROLES = ("owner", "tenant")
+
+
+class RowError(ValueError):
+    pass
+
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _number(value):
+    value = _text(value)
+    if value is None:
+        return None
+    try:
+        return float(value.replace(",", ""))
+    except ValueError:
+        raise RowError(f"not a number: {value!r}")
+
+
+def _date(value):
+    value = _text(value)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise RowError(f"not a YYYY-MM-DD date: {value!r}")
+
+
+class Entity:
+    """How one kind of row is validated and upserted.
+
+    ``fields`` maps each accepted column to its parser and ``required``
+    columns must be present. ``prepare`` fills the ``generated`` columns;
+    those listed in ``keep`` are only set on insert. The upsert leaves a
+    conflicting row alone unless one of its columns actually differs.
+    """
+
+    def __init__(self, table, key, fields, required, prepare=None, generated=(), keep=(), defaults=None):
+        self.table = table
+        self.key = key
+        self.fields = fields
+        self.required = required
+        self.prepare = prepare
+        self.defaults = defaults or {}
+        self.columns = list(fields) + [c for c in generated if c not in fields]
+        updates = [c for c in self.columns if c != key and c not in keep]
+        self.sql = f"""
+            INSERT INTO {table} ({", ".join(self.columns)})
+            VALUES ({", ".join("?" * len(self.columns))})
+            ON CONFLICT ({key}) DO UPDATE SET {", ".join(f"{c} = excluded.{c}" for c in updates)}
+            WHERE {" OR ".join(f"{c} IS NOT excluded.{c}" for c in updates)}
+        """
+
+    def parse(self, raw):
+        row = dict(self.defaults)
+        for name, parse in self.fields.items():
+            value = parse(raw.get(name))
+            if value is not None:
+                row[name] = value
+        missing = [name for name in self.required if row.get(name) is None]
+        if missing:
+            raise RowError(f"missing {', '.join(missing)}")
+        if self.prepare:
+            self.prepare(row)
+        return tuple(row.get(c) for c in self.columns)
+
+
+def _prepare_property(row):
+    row["created_at"] = datetime.now().isoformat()
+
+
+def _prepare_user(row):
+    if row["role"] not in USER_ROLES:
+        raise RowError(f"role must be one of {', '.join(USER_ROLES)}")
+    row["id"] = f"user_{uuid.uuid4().hex[:8]}"
+
+
+def _prepare_maintenance(row):
+    # Work orders without their own id are keyed on what makes them the same issue
+    if row.get("source_key") is None:
+        identity = [row["property_id"], row["date"], row["category"], row["description"]]
+        row["source_key"] = "sha1:" + hashlib.sha1(json.dumps(identity).encode()).hexdigest()
+    row["created_at"] = datetime.now().isoformat()
+
+
+ENTITIES = {
+    "properties": Entity(
+        "properties", "id",
+        fields={
+            "id": _text, "address": _text, "type": _text, "tenant_name": _text, "lease_type": _text,
+            "rent_amount": _number, "lease_start_date": _date, "lease_end_date": _date,
+            "landlord_name": _text, "pan_number": _text,
+        },
+        required=("id", "address"),
+        prepare=_prepare_property,
+        generated=("created_at",),
+        keep=("created_at",),
+    ),
+    "users": Entity(
+        "users", "username",
+        fields={"username": _text, "password": _text, "role": _text, "property_id": _text},
+        required=("username", "password"),
+        prepare=_prepare_user,
+        generated=("id",),
+        keep=("id",),
+        defaults={"role": "tenant"},
+    ),
+    "maintenance": Entity(
+        "maintenance_issues", "source_key",
+        fields={
+            "source_key": _text, "property_id": _text, "category": _text, "description": _text,
+            "date": _date, "status": _text, "cost": _number, "vendor": _text,
+        },
+        required=("property_id", "category", "description", "date"),
+        prepare=_prepare_maintenance,
+        generated=("created_at",),
+        keep=("created_at",),
+        defaults={"status": "Open", "cost": 0.0},
+    ),
+}
+# Which cached tables each import kind touches
+TABLES = {"properties": ("properties",), "users": ("users",), "maintenance": ("maintenance_issues",)}
+# Kinds recorded in change_log; users live in the catalog, which has none when sharded
+RECORDED = ("properties", "maintenance")
+
+
+def read_rows(lines, fmt):
+    """Yield ``(line_number, dict or error)`` from an iterator of text lines."""
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            if None in record:
+                yield reader.line_num, RowError("more values than header columns")
+            else:
+                yield reader.line_num, record
+        return
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, RowError(f"invalid JSON: {e}")
+            continue
+        yield number, record if isinstance(record, dict) else RowError("expected a JSON object")
+
+
+class ImportReport:
+    def __init__(self, kind):
+        self.kind = kind
+        self.received = 0
+        self.written = 0
+        self.unchanged = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def as_dict(self):
+        return {
+            "kind": self.kind,
+            "received": self.received,
+            "written": self.written,
+            "unchanged": self.unchanged,
+            "rejected": self.error_count,
+            "errors": self.errors,
+        }
+
+
+def _write_batch(conn, kind, entity, batch, report):
+    params = [values for _, values in batch]
+    try:
+        with conn:
+            cursor = conn.executemany(entity.sql, params)
+            _record(conn, kind, cursor.rowcount)
+        report.written += cursor.rowcount
+        report.unchanged += len(batch) - cursor.rowcount
+        return
+    except sqlite3.IntegrityError:
+        pass
+    # Something in the batch violates a constraint: find it row by row, one
+    # savepoint each, and still commit the rest of the batch together
+    with conn:
+        conn.execute("BEGIN")
+        written = 0
+        for line, values in batch:
+            conn.execute("SAVEPOINT import_row")
+            try:
+                changed = conn.execute(entity.sql, values).rowcount
+            except sqlite3.IntegrityError as e:
+                conn.execute("ROLLBACK TO import_row")
+                report.error(line, str(e))
+            else:
+                written += changed
+                report.unchanged += 1 - changed
+            conn.execute("RELEASE import_row")
+        _record(conn, kind, written)
+    report.written += written
+
+
+def _record(conn, kind, written):
+    # Imports span many rows and properties, so they're one change for everyone
+    if written and kind in RECORDED:
+        changes.record(conn, kind, "imported")
+
+
+def import_rows(conn, kind, lines, fmt="csv", batch_size=IMPORT_BATCH_SIZE):
+    """Import every row from ``lines`` into the table for ``kind``; returns an ImportReport."""
+    entity = ENTITIES[kind]
+    report = ImportReport(kind)
+    batch = []
+    for line, record in read_rows(lines, fmt):
+        report.received += 1
+        try:
+            if isinstance(record, RowError):
+                raise record
+            batch.append((line, entity.parse(record)))
+        except RowError as e:
+            report.error(line, str(e))
+        if len(batch) >= batch_size:
+            _write_batch(conn, kind, entity, batch, report)
+            batch = []
+    if batch:
+        _write_batch(conn, kind, entity, batch, report)
+    return report
+
+
+def _queued_lines(chunks):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")("replace")
+    pending = ""
+    while True:
+        chunk = chunks.get()
+        parts = (pending + decoder.decode(chunk or b"", final=chunk is None)).split("\n")
+        pending = parts.pop()
+        for part in parts:
+            yield part + "\n"
+        if chunk is None:
+            if pending:
+                yield pending
+            return
+
+
+async def import_stream(db, kind, body, fmt, batch_size=IMPORT_BATCH_SIZE):
+    """Import a request body as it arrives.
+
+    The event loop only moves chunks into a small bounded queue; parsing,
+    validation and writes all happen on one DB executor thread, so a large
+    import neither buffers the body nor blocks other requests.
+    """
+    chunks = queue.Queue(maxsize=8)
+
+    def run(conn):
+        with db.untraced(conn):
+            return import_rows(conn, kind, _queued_lines(chunks), fmt, batch_size)
+
+    task = asyncio.ensure_future(db.run(run))
+    try:
+        async for chunk in body:
+            # The importer can stop early, so never wait on a full queue forever
+            while not task.done():
+                try:
+                    await asyncio.to_thread(chunks.put, chunk, True, 0.5)
+                    break
+                except queue.Full:
+                    continue
+            if task.done():
+                break
+    finally:
+        if not task.done():
+            await asyncio.to_thread(chunks.put, None)
+    return await task
+
+
+def guess_format(filename, content_type=""):
+    if "ndjson" in content_type or "json" in content_type or filename.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return "csv"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bulk import CSV or NDJSON rows")
+    parser.add_argument("kind", choices=sorted(ENTITIES))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    import main
+    main.init_db()
+    with open(args.path, newline="", encoding="utf-8-sig") as f, main.get_db() as conn, main.db.untraced(conn):
+        report = import_rows(conn, args.kind, f, args.format or guess_format(args.path), args.batch_size)
+    print(json.dumps(report.as_dict(), indent=2))
+    sys.exit(1 if report.error_count else 0)
@@ -0,0 +1,314 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+import changes
+from extract import extract_document
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", 3))
+INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", 2.0))
+INGEST_ENABLED = os.getenv("INGEST_ENABLED", "1") != "0"
+# A job 'running' this long belongs to a process that died
+INGEST_STALE_AFTER = timedelta(minutes=int(os.getenv("INGEST_STALE_MINUTES", 15)))
+# How often a worker requeues stale jobs and marks its own as still running
+INGEST_REQUEUE_SECONDS = float(os.getenv("INGEST_REQUEUE_SECONDS", 60.0))
+# Longest wait between claims while the database keeps failing
+INGEST_MAX_BACKOFF_SECONDS = 60.0
+
+logger = logging.getLogger("ingest")
+
+JOB_COLUMNS = "id, document_id, status, attempts, max_attempts, error, created_at, updated_at, available_at"
+
+
+def enqueue(conn, document_id):
+    """Queue a document for extraction inside the caller's transaction."""
+    now = datetime.now().isoformat()
+    cursor = conn.execute("""
+        INSERT INTO ingest_jobs (document_id, status, max_attempts, created_at, updated_at, available_at)
+        VALUES (?, 'queued', ?, ?, ?, ?)
+    """, (document_id, INGEST_MAX_ATTEMPTS, now, now, now))
+    return cursor.lastrowid
+
+
+# The functions below that write are run through Database.write, which commits
+
+def claim(conn, limit):
+    """Atomically move up to ``limit`` runnable jobs to 'running' and return them.
+
+    Safe across processes: the UPDATE takes the write lock, so two workers can
+    never claim the same job.
+    """
+    now = datetime.now().isoformat()
+    return conn.execute(f"""
+        UPDATE ingest_jobs
+        SET status = 'running', attempts = attempts + 1, updated_at = ?
+        WHERE id IN (
+            SELECT id FROM ingest_jobs
+            WHERE status = 'queued' AND available_at <= ?
+            ORDER BY available_at
+            LIMIT ?
+        )
+        RETURNING {JOB_COLUMNS}
+    """, (now, now, limit)).fetchall()
+
+
+def load_job_input(conn, job):
+    doc = conn.execute(
+        "SELECT filename, content_type, sha256 FROM documents WHERE id = ?", (job["document_id"],)
+    ).fetchone()
+    return dict(doc) if doc else None
+
+
+def complete(conn, job_id, document_id, extracted, summary):
+    now = datetime.now().isoformat()
+    row = conn.execute("SELECT extracted_data, property_id FROM documents WHERE id = ?", (document_id,)).fetchone()
+    merged = json.loads(row["extracted_data"] or "{}") if row else {}
+    merged.update(extracted)
+    merged["ingested_at"] = now
+    conn.execute("""
+        UPDATE documents
+        SET extracted_data = ?, content_summary = COALESCE(?, content_summary)
+        WHERE id = ?
+    """, (json.dumps(merged), summary, document_id))
+    conn.execute(
+        "UPDATE ingest_jobs SET status = 'done', error = NULL, updated_at = ? WHERE id = ?",
+        (now, job_id),
+    )
+    if row:
+        changes.record(conn, "documents", "updated", document_id, row["property_id"])
+
+
+def fail(conn, job, error):
+    now = datetime.now()
+    if job["attempts"] < job["max_attempts"]:
+        # Exponential backoff: 10s, 40s, 90s, ...
+        retry_at = now + timedelta(seconds=10 * job["attempts"] ** 2)
+        status, available_at = "queued", retry_at.isoformat()
+    else:
+        status, available_at = "failed", job["available_at"]
+    conn.execute("""
+        UPDATE ingest_jobs SET status = ?, error = ?, updated_at = ?, available_at = ?
+        WHERE id = ?
+    """, (status, error[:2000], now.isoformat(), available_at, job["id"]))
+
+
+def requeue_stale(conn, running=()):
+    """Requeue jobs left 'running' by a process that died; ``running`` are the caller's own, still in flight."""
+    now = datetime.now()
+    if running:
+        # Long extractions in a live process are not stale
+        conn.execute(f"""
+            UPDATE ingest_jobs SET updated_at = ? WHERE id IN ({', '.join('?' * len(running))}) AND status = 'running'
+        """, (now.isoformat(), *running))
+    cutoff = (now - INGEST_STALE_AFTER).isoformat()
+    conn.execute(
+        "UPDATE ingest_jobs SET status = 'queued' WHERE status = 'running' AND updated_at < ?",
+        (cutoff,),
+    )
+
+
+def release(conn, job_ids):
+    """Queue again jobs whose extraction a stopping worker abandoned; the attempt doesn't count."""
+    conn.execute(f"""
+        UPDATE ingest_jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), updated_at = ?
+        WHERE id IN ({', '.join('?' * len(job_ids))}) AND status = 'running'
+    """, (datetime.now().isoformat(), *job_ids))
+
+
+def retry(conn, job_id):
+    now = datetime.now().isoformat()
+    cursor = conn.execute("""
+        UPDATE ingest_jobs
+        SET status = 'queued', attempts = 0, error = NULL, updated_at = ?, available_at = ?
+        WHERE id = ? AND status IN ('failed', 'done')
+    """, (now, now, job_id))
+    return cursor.rowcount
+
+
+def get_job(conn, job_id):
+    row = conn.execute(f"SELECT {JOB_COLUMNS} FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def list_jobs(conn, status=None, document_id=None, limit=100):
+    clauses, params = [], []
+    if status:
+        clauses.append("status = ?")
+        params.append(status)
+    if document_id is not None:
+        clauses.append("document_id = ?")
+        params.append(document_id)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = conn.execute(f"""
+        SELECT {JOB_COLUMNS} FROM ingest_jobs {where} ORDER BY id DESC LIMIT ?
+    """, (*params, limit)).fetchall()
+    return [dict(row) for row in rows]
+
+
+def queue_stats(conn):
+    rows = conn.execute("SELECT status, COUNT(*) AS count FROM ingest_jobs GROUP BY status").fetchall()
+    return {row["status"]: row["count"] for row in rows}
+
+
+class IngestWorker:
+    """Drains ingest_jobs into a process pool.
+
+    Extraction is CPU-bound, so it runs in separate processes and never holds
+    the API's GIL; the event loop only claims jobs and writes results back,
+    and at most ``concurrency`` documents are in flight per API process so a
+    burst of uploads queues up instead of starving request handling.
+    """
+
+    def __init__(self, db, blob_store, concurrency=INGEST_WORKERS, on_complete=None):
+        self.db = db
+        self.blob_store = blob_store
+        self.on_complete = on_complete
+        self.concurrency = concurrency
+        self.wakeup = asyncio.Event()
+        self.pausing = asyncio.Event()
+        self.pool = None
+        # Another worker whose processes this one uses
+        self.shared = None
+        self.task = None
+        # task -> id of the job it extracts
+        self.in_flight = {}
+        # Results being written; pausing waits for them
+        self.writing = set()
+
+    def notify(self):
+        self.wakeup.set()
+
+    async def start(self, shared=None):
+        """Start claiming jobs; ``shared`` is another worker whose processes to use, e.g. one pool for every shard."""
+        self.shared = shared
+        self.pausing.clear()
+        self.task = asyncio.create_task(self._run())
+
+    def _new_pool(self):
+        # spawn, not fork: the API process has DB and executor threads running
+        return ProcessPoolExecutor(self.concurrency, mp_context=multiprocessing.get_context("spawn"))
+
+    def _executor(self):
+        if self.shared is not None:
+            return self.shared._executor()
+        if self.pool is None:
+            self.pool = self._new_pool()
+        return self.pool
+
+    def _replace(self, broken):
+        # A process that died (killed, out of memory) breaks the whole pool; later jobs need a new one
+        if self.shared is not None:
+            self.shared._replace(broken)
+        elif self.pool is broken:
+            logger.error("ingest process pool broke; starting a new one")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.pool = self._new_pool()
+
+    async def pause(self):
+        """Stop claiming jobs; once this returns the worker writes nothing until started again.
+
+        Extractions under way are abandoned and their jobs queued again.
+        Results already handed to the database are waited for.
+        """
+        # Not cancelled: a claim already sent to the database would still commit after this returns
+        self.pausing.set()
+        self.wakeup.set()
+        if self.task:
+            await self.task
+            self.task = None
+        abandoned = dict(self.in_flight)
+        for task in abandoned:
+            task.cancel()
+        await asyncio.gather(*abandoned, return_exceptions=True)
+        await asyncio.gather(*self.writing, return_exceptions=True)
+        if abandoned:
+            try:
+                await self.db.write(release, tuple(abandoned.values()))
+            except Exception:
+                logger.exception("could not queue %d abandoned ingest jobs again; they are requeued once stale",
+                                 len(abandoned))
+
+    async def stop(self):
+        await self.pause()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    async def _run(self):
+        backoff = INGEST_POLL_SECONDS
+        requeued = None
+        while not self.pausing.is_set():
+            free = self.concurrency - len(self.in_flight)
+            try:
+                if requeued is None or asyncio.get_running_loop().time() - requeued >= INGEST_REQUEUE_SECONDS:
+                    await self.db.write(requeue_stale, tuple(self.in_flight.values()))
+                    requeued = asyncio.get_running_loop().time()
+                jobs = await self.db.write(claim, free) if free > 0 else []
+            except Exception:
+                # A locked or failing database delays ingestion; it must not end it
+                logger.exception("ingest queue write failed; retrying in %.1f s", backoff)
+                try:
+                    await asyncio.wait_for(self.pausing.wait(), backoff)
+                except asyncio.TimeoutError:
+                    pass
+                backoff = min(backoff * 2, INGEST_MAX_BACKOFF_SECONDS)
+                continue
+            backoff = INGEST_POLL_SECONDS
+            for job in jobs:
+                task = asyncio.create_task(self._process(job))
+                self.in_flight[task] = job["id"]
+                task.add_done_callback(self._finished)
+            if not jobs and not self.pausing.is_set():
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), INGEST_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _finished(self, task):
+        self.in_flight.pop(task, None)
+        self.wakeup.set()
+
+    async def _process(self, job):
+        try:
+            doc = await self.db.run(load_job_input, job)
+            if doc is None:
+                raise LookupError(f"Document {job['document_id']} no longer exists")
+            path = self.blob_store.path_for(doc["sha256"])
+            loop = asyncio.get_running_loop()
+            pool = self._executor()
+            try:
+                extracted, summary = await loop.run_in_executor(
+                    pool, extract_document, path, doc["filename"], doc["content_type"]
+                )
+            except BrokenProcessPool:
+                self._replace(pool)
+                raise
+            result = (complete, job["id"], job["document_id"], extracted, summary)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            result = (fail, job, f"{type(e).__name__}: {e}")
+        # From here the job is finished, not abandoned: pausing waits for the write
+        self.in_flight.pop(asyncio.current_task(), None)
+        writing = asyncio.ensure_future(self._write(job, result))
+        self.writing.add(writing)
+        writing.add_done_callback(self.writing.discard)
+        await asyncio.shield(writing)
+
+    async def _write(self, job, result):
+        fn, *args = result
+        try:
+            await self.db.write(fn, *args)
+        except Exception:
+            # The job stays 'running' and is requeued once stale
+            logger.exception("could not record the result of ingest job %s", job["id"])
+            return
+        if fn is complete and self.on_complete:
+            self.on_complete(job)
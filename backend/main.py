@@ -1,20 +1,59 @@
+import asyncio
 import os
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import json
-from datetime import datetime, timedelta
-import sqlite3
-from contextlib import contextmanager
+import mimetypes
+from contextlib import asynccontextmanager
+from datetime import datetime
+import time
+from db import Database
+from router import ROUTER
+from aggregates import load_analytics, merge_analytics
+from search import SOURCES as SEARCH_SOURCES, merge as merge_search, search
+from cache import ResponseCache, cached_json, etag_matches
+from dashboard import OWNER_SECTIONS, TENANT_SECTIONS, Dashboard, selection
+from pagination import MAX_PAGE_SIZE, Listing, page_headers
+from vectors import VectorIndex, semantic_answer
+from rentroll import ESCALATION_PCT, MAX_MONTHS, RentRoll, merge_projections, month_number
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, METRICS_ENABLED, Metrics, MetricsMiddleware, SqlTimer
+from storage import BlobStore, UploadError, receive_upload
+from downloads import content_disposition, file_response
+from thumbnails import THUMBNAIL_SIZES, ThumbnailCache
+import changes
+import entities
+import importer
+import ingest
+import migrations
+import rollup
+import schema_v1
+import shards
+import sqljson
+import vectors
 
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
 DATA_DIR = os.getenv("DATA_DIR", "./data")
 os.makedirs(DATA_DIR, exist_ok=True)
 DB_PATH = os.path.join(DATA_DIR, "real_estate.db")
-
-app = FastAPI(title="Real Estate Asset Brain API")
+# Only with DB_SHARDING=1: users and where each portfolio lives, and the portfolios other than the default
+CATALOG_PATH = os.path.join(DATA_DIR, "catalog.db")
+SHARD_DIR = os.path.join(DATA_DIR, "shards")
+BLOB_DIR = os.path.join(DATA_DIR, "blobs")
+VECTOR_DIR = os.path.join(DATA_DIR, "vectors")
+THUMBNAIL_DIR = os.path.join(DATA_DIR, "thumbnails")
+
+@asynccontextmanager
+async def lifespan(app):
+    # Nothing touches the database at import; startup migrates it and starts the workers
+    await startup()
+    yield
+    await shutdown()
+
+app = FastAPI(title="Real Estate Asset Brain API", lifespan=lifespan)
 
 allow_origins = [
     FRONTEND_URL,
@@ -32,117 +71,127 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@contextmanager
+metrics = Metrics()
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+db = Database(DB_PATH, tracer=SqlTimer(metrics) if METRICS_ENABLED else None)
+# Users live here; without sharding it is the one database
+catalog = Database(CATALOG_PATH, tracer=SqlTimer(metrics) if METRICS_ENABLED else None) if shards.SHARDING_ENABLED else db
+blob_store = BlobStore(BLOB_DIR)
+thumbnail_cache = ThumbnailCache(THUMBNAIL_DIR)
+response_cache = ResponseCache()
+
+# Cached tables each change_log entity stands for
+ENTITY_TABLES = {"properties": ("properties",), "users": ("users",), "maintenance": ("maintenance_issues",),
+                 "documents": ("documents",)}
+
+def _logged(kinds):
+    # change_log rows the feed read, from this process or any other: cached responses they touch go stale
+    response_cache.bump(*(table for kind in kinds for table in ENTITY_TABLES.get(kind, ())))
+
+def _portfolio(name, number, path, database, vector_dir):
+    shard = shards.Shard(name, number, path, database, VectorIndex(vector_dir, database), RentRoll(),
+                         changes.ChangeFeed(database, on_change=_logged),
+                         maintenance_columns=rollup.MaintenanceColumns(), entities=entities.EntityIndex())
+    shard.ingest_worker = ingest.IngestWorker(database, blob_store,
+                                              on_complete=lambda job: _changed(shard, "documents"))
+    return shard
+
+default_shard = _portfolio(shards.DEFAULT_PORTFOLIO, 0, DB_PATH, db, VECTOR_DIR)
+vector_index = default_shard.vector_index
+rent_roll = default_shard.rent_roll
+change_feed = default_shard.change_feed
+ingest_worker = default_shard.ingest_worker
+
+def _changed(shard, *tables):
+    # After a write commits: drop cached responses and push its change_log rows to subscribers
+    response_cache.bump(*tables)
+    shard.change_feed.notify()
+    if {"maintenance_issues", "documents"} & set(tables):
+        shard.vector_index.notify()
+
 def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
+    return db.connection()
 
-def init_db():
+def create_catalog(cursor):
+    # The catalog starts with the users real_estate.db had, which becomes the default portfolio
     with get_db() as conn:
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS properties (
-                id TEXT PRIMARY KEY,
-                address TEXT NOT NULL,
-                type TEXT,
-                tenant_name TEXT,
-                lease_type TEXT,
-                rent_amount REAL,
-                lease_start_date TEXT,
-                lease_end_date TEXT,
-                landlord_name TEXT,
-                pan_number TEXT,
-                created_at TEXT
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS maintenance_issues (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                property_id TEXT,
-                category TEXT,
-                description TEXT,
-                date TEXT,
-                status TEXT,
-                cost REAL,
-                vendor TEXT,
-                created_at TEXT,
-                FOREIGN KEY (property_id) REFERENCES properties(id)
-            )
-        """)
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS documents (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                property_id TEXT,
-                type TEXT,
-                filename TEXT,
-                upload_date TEXT,
-                extracted_data TEXT,
-                content_summary TEXT,
-                FOREIGN KEY (property_id) REFERENCES properties(id)
-            )
-        """)
-        
-        # Create users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id TEXT PRIMARY KEY,
-                username TEXT UNIQUE,
-                password TEXT,
-                role TEXT,
-                property_id TEXT
-            )
-        """)
-        
-        # Check if users exist and insert seed data
-        cursor.execute("SELECT count(*) FROM users")
-        if cursor.fetchone()[0] == 0:
-            users = [
-                ("user_owner", "Ishaan", "Ishaan123", "owner", None),
-                ("user_tenant_1", "Chintu", "Chintu123", "tenant", "mumbai_galaxy"),
-                ("user_tenant_2", "suresh", "tenant123", "tenant", "bangalore_tech"),
-            ]
-            cursor.executemany("INSERT INTO users VALUES (?, ?, ?, ?, ?)", users)
-
-        # Insert sample properties if empty
-        cursor.execute("SELECT count(*) FROM properties")
-        if cursor.fetchone()[0] == 0:
-            properties = [
-                ("mumbai_galaxy", "101, Galaxy Heights, Bandra West, Mumbai", "Residential", "Chintu", "11-Month Agreement", 85000, "2024-01-01", "2024-12-31", "Ishaan Chawla", "ABCPV1234A"),
-                ("bangalore_tech", "Unit 402, Tech Park View, Koramangala, Bangalore", "Commercial", "Innovate Solutions Pvt Ltd", "Triple Net", 150000, "2023-04-01", "2026-03-31", "Ishaan Chawla", "XYZPM5678B"),
-                ("delhi_villa", "Villa 12, Green Park, South Delhi", "Residential", "Mehta Family", "Standard Lease", 120000, "2024-06-01", "2025-05-31", "Ishaan Chawla", "PQRSJ9012C"),
-            ]
-            
-            for prop in properties:
-                cursor.execute("""
-                    INSERT INTO properties (id, address, type, tenant_name, lease_type, rent_amount, lease_start_date, lease_end_date, landlord_name, pan_number, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (*prop, datetime.now().isoformat()))
-            
-            issues = [
-                ("mumbai_galaxy", "plumbing", "Monsoon leakage in master bedroom wall", "2024-07-15", "Resolved", 4500, "QuickFix Utilities"),
-                ("bangalore_tech", "electrical", "UPS Battery replacement for server room", "2024-02-20", "Resolved", 12000, "PowerSafe Ltd"),
-                ("mumbai_galaxy", "electrical", "Geyser switch burnout", "2024-08-10", "Resolved", 850, "Local Electrician"),
-                ("delhi_villa", "gardening", "Seasonal lawn maintenance and pruning", "2024-09-05", "In Progress", 2500, "Green Thumbs"),
-                ("mumbai_galaxy", "painting", "Living room touch-up paint", "2024-01-10", "Resolved", 15000, "Asian Paints Service"),
-            ]
-            
-            for issue in issues:
-                cursor.execute("""
-                    INSERT INTO maintenance_issues (property_id, category, description, date, status, cost, vendor, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (*issue, datetime.now().isoformat()))
-        
-        conn.commit()
+        users = [tuple(user) for user in conn.execute("SELECT * FROM users")]
+    schema_v1.create_catalog(cursor, DB_PATH, users)
+
+# Schema migrations by PRAGMA user_version (see migrations.py); append, never edit.
+# A step never calls code that is edited later: a schema change is a new step
+MIGRATIONS = [
+    # 1: the schema when versioning began, frozen; idempotent, so it also brings older databases up to date
+    schema_v1.create,
+    # 2: aliases for entity resolution
+    entities.create_alias_table,
+    # 3: vector queue triggers an upsert can't trip over
+    vectors.queue_without_conflicts,
+]
+CATALOG_MIGRATIONS = [
+    create_catalog,
+]
 
+def open_portfolio_schema(conn, number):
+    # A portfolio's own database, with ids in its own range
+    migrations.migrate(conn, MIGRATIONS)
+    shards.reserve_ids(conn, number)
+    conn.commit()
 
-init_db()
+def init_db():
+    """Migrate the database, and the catalog when sharded; the lifespan hook runs this before serving."""
+    with get_db() as conn:
+        if migrations.migrate(conn, MIGRATIONS):
+            conn.execute("PRAGMA optimize")
+    if shards.SHARDING_ENABLED:
+        with catalog.connection() as conn:
+            migrations.migrate(conn, CATALOG_MIGRATIONS)
+
+async def _open_shard(name, number, path):
+    database = Database(path, pool_size=shards.SHARD_POOL_SIZE, tracer=SqlTimer(metrics) if METRICS_ENABLED else None)
+
+    await database.run(open_portfolio_schema, number)
+    return _portfolio(name, number, path, database, os.path.join(SHARD_DIR, f"{name}.vectors"))
+
+def _rebalanced():
+    # Rows moved between portfolios by another process
+    response_cache.bump("properties", "maintenance_issues", "documents", "users")
+
+shard_router = shards.Shards(catalog, default_shard, _open_shard, SHARD_DIR, on_change=_rebalanced)
+
+async def _start_shard(shard):
+    if ingest.INGEST_ENABLED:
+        # Portfolios share the default one's extraction processes
+        await shard.ingest_worker.start(None if shard is default_shard else ingest_worker)
+    await shard.change_feed.start()
+    if vectors.VECTOR_SYNC_ENABLED:
+        await shard.vector_index.start()
+
+
+async def startup():
+    await asyncio.to_thread(init_db)
+    # Workers of a portfolio being split or moved start paused
+    await shard_router.start(_start_shard)
+    # Opening the other portfolios starts their workers too
+    await shard_router.all()
+
+async def shutdown():
+    await shard_router.close()
+    await ingest_worker.stop()
+    await change_feed.stop()
+    await vector_index.stop()
+    db.close()
+
+@app.exception_handler(shards.ShardUnavailable)
+async def shard_unavailable(request: Request, exc: shards.ShardUnavailable):
+    return JSONResponse(status_code=503, headers={"Retry-After": str(int(shards.DRAIN_SECONDS) + 1)},
+                        content={"detail": f"Portfolio {exc} is being moved; try again shortly"})
+
+@app.exception_handler(shards.UnknownPortfolio)
+async def unknown_portfolio(request: Request, exc: shards.UnknownPortfolio):
+    return JSONResponse(status_code=404, content={"detail": f"Unknown portfolio {exc}"})
 
 class LoginRequest(BaseModel):
     username: str
@@ -150,14 +199,11 @@ class LoginRequest(BaseModel):
 
 @app.post("/api/login")
 async def login(creds: LoginRequest):
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, username, role, property_id FROM users WHERE username = ? AND password = ?", (creds.username, creds.password))
-        user = cursor.fetchone()
-        
-        if user:
-            return {"status": "success", "user": {"id": user[0], "username": user[1], "role": user[2], "property_id": user[3]}}
-        return {"status": "error", "message": "Invalid credentials"}
+    user = await catalog.fetchone("SELECT id, username, role, property_id FROM users WHERE username = ? AND password = ?", (creds.username, creds.password))
+    
+    if user:
+        return {"status": "success", "user": {"id": user[0], "username": user[1], "role": user[2], "property_id": user[3]}}
+    return {"status": "error", "message": "Invalid credentials"}
 
 class Property(BaseModel):
     id: str
@@ -183,53 +229,123 @@ class MaintenanceIssue(BaseModel):
 
 class QueryRequest(BaseModel):
     query: str
+    # Sharded deployments answer over one portfolio
+    portfolio: Optional[str] = None
 
 class QueryResponse(BaseModel):
     answer: str
     data: List[dict]
     query_type: str
+    intent: Optional[str] = None
+    timings: Optional[dict] = None
+    # The properties, places, people, vendors and categories the question named
+    entities: Optional[List[dict]] = None
+
+class AliasCreate(BaseModel):
+    alias: str
+    kind: str
+    id: str
+    portfolio: Optional[str] = None
 
 @app.get("/")
 async def root():
     return {"message": "Real Estate Asset Brain API", "status": "running"}
 
 @app.get("/api/properties")
-async def get_properties():
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM properties")
-        rows = cursor.fetchall()
-        return [dict(row) for row in rows]
+async def get_properties(request: Request):
+    async def _load():
+        shards_ = await shard_router.all()
+        if sqljson.SQL_JSON_ENABLED:
+            bodies = await shard_router.gather(lambda shard: shard.db.run(sqljson.array, "SELECT * FROM properties"),
+                                               shards_)
+            if None not in bodies:
+                return sqljson.concat(bodies)
+        parts = await shard_router.gather(lambda shard: shard.db.fetchall("SELECT * FROM properties"), shards_)
+        return [dict(row) for rows in parts for row in rows]
+    shard_router.refresh()
+    return await cached_json(request, response_cache, "properties", ("properties",), _load)
 
 @app.get("/api/properties/{property_id}")
-async def get_property(property_id: str):
-    with get_db() as conn:
+async def get_property(request: Request, property_id: str):
+    shard_router.refresh()
+    return await cached_json(request, response_cache, f"property:{property_id}",
+                             ("properties", "maintenance_issues"), lambda: _load_property(property_id))
+
+async def _load_property(property_id):
+    def _load(conn):
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM properties WHERE id = ?", (property_id,))
         prop = cursor.fetchone()
         if not prop:
-            raise HTTPException(status_code=404, detail="Property not found")
-        
+            return None, []
         cursor.execute("SELECT * FROM maintenance_issues WHERE property_id = ?", (property_id,))
-        issues = cursor.fetchall()
-        
-        return {
-            "property": dict(prop),
-            "maintenance_history": [dict(issue) for issue in issues]
-        }
+        return prop, cursor.fetchall()
+
+    shard = await shard_router.for_property(property_id)
+    prop, issues = await shard.db.run(_load)
+    if not prop:
+        raise HTTPException(status_code=404, detail="Property not found")
+    
+    return {
+        "property": dict(prop),
+        "maintenance_history": [dict(issue) for issue in issues]
+    }
+
+MAINTENANCE_LISTING = Listing(
+    "maintenance",
+    "SELECT m.*, p.address FROM maintenance_issues m JOIN properties p ON m.property_id = p.id",
+    keys=("m.date", "m.id"),
+    filters={"property_id": "m.property_id", "status": "m.status", "category": "m.category"},
+)
+
+async def _listing_page(listing, filters, cursor, limit):
+    shards_ = await shard_router.scope(filters.get("property_id"))
+    if len(shards_) == 1:
+        return await shards_[0].db.run(listing.page, filters, cursor, limit)
+    # Every shard's own page after the cursor, merged on the same keys
+    pages = await shard_router.gather(lambda shard: shard.db.run(listing.page, filters, cursor, limit), shards_)
+    return listing.merge(pages, limit)
+
+async def _listing_json(listing, filters, cursor, limit):
+    # _listing_page with the body encoded by SQLite; None when disabled or a value needs Python's encoding
+    if not sqljson.SQL_JSON_ENABLED:
+        return None
+    shards_ = await shard_router.scope(filters.get("property_id"))
+    if len(shards_) == 1:
+        return await shards_[0].db.run(listing.page_json, filters, cursor, limit)
+    pages = await shard_router.gather(lambda shard: shard.db.run(listing.page_json, filters, cursor, limit, True),
+                                      shards_)
+    return None if None in pages else listing.merge_json(pages, limit)
 
 @app.get("/api/maintenance")
-async def get_maintenance():
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT m.*, p.address 
-            FROM maintenance_issues m
-            JOIN properties p ON m.property_id = p.id
-            ORDER BY m.date DESC
-        """)
-        rows = cursor.fetchall()
-        return [dict(row) for row in rows]
+async def get_maintenance(
+    request: Request,
+    property_id: Optional[str] = None,
+    status: Optional[str] = None,
+    category: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    # Without a limit the whole list is returned, as before; with one, the
+    # next page's cursor comes back in X-Next-Cursor and a Link header
+    filters = {"property_id": property_id, "status": status, "category": category}
+    async def _load():
+        rows, next_cursor = (await _listing_json(MAINTENANCE_LISTING, filters, cursor, limit)
+                             or await _listing_page(MAINTENANCE_LISTING, filters, cursor, limit))
+        return rows, page_headers(request, next_cursor)
+    shard_router.refresh()
+    return await cached_json(request, response_cache, f"maintenance?{request.url.query}",
+                             ("maintenance_issues", "properties"), _load)
+
+@app.get("/api/maintenance/export")
+async def export_maintenance(
+    format: str = "ndjson",
+    property_id: Optional[str] = None,
+    status: Optional[str] = None,
+    category: Optional[str] = None,
+):
+    filters = {"property_id": property_id, "status": status, "category": category}
+    return MAINTENANCE_LISTING.export([s.db for s in await shard_router.scope(property_id)], filters, format)
 
 class MaintenanceCreateRequest(BaseModel):
     property_id: str
@@ -238,9 +354,8 @@ class MaintenanceCreateRequest(BaseModel):
 
 @app.post("/api/maintenance")
 async def create_maintenance_issue(issue: MaintenanceCreateRequest):
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
+    def _create(conn):
+        cursor = conn.execute("""
             INSERT INTO maintenance_issues (property_id, category, description, date, status, cost, vendor, created_at)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         """, (
@@ -253,7 +368,11 @@ async def create_maintenance_issue(issue: MaintenanceCreateRequest):
             "Pending Assignment",
             datetime.now().isoformat()
         ))
-        conn.commit()
+        changes.record(conn, "maintenance", "created", cursor.lastrowid, issue.property_id)
+
+    shard = await shard_router.for_property(issue.property_id, write=True)
+    await shard.db.write(_create)
+    _changed(shard, "maintenance_issues")
     return {"status": "success", "message": "Issue reported successfully"}
 
 class TenantOnboardingRequest(BaseModel):
@@ -268,27 +387,53 @@ class TenantOnboardingRequest(BaseModel):
 @app.post("/api/tenants")
 async def onboard_tenant(data: TenantOnboardingRequest):
     import uuid
-    with get_db() as conn:
+
+    user_id = f"user_{str(uuid.uuid4())[:8]}"
+
+    def _create_user(conn):
         cursor = conn.cursor()
         
         # Check username
         cursor.execute("SELECT 1 FROM users WHERE username = ?", (data.username,))
         if cursor.fetchone():
-             return {"status": "error", "message": "Username already taken"}
+             return False
 
         # Create Uer
-        user_id = f"user_{str(uuid.uuid4())[:8]}"
         cursor.execute("INSERT INTO users VALUES (?, ?, ?, ?, ?)", 
                       (user_id, data.username, data.password, "tenant", data.property_id))
+        return True
 
-        # Update Property
+    def _update_property(conn):
+        cursor = conn.cursor()
         cursor.execute("""
             UPDATE properties 
             SET tenant_name = ?, rent_amount = ?, lease_start_date = ?, lease_end_date = ?
             WHERE id = ?
         """, (data.name, data.rent_amount, data.lease_start, data.lease_end, data.property_id))
-        
-        conn.commit()
+        changes.record(conn, "users", "created", user_id, data.property_id)
+        changes.record(conn, "properties", "updated", data.property_id, data.property_id)
+
+    def _onboard(conn):
+        if not _create_user(conn):
+            return False
+        _update_property(conn)
+        return True
+
+    shard = await shard_router.for_property(data.property_id, write=True)
+    if shard.db is catalog:
+        created = await catalog.write(_onboard)
+    else:
+        # Users and the property are in different databases: undo the user if the property update fails
+        created = await catalog.write(_create_user)
+        if created:
+            try:
+                await shard.db.write(_update_property)
+            except BaseException:
+                await catalog.write(lambda conn: conn.execute("DELETE FROM users WHERE id = ?", (user_id,)))
+                raise
+    if not created:
+        return {"status": "error", "message": "Username already taken"}
+    _changed(shard, "users", "properties")
     
     return {"status": "success", "message": "Tenant onboarded successfully"}
 
@@ -297,237 +442,552 @@ class MaintenanceStatusUpdate(BaseModel):
 
 @app.put("/api/maintenance/{issue_id}/status")
 async def update_maintenance_status(issue_id: int, update: MaintenanceStatusUpdate):
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("UPDATE maintenance_issues SET status = ? WHERE id = ?", (update.status, issue_id))
-        conn.commit()
+    def _update(conn):
+        row = conn.execute("SELECT property_id FROM maintenance_issues WHERE id = ?", (issue_id,)).fetchone()
+        conn.execute("UPDATE maintenance_issues SET status = ? WHERE id = ?", (update.status, issue_id))
+        if row:
+            changes.record(conn, "maintenance", "updated", issue_id, row["property_id"])
+
+    shard = await shard_router.for_row("maintenance_issues", issue_id, write=True)
+    await shard.db.write(_update)
+    _changed(shard, "maintenance_issues")
     return {"status": "success", "message": "Status updated"}
 
+@app.get("/api/changes")
+async def change_stream(
+    request: Request,
+    user_id: str,
+    entities: Optional[str] = None,
+    property_id: Optional[str] = None,
+    last_event_id: Optional[int] = Query(None, ge=0),
+):
+    # Owners see every change, tenants their property's. A reconnecting
+    # EventSource sends Last-Event-ID and gets what it missed; a 'reset'
+    # event means refetch everything
+    user = await catalog.fetchone("SELECT role, property_id FROM users WHERE id = ?", (user_id,))
+    if user is None:
+        raise HTTPException(status_code=403, detail="Unknown user")
+    if user["role"] != "owner":
+        if user["property_id"] is None:
+            raise HTTPException(status_code=403, detail="No property assigned")
+        property_id = user["property_id"]
+    wanted = [e for e in (entities or "").split(",") if e]
+    if any(e not in changes.ENTITIES for e in wanted):
+        raise HTTPException(status_code=400, detail=f"entities must be among {', '.join(changes.ENTITIES)}")
+    header = request.headers.get("last-event-id", "")
+    if header.isdigit():
+        last_event_id = int(header)
+    shards_ = await shard_router.scope(property_id)
+    if len(shards_) == 1:
+        stream = shards_[0].change_feed.stream(property_id, wanted, last_event_id)
+    else:
+        # An owner's stream is every portfolio's, and their event ids can't be resumed together
+        stream = changes.merge_streams([s.change_feed.stream(None, wanted) for s in shards_],
+                                       "resume" if last_event_id is not None else None)
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.post("/api/query")
 async def query_brain(request: QueryRequest):
-    query = request.query.lower()
-    
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        if "plumbing" in query and ("mumbai" in query or "galaxy" in query):
-            cursor.execute("""
-                SELECT * FROM maintenance_issues 
-                WHERE property_id = 'mumbai_galaxy' AND category = 'plumbing'
-                ORDER BY date DESC
-            """)
-            issues = [dict(row) for row in cursor.fetchall()]
-            if issues:
-                latest = issues[0]
-                return QueryResponse(
-                    answer=f"The plumbing at 101 Galaxy Heights was last repaired on {latest['date']} by {latest['vendor']} (₹{latest['cost']:,.2f}). Issue: {latest['description']}",
-                    data=issues,
-                    query_type="maintenance_history"
-                )
-        
-        elif "heating" in query and "2023" in query:
-            cursor.execute("""
-                SELECT m.*, p.address 
-                FROM maintenance_issues m
-                JOIN properties p ON m.property_id = p.id
-                WHERE m.category = 'heating' AND m.date LIKE '2023%'
-            """)
-            issues = [dict(row) for row in cursor.fetchall()]
-            return QueryResponse(
-                answer=f"Found {len(issues)} heating complaint(s) in 2023.",
-                data=issues,
-                query_type="filtered_maintenance"
-            )
-        
-        elif "lease" in query and ("expir" in query or "end" in query):
-            six_months = (datetime.now() + timedelta(days=180)).strftime("%Y-%m-%d")
-            cursor.execute("""
-                SELECT * FROM properties 
-                WHERE lease_end_date <= ? AND lease_end_date >= ?
-                ORDER BY lease_end_date
-            """, (six_months, datetime.now().strftime("%Y-%m-%d")))
-            props = [dict(row) for row in cursor.fetchall()]
-            return QueryResponse(
-                answer=f"Found {len(props)} lease(s) expiring in the next 6 months.",
-                data=props,
-                query_type="expiring_leases"
-            )
-        
-        elif "maintenance" in query and "cost" in query:
-            cursor.execute("""
-                SELECT p.address, SUM(m.cost) as total_cost, COUNT(*) as issue_count
-                FROM maintenance_issues m
-                JOIN properties p ON m.property_id = p.id
-                GROUP BY p.address
-            """)
-            costs = [dict(row) for row in cursor.fetchall()]
-            total = sum(c['total_cost'] for c in costs)
-            return QueryResponse(
-                answer=f"Total maintenance costs across all properties: ${total:,.2f}",
-                data=costs,
-                query_type="financial_summary"
-            )
-        
-        elif "triple net" in query or "nnn" in query:
-            cursor.execute("SELECT * FROM properties WHERE lease_type = 'Triple Net'")
-            props = [dict(row) for row in cursor.fetchall()]
-            return QueryResponse(
-                answer=f"Found {len(props)} Triple Net Lease properties.",
-                data=props,
-                query_type="lease_type_info"
-            )
-        
-        elif "recurring" in query or "multiple" in query:
-            cursor.execute("""
-                SELECT property_id, category, COUNT(*) as occurrence_count, 
-                       GROUP_CONCAT(date) as dates, SUM(cost) as total_cost
-                FROM maintenance_issues
-                GROUP BY property_id, category
-                HAVING COUNT(*) > 1
-                ORDER BY occurrence_count DESC
-            """)
-            recurring = [dict(row) for row in cursor.fetchall()]
-            return QueryResponse(
-                answer=f"Found {len(recurring)} recurring maintenance issues across properties.",
-                data=recurring,
-                query_type="recurring_issues"
-            )
-        
-        else:
-            cursor.execute("SELECT COUNT(*) as count FROM properties")
-            prop_count = cursor.fetchone()['count']
-            
-            cursor.execute("SELECT SUM(rent_amount) as total FROM properties")
-            total_rent = cursor.fetchone()['total']
-            
-            cursor.execute("SELECT COUNT(*) as count FROM maintenance_issues WHERE status = 'In Progress'")
-            active_issues = cursor.fetchone()['count']
-            
-            return QueryResponse(
-                answer=f"System Overview: {prop_count} properties, ${total_rent:,.2f} total monthly rent, {active_issues} active maintenance issues.",
-                data=[],
-                query_type="system_overview"
-            )
+    shard = await shard_router.for_portfolio(request.portfolio)
+    return await shard.db.run(_answer_query, shard, request.query)
+
+def _answer_query(conn, shard, query):
+    started = time.perf_counter()
+    shard.entities.refresh(conn)
+    loaded = time.perf_counter()
+    route, intent = ROUTER.route(query, shard.entities)
+    routed = time.perf_counter()
+    name = intent.name
+    semantic = None
+    if intent is ROUTER.fallback:
+        # Questions no keyword intent claims try the semantic index before the overview
+        semantic = semantic_answer(shard.vector_index, conn, query)
+    if semantic:
+        (answer, data), name = semantic, "semantic_search"
+    else:
+        answer, data = intent.handler(conn, route)
+    finished = time.perf_counter()
+    return QueryResponse(
+        answer=answer,
+        data=data,
+        query_type=name,
+        intent=name,
+        entities=route.mentions,
+        timings={
+            "route_ms": round((routed - loaded) * 1000, 3),
+            "sql_ms": round((loaded - started + finished - routed) * 1000, 3),
+        },
+    )
+
+def _resolve(conn, shard, q, kinds, limit):
+    shard.entities.refresh(conn)
+    return shard.entities.resolve(q, kinds, limit)
+
+@app.get("/api/entities/resolve")
+async def resolve_entities(
+    q: str = Query(..., min_length=1),
+    kind: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=100),
+    portfolio: Optional[str] = None,
+):
+    # Names as typed, prefixes and typos included, to the entities they most likely mean
+    kinds = None
+    if kind:
+        kinds = {k.strip() for k in kind.split(",") if k.strip()}
+        unknown = kinds - set(entities.KINDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"kind must be among {', '.join(entities.KINDS)}")
+    shards_ = [await shard_router.for_portfolio(portfolio)] if portfolio else await shard_router.all()
+    parts = await shard_router.gather(lambda shard: shard.db.run(_resolve, shard, q, kinds, limit), shards_)
+    matches = sorted((m for part in parts for m in part), key=lambda m: -m["score"])[:limit]
+    return {"query": q, "matches": matches}
+
+@app.post("/api/entities/aliases")
+async def create_alias(alias: AliasCreate):
+    # Another name for an entity, e.g. "HQ" for a property; the index picks it up on its next use
+    if alias.kind not in entities.KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(entities.KINDS)}")
+    if not alias.alias.strip():
+        raise HTTPException(status_code=400, detail="alias must not be empty")
+    shard = await shard_router.for_portfolio(alias.portfolio)
+    await shard.db.run(shard.entities.refresh)
+    target = shard.entities.find(alias.kind, alias.id)
+    if target is None:
+        raise HTTPException(status_code=404, detail=f"No {alias.kind} '{alias.id}'")
+    await shard.db.execute(
+        "INSERT OR IGNORE INTO entity_aliases (alias, kind, entity_key) VALUES (?, ?, ?)",
+        (alias.alias.strip(), alias.kind, target["id"]),
+    )
+    return {"status": "success", "alias": alias.alias.strip(), "entity": target}
+
+@app.get("/api/search")
+async def search_knowledge_base(
+    q: str,
+    kind: str = "all",
+    property_id: Optional[str] = None,
+    category: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    if kind != "all" and kind not in SEARCH_SOURCES:
+        raise HTTPException(status_code=400, detail=f"kind must be one of: all, {', '.join(SEARCH_SOURCES)}")
+    shards_ = await shard_router.scope(property_id)
+    if len(shards_) == 1:
+        return await shards_[0].db.run(search, q, kind, property_id, category, date_from, date_to, limit, offset)
+    # The first offset + limit hits of every shard hold the page
+    parts = await shard_router.gather(
+        lambda shard: shard.db.run(search, q, kind, property_id, category, date_from, date_to, offset + limit, 0),
+        shards_)
+    return merge_search(parts, limit, offset)
+
+@app.get("/api/search/semantic")
+async def semantic_search(q: str, limit: int = Query(10, ge=1, le=100)):
+    parts = await shard_router.gather(lambda shard: shard.db.run(shard.vector_index.search, q, limit),
+                                      await shard_router.all())
+    results = sorted((hit for hits in parts for hit in hits), key=lambda hit: hit["score"], reverse=True)
+    return {"query": q, "results": results[:limit]}
+
+def classify_document(filename):
+    name = filename.lower()
+    return "lease" if "lease" in name else "id_proof" if "pan" in name or "aadhaar" in name else "other"
 
 @app.post("/api/upload")
-async def upload_document(file: UploadFile = File(...), property_id: str = None):
-    content = await file.read()
+async def upload_document(request: Request, property_id: Optional[str] = None):
+    try:
+        fields, files = await receive_upload(request, blob_store)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    
+    upload = next((f for f in files if f.field_name == "file"), None)
+    if upload is None:
+        raise HTTPException(status_code=400, detail="Missing 'file' part")
+    property_id = fields.get("property_id") or property_id or "unassigned"
     
     extracted_data = {
-        "filename": file.filename,
+        "filename": upload.filename,
         "upload_date": datetime.now().isoformat(),
-        "size": len(content),
-        "type": file.content_type
+        "size": upload.size,
+        "type": upload.content_type,
+        "sha256": upload.sha256,
     }
     
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO documents (property_id, type, filename, upload_date, extracted_data, content_summary)
-            VALUES (?, ?, ?, ?, ?, ?)
+    def _store(conn):
+        # The same content re-uploaded for the same property is the same document
+        existing = conn.execute(
+            "SELECT id, extracted_data FROM documents WHERE sha256 = ? AND property_id = ?",
+            (upload.sha256, property_id)
+        ).fetchone()
+        if existing:
+            return existing["id"], json.loads(existing["extracted_data"] or "{}"), True, None
+        cursor = conn.execute("""
+            INSERT INTO documents (property_id, type, filename, upload_date, extracted_data, content_summary, size, sha256, content_type)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (
-            property_id or "unassigned",
-            file.content_type,
-            file.filename,
+            property_id,
+            classify_document(upload.filename),
+            upload.filename,
             datetime.now().isoformat(),
             json.dumps(extracted_data),
-            f"Uploaded {file.filename}"
+            f"Uploaded {upload.filename}",
+            upload.size,
+            upload.sha256,
+            upload.content_type,
         ))
-        conn.commit()
-        doc_id = cursor.lastrowid
+        # Content extraction happens in the background ingest workers
+        job_id = ingest.enqueue(conn, cursor.lastrowid)
+        changes.record(conn, "documents", "created", cursor.lastrowid, property_id)
+        return cursor.lastrowid, extracted_data, False, job_id
+    
+    shard = await shard_router.for_property(property_id, write=True)
+    doc_id, extracted_data, duplicate, job_id = await shard.db.write(_store)
+    if job_id:
+        _changed(shard, "documents")
+        shard.ingest_worker.notify()
     
     return {
         "status": "success",
         "document_id": doc_id,
         "extracted_data": extracted_data,
-        "message": f"Document '{file.filename}' processed successfully"
+        "ingest_job_id": job_id,
+        "deduplicated": duplicate or upload.deduplicated,
+        "message": f"Document '{upload.filename}' " + ("already stored" if duplicate else "processed successfully")
     }
 
+@app.get("/api/ingest/jobs")
+async def list_ingest_jobs(status: Optional[str] = None, document_id: Optional[int] = None, limit: int = Query(100, ge=1, le=1000)):
+    def _load(conn):
+        return {
+            "counts": ingest.queue_stats(conn),
+            "workers": ingest_worker.concurrency,
+            "jobs": ingest.list_jobs(conn, status, document_id, limit),
+        }
+    if document_id is not None:
+        shard = await shard_router.for_row("documents", document_id)
+        return await shard.db.run(_load)
+    parts = await shard_router.gather(lambda shard: shard.db.run(_load), await shard_router.all())
+    if len(parts) == 1:
+        return parts[0]
+    counts = {}
+    for part in parts:
+        for key, value in part["counts"].items():
+            counts[key] = counts.get(key, 0) + value
+    jobs = sorted((job for part in parts for job in part["jobs"]), key=lambda job: job["id"], reverse=True)
+    return {"counts": counts, "workers": ingest_worker.concurrency, "jobs": jobs[:limit]}
+
+@app.get("/api/ingest/jobs/{job_id}")
+async def get_ingest_job(job_id: int):
+    shard = await shard_router.for_row("ingest_jobs", job_id)
+    job = await shard.db.run(ingest.get_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/api/ingest/jobs/{job_id}/retry")
+async def retry_ingest_job(job_id: int):
+    shard = await shard_router.for_row("ingest_jobs", job_id, write=True)
+    if not await shard.db.write(ingest.retry, job_id):
+        raise HTTPException(status_code=409, detail="Only finished or failed jobs can be retried")
+    shard.ingest_worker.notify()
+    return {"status": "success", "message": "Job queued"}
+
+DOCUMENTS_LISTING = Listing(
+    "documents",
+    "SELECT * FROM documents d",
+    keys=("d.upload_date", "d.id"),
+    filters={"property_id": "d.property_id", "category": "d.type"},
+)
+
 @app.get("/api/documents")
-async def get_documents():
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM documents ORDER BY upload_date DESC")
-        rows = cursor.fetchall()
-        return [dict(row) for row in rows]
+async def get_documents(
+    request: Request,
+    property_id: Optional[str] = None,
+    category: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    filters = {"property_id": property_id, "category": category}
+    async def _load():
+        rows, next_cursor = (await _listing_json(DOCUMENTS_LISTING, filters, cursor, limit)
+                             or await _listing_page(DOCUMENTS_LISTING, filters, cursor, limit))
+        return rows, page_headers(request, next_cursor)
+    shard_router.refresh()
+    return await cached_json(request, response_cache, f"documents?{request.url.query}", ("documents",), _load)
+
+@app.get("/api/documents/export")
+async def export_documents(format: str = "ndjson", property_id: Optional[str] = None, category: Optional[str] = None):
+    return DOCUMENTS_LISTING.export([s.db for s in await shard_router.scope(property_id)],
+                                    {"property_id": property_id, "category": category}, format)
+
+async def _stored_document(doc_id):
+    shard = await shard_router.for_row("documents", doc_id)
+    doc = await shard.db.fetchone("SELECT filename, content_type, sha256 FROM documents WHERE id = ?", (doc_id,))
+    if not doc or not doc["sha256"]:
+        raise HTTPException(status_code=404, detail="Document not found")
+    content_type = doc["content_type"] or mimetypes.guess_type(doc["filename"] or "")[0] or "application/octet-stream"
+    return doc, content_type
+
+@app.api_route("/api/documents/{doc_id}/content", methods=["GET", "HEAD"])
+async def get_document_content(request: Request, doc_id: int, download: bool = False):
+    doc, content_type = await _stored_document(doc_id)
+    # A document's blob never changes, and its hash is a strong validator
+    response = file_response(request, blob_store.path_for(doc["sha256"]), f'"{doc["sha256"]}"', content_type, {
+        "Cache-Control": "private, max-age=86400",
+        "Content-Disposition": content_disposition(doc["filename"], content_type, download),
+    })
+    if response is None:
+        raise HTTPException(status_code=404, detail="Document content is not stored")
+    return response
+
+@app.get("/api/documents/{doc_id}/thumbnail")
+async def get_document_thumbnail(request: Request, doc_id: int, size: int = 256):
+    if size not in THUMBNAIL_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of {', '.join(map(str, THUMBNAIL_SIZES))}")
+    doc, content_type = await _stored_document(doc_id)
+    source = blob_store.path_for(doc["sha256"])
+    path = None
+    if os.path.exists(source):
+        path = await thumbnail_cache.get(doc["sha256"], source, content_type, doc["filename"], size)
+    response = path and file_response(request, path, f'"{doc["sha256"]}-{size}"', "image/jpeg",
+                                      {"Cache-Control": "private, max-age=86400"})
+    if not response:
+        raise HTTPException(status_code=404, detail="No thumbnail available for this document")
+    return response
 
 @app.get("/api/analytics")
-async def get_analytics():
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) as count FROM properties")
-        total_properties = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT SUM(rent_amount) as total FROM properties")
-        total_rent = cursor.fetchone()['total']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM maintenance_issues WHERE status = 'In Progress'")
-        active_issues = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT SUM(cost) as total FROM maintenance_issues")
-        total_maintenance = cursor.fetchone()['total']
-        
-        cursor.execute("""
-            SELECT category, COUNT(*) as count, SUM(cost) as total_cost
-            FROM maintenance_issues
-            GROUP BY category
-        """)
-        by_category = [dict(row) for row in cursor.fetchall()]
-        
-        return {
-            "total_properties": total_properties,
-            "total_monthly_rent": total_rent,
-            "active_issues": active_issues,
-            "total_maintenance_cost": total_maintenance,
-            "issues_by_category": by_category
-        }
+async def get_analytics(request: Request):
+    async def _load():
+        return merge_analytics(await shard_router.gather(lambda shard: shard.db.run(load_analytics),
+                                                         await shard_router.all()))
+    shard_router.refresh()
+    return await cached_json(request, response_cache, "analytics", ("properties", "maintenance_issues"), _load)
+
+PROPERTIES_LISTING = Listing(
+    "properties",
+    "SELECT * FROM properties p",
+    keys=("p.id",),
+    filters={"property_id": "p.id"},
+)
 
-@app.post("/api/upload")
-async def upload_file(file: UploadFile = File(...), property_id: str = Form(None), tenant_id: str = Form(None)):
-    try:
-        if not os.path.exists('uploads'):
-            os.makedirs('uploads')
-            
-        file_path = f"uploads/{file.filename}"
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-            
-        # Determine doc type
-        doc_type = "lease" if "lease" in file.filename.lower() else "id_proof" if "pan" in file.filename.lower() or "aadhaar" in file.filename.lower() else "other"
-        
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO documents (filename, type, upload_date, size, property_id)
-                VALUES (?, ?, ?, ?, ?)
-            """, (file.filename, doc_type, datetime.now().strftime("%Y-%m-%d"), len(content), property_id or "Unassigned"))
-            conn.commit()
-            
-        return {"status": "success", "message": f"Uploaded {file.filename}"}
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+DASHBOARD = Dashboard(PROPERTIES_LISTING, MAINTENANCE_LISTING, DOCUMENTS_LISTING)
+DASHBOARD_TABLES = ("properties", "maintenance_issues", "documents")
+
+@app.get("/api/dashboard")
+async def get_dashboard(
+    request: Request,
+    include: Optional[str] = None,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+):
+    # Properties, maintenance, documents and analytics in one response, each
+    # database read on one snapshot, so the counts always match the lists
+    selected = selection(OWNER_SECTIONS, include, fields)
+    async def _load():
+        shards_ = await shard_router.all()
+        parts = await shard_router.gather(
+            lambda shard: shard.db.run(DASHBOARD.read, selected, None, limit, len(shards_) > 1), shards_)
+        return DASHBOARD.combine(parts, selected, limit)
+    shard_router.refresh()
+    return await cached_json(request, response_cache, f"dashboard?{request.url.query}", DASHBOARD_TABLES, _load)
+
+@app.get("/api/dashboard/{property_id}")
+async def get_tenant_dashboard(
+    request: Request,
+    property_id: str,
+    include: Optional[str] = None,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+):
+    # The tenant's property, its maintenance history, documents and issue counts
+    selected = selection(TENANT_SECTIONS, include, fields)
+    async def _load():
+        shard = await shard_router.for_property(property_id)
+        part = await shard.db.run(DASHBOARD.read, selected, property_id, limit)
+        return DASHBOARD.combine([part], selected, limit)
+    shard_router.refresh()
+    return await cached_json(request, response_cache, f"dashboard:{property_id}?{request.url.query}",
+                             DASHBOARD_TABLES, _load)
+
+@app.get("/api/analytics/rollup")
+async def get_rollup(
+    group_by: Optional[str] = None,
+    bucket: Optional[str] = Query(None, pattern=f"^({'|'.join(rollup.BUCKETS)})$"),
+    metrics: str = "count,sum,avg",
+    property_id: Optional[str] = None,
+    category: Optional[str] = None,
+    vendor: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    anomaly_z: Optional[float] = Query(None, gt=0),
+    order_by: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=rollup.MAX_ROWS),
+):
+    # Maintenance cost by any of property, category, vendor and status, and
+    # optionally by time bucket: e.g. group_by=property&bucket=month,
+    # group_by=category&metrics=count,p90 or group_by=vendor&bucket=quarter&anomaly_z=2
+    dimensions = [d for d in (group_by or "").split(",") if d]
+    if any(d not in rollup.DIMENSIONS for d in dimensions) or len(set(dimensions)) != len(dimensions):
+        raise HTTPException(status_code=400, detail=f"group_by must be among {', '.join(rollup.DIMENSIONS)}")
+    wanted = [m for m in metrics.split(",") if m]
+    if not wanted or any(m not in rollup.METRICS and not rollup.PERCENTILE.match(m) for m in wanted):
+        raise HTTPException(status_code=400,
+                            detail=f"metrics must be among {', '.join(rollup.METRICS)} or percentiles like p90")
+    if order_by and order_by not in wanted and not (order_by == "cost_z" and anomaly_z):
+        raise HTTPException(status_code=400, detail="order_by must be one of the metrics, or cost_z with anomaly_z")
+    for value in (date_from, date_to):
+        try:
+            value and rollup.day_number(value)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"invalid date: {value}")
+    filters = {"property": property_id, "category": category, "vendor": vendor, "status": status}
+    started = time.perf_counter()
+    snapshots = await shard_router.gather(
+        lambda shard: shard.db.run(shard.maintenance_columns.snapshot), await shard_router.scope(property_id))
+    refreshed = time.perf_counter()
+    result = await asyncio.to_thread(rollup.rollup, snapshots, dimensions, bucket, wanted, filters,
+                                     date_from, date_to, anomaly_z, order_by, limit)
+    result["timings"] = {
+        "refresh_ms": round((refreshed - started) * 1000, 3),
+        "rollup_ms": round((time.perf_counter() - refreshed) * 1000, 3),
+    }
+    return result
+
+@app.get("/api/rentroll")
+async def get_rent_roll(
+    months: int = Query(12, ge=1, le=MAX_MONTHS),
+    as_of: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    escalation_pct: float = Query(ESCALATION_PCT, ge=0, le=100),
+    type: Optional[str] = None,
+):
+    # Month by month from as_of (default: this month): contracted rent after
+    # escalations, rent of units not under lease, and expiries
+    if as_of:
+        try:
+            month_number(as_of)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    parts = await shard_router.gather(
+        lambda shard: shard.db.run(shard.rent_roll.project, months, as_of, escalation_pct, type),
+        await shard_router.all())
+    return merge_projections(parts)
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    return response_cache.stats()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    from fastapi.responses import Response
+    cache = response_cache.stats()
+    pool = db.pool_stats()
+    extra = [
+        ("response_cache_hits_total", "counter", "Cached bodies served", cache["hits"]),
+        ("response_cache_misses_total", "counter", "Cache lookups that went to the database", cache["misses"]),
+        ("response_cache_not_modified_total", "counter", "Conditional requests answered with 304", cache["not_modified"]),
+        ("response_cache_evictions_total", "counter", "Entries evicted to stay within the limits", cache["evictions"]),
+        ("response_cache_bytes", "gauge", "Bytes held by the response cache", cache["bytes"]),
+        ("db_pool_connections_open", "gauge", "Pooled SQLite connections opened", pool["open"]),
+        ("db_pool_connections_idle", "gauge", "Pooled SQLite connections waiting for work", pool["idle"]),
+    ]
+    thumbnails = thumbnail_cache.stats()
+    extra += [
+        ("thumbnail_cache_bytes", "gauge", "Bytes of thumbnails on disk", thumbnails["bytes"]),
+        ("thumbnail_cache_hits_total", "counter", "Thumbnails served from the disk cache", thumbnails["hits"]),
+        ("thumbnail_cache_misses_total", "counter", "Thumbnails rendered on request", thumbnails["misses"]),
+        ("thumbnail_cache_evictions_total", "counter", "Thumbnails evicted to stay within the limit",
+         thumbnails["evictions"]),
+    ]
+    feeds = [shard.change_feed.stats() for shard in shard_router.opened()]
+    feed = {key: sum(f[key] for f in feeds) for key in ("subscribers", "delivered", "resets")}
+    extra += [
+        ("change_feed_subscribers", "gauge", "Open change streams", feed["subscribers"]),
+        ("change_feed_delivered_total", "counter", "Changes queued for subscribers", feed["delivered"]),
+        ("change_feed_resets_total", "counter", "Streams told to refetch after overflow or a gap", feed["resets"]),
+    ]
+    columns = [shard.maintenance_columns.stats() for shard in shard_router.opened()]
+    extra += [
+        ("rollup_snapshot_rows", "gauge", "Maintenance issues held in the rollup snapshots",
+         sum(c["rows"] for c in columns)),
+        ("rollup_snapshot_bytes", "gauge", "Bytes of rollup snapshot arrays", sum(c["bytes"] for c in columns)),
+    ]
+    routing = shard_router.stats()
+    extra += [
+        ("shards_open", "gauge", "Portfolio databases open in this process", routing["open"]),
+        ("shard_placements_cached", "gauge", "Property placements cached from the catalog",
+         routing["placements_cached"]),
+    ]
+    writes = db.write_stats()
+    if writes["enabled"]:
+        extra += [
+            ("db_write_batches_total", "counter", "Group commits by the writer", writes["batches"]),
+            ("db_write_commands_total", "counter", "Write commands applied by the writer", writes["commands"]),
+            ("db_write_commands_failed_total", "counter", "Write commands that raised or whose commit failed",
+             writes["failed"]),
+            ("db_write_queue_depth", "gauge", "Write commands waiting for the writer", writes["queued"]),
+        ]
+    return Response(metrics.render(extra), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/api/metrics/slow-queries")
+async def get_slow_queries(limit: int = Query(50, ge=1, le=1000)):
+    return list(metrics.slow_queries)[-limit:][::-1]
 
 class PropertyCreate(BaseModel):
     address: str
     type: str
     rent_amount: float
     owner_name: str
+    # Sharded deployments: the portfolio it belongs to, created if new
+    portfolio: Optional[str] = None
 
 @app.post("/api/properties")
 async def create_property(prop: PropertyCreate):
     import uuid
-    with get_db() as conn:
-        cursor = conn.cursor()
-        prop_id = f"prop_{str(uuid.uuid4())[:8]}"
-        cursor.execute("""
+    prop_id = f"prop_{str(uuid.uuid4())[:8]}"
+    def _create(conn):
+        conn.execute("""
             INSERT INTO properties (id, address, type, rent_amount, landlord_name)
             VALUES (?, ?, ?, ?, ?)
         """, (prop_id, prop.address, prop.type, prop.rent_amount, prop.owner_name))
-        conn.commit()
+        changes.record(conn, "properties", "created", prop_id, prop_id)
+
+    try:
+        shard = await shard_router.for_portfolio(prop.portfolio, write=True, create=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await shard.db.write(_create)
+    await shard_router.place([prop_id], shard.name)
+    _changed(shard, "properties")
     return {"status": "success", "message": "Property created"}
 
+@app.post("/api/import")
+async def bulk_import(
+    request: Request,
+    kind: str = Query(..., pattern="^(properties|users|maintenance)$"),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    batch_size: int = Query(importer.IMPORT_BATCH_SIZE, ge=1, le=50000),
+    portfolio: Optional[str] = None,
+):
+    # The body is the raw CSV or NDJSON, streamed straight into the importer.
+    # Properties and maintenance go to one portfolio, users to the catalog
+    fmt = format or importer.guess_format("", request.headers.get("content-type", ""))
+    shard = await shard_router.for_portfolio(portfolio, write=True)
+    report = await importer.import_stream(catalog if kind == "users" else shard.db, kind, request.stream(),
+                                          fmt, batch_size)
+    if report.written:
+        # The importer records property and maintenance imports with their rows
+        if kind not in importer.RECORDED:
+            await shard.db.write(changes.record, kind, "imported")
+        _changed(shard, *importer.TABLES[kind])
+        if kind == "properties":
+            await shard_router.place_all(shard)
+    return report.as_dict()
+
 @app.post("/api/qr")
 async def upload_qr(file: UploadFile = File(...)):
     try:
@@ -540,10 +1000,16 @@ async def upload_qr(file: UploadFile = File(...)):
         return {"status": "error", "message": str(e)}
 
 @app.get("/api/qr")
-async def get_qr():
+async def get_qr(request: Request):
     if os.path.exists("static/payment_qr.png"):
-        from fastapi.responses import FileResponse
-        return FileResponse("static/payment_qr.png")
+        from fastapi.responses import FileResponse, Response
+        stat = os.stat("static/payment_qr.png")
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        # The image can be replaced at any time, so clients revalidate on every use
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        return FileResponse("static/payment_qr.png", stat_result=stat, headers=headers)
     return {"status": "error", "message": "No QR code"}
 
 if __name__ == "__main__":
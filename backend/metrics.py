@@ -0,0 +1,324 @@
+"""Request and SQL instrumentation, exported in the Prometheus text format.
+
+``MetricsMiddleware`` counts requests per route template, method and status
+and records their latency, up to the last byte of the response. ``SqlTimer``
+hooks each pooled connection's trace callback: a statement is timed from the
+moment SQLite starts it until the next statement on that connection starts
+or the connection goes back to the pool, so its time includes fetching its
+rows; transaction control statements aren't timed. Statements over ``SLOW_QUERY_MS`` go to the slow-query log with their
+``EXPLAIN QUERY PLAN``, which is run once the connection is idle again.
+
+Literal values never leave this module: statements are reduced to a
+normalized text with ``?`` for every literal, and the log only keeps the
+types of the parameters.
+"""
+import bisect
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 100))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", 200))
+# Statements beyond this many distinct shapes are counted together as "other"
+MAX_STATEMENTS = int(os.getenv("METRICS_MAX_STATEMENTS", 500))
+HTTP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5)
+# Starlette appends the charset
+CONTENT_TYPE = "text/plain; version=0.0.4"
+UNMATCHED_ROUTE = "<unmatched>"
+TRANSACTION_CONTROL = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE", "END")
+
+logger = logging.getLogger("sql.slow")
+
+# String, number, NULL and blob literals. Every branch starts with a plain
+# character and checks what precedes it afterwards (so digits inside names
+# like sha256 are kept), which lets the regex engine skip ahead quickly.
+_LITERAL = re.compile(r"'[^']*(?:''[^']*)*'|\d(?<![\w.]\d)\d*(?:\.\d+)?(?:[eE][+-]?\d+)?"
+                      r"|N(?<!\wN)ULL\b|[xX](?<!\w[xX])'[0-9A-Fa-f]*'")
+
+_VALUE_LIST = re.compile(r"\(\?(?: ?, ?\?)+\)")
+
+
+def _literal_type(literal):
+    if literal[0] == "'":
+        return "text"
+    if literal[0] in "xX" and literal[1:2] == "'":
+        return "blob"
+    if literal.upper() == "NULL":
+        return "null"
+    return "int" if literal.isdigit() else "real"
+
+
+def normalize(sql):
+    """The statement with every literal replaced by ``?`` and whitespace collapsed.
+
+    Lists of values, as in ``IN (?, ?, ?)``, become ``(?, ...)`` so each list
+    length isn't a statement of its own.
+    """
+    normalized = " ".join(_LITERAL.sub("?", sql).split())
+    if "?," in normalized:
+        normalized = _VALUE_LIST.sub("(?, ...)", normalized)
+    return normalized
+
+
+def parameter_types(sql):
+    return [_literal_type(literal) for literal in _LITERAL.findall(sql)]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, values=(), amount=1):
+        with self._lock:
+            self.series[values] = self.series.get(values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = sorted(self.series.items())
+        for values, total in series:
+            lines.append(f"{self.name}{_labels(self.labels, values)} {total}")
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram per label set; buckets are made cumulative when rendered."""
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket..., count over the last bucket, sum]
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, values, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            counts = self.series.get(values)
+            if counts is None:
+                counts = self.series[values] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += seconds
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((values, list(counts)) for values, counts in self.series.items())
+        for values, counts in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = _labels(self.labels + ("le",), values + (bound,))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _labels(self.labels, values)
+            lines.append(f"{self.name}_sum{labels} {counts[-1]:.6f}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Metrics:
+    def __init__(self, slow_log_size=SLOW_QUERY_LOG_SIZE):
+        self.requests = Counter("http_requests_total", "HTTP requests by route and status",
+                                ("method", "route", "status"))
+        self.latency = Histogram("http_request_duration_seconds", "HTTP request latency to the last byte",
+                                 ("method", "route"), HTTP_BUCKETS)
+        self.sql = Histogram("sql_statement_duration_seconds", "SQLite statement time including row fetches",
+                             ("statement",), SQL_BUCKETS)
+        self.slow = Counter("sql_slow_statements_total", "Statements over the slow-query threshold",
+                            ("statement",))
+        # fingerprint -> normalized SQL, for sql_statement_info, and the reverse
+        self.statements = {}
+        self._ids = {}
+        self.slow_queries = deque(maxlen=slow_log_size)
+
+    def observe_request(self, method, route, status, seconds):
+        self.requests.inc((method, route, str(status)))
+        self.latency.observe((method, route), seconds)
+
+    def statement_id(self, normalized):
+        fingerprint = self._ids.get(normalized)
+        if fingerprint is None:
+            if len(self._ids) >= MAX_STATEMENTS:
+                return "other"
+            fingerprint = hashlib.blake2b(normalized.encode(), digest_size=6).hexdigest()
+            self.statements[fingerprint] = normalized
+            self._ids[normalized] = fingerprint
+        return fingerprint
+
+    def render(self, extra=()):
+        """Prometheus text for every metric, plus ``(name, type, help, value)`` tuples in ``extra``."""
+        lines = self.requests.render() + self.latency.render() + self.sql.render() + self.slow.render()
+        lines += ["# HELP sql_statement_info Normalized text of each statement fingerprint",
+                  "# TYPE sql_statement_info gauge"]
+        for fingerprint, sql in sorted(self.statements.items()):
+            lines.append(f'sql_statement_info{{statement="{fingerprint}",sql="{_escape(sql[:300])}"}} 1')
+        for name, kind, help, value in extra:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed responses pass through untouched."""
+
+    def __init__(self, app, metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router leaves the matched route in the scope; labelling by its
+            # template keeps ids out of the label values
+            route = scope.get("route")
+            path = getattr(route, "path", UNMATCHED_ROUTE)
+            self.metrics.observe_request(scope["method"], path, status[0], time.perf_counter() - started)
+
+
+class SqlTimer:
+    """Times statements on pooled connections through ``set_trace_callback``."""
+
+    def __init__(self, metrics, slow_ms=SLOW_QUERY_MS, max_plans=MAX_STATEMENTS):
+        self.metrics = metrics
+        self.slow_seconds = slow_ms / 1000
+        self._connections = {}
+        # Plans of slow statements, least recently logged first; bounded like the statement table
+        self._plans = OrderedDict()
+        self.max_plans = max_plans
+        self._plans_lock = threading.Lock()
+
+    def attach(self, conn):
+        # [current sql, started at, slow statements awaiting a plan, tracing paused, callback]
+        state = [None, 0.0, [], False, None]
+        self._connections[conn] = state
+
+        def trace(sql):
+            if state[3]:
+                return
+            now = time.perf_counter()
+            current = state[0]
+            if current is not None:
+                # Trigger programs are reported again under their parent statement
+                if sql == current:
+                    return
+                self._record(state, now - state[1])
+            # Transaction control isn't timed: its interval would mostly be the
+            # Python work before the next statement, such as parsing the next
+            # import batch after a COMMIT
+            state[0] = None if sql.startswith(TRANSACTION_CONTROL) else sql
+            state[1] = now
+
+        state[4] = trace
+        conn.set_trace_callback(trace)
+
+    def detach(self, conn):
+        self._connections.pop(conn, None)
+
+    @contextmanager
+    def untraced(self, conn):
+        """Stop timing statements on ``conn`` for the duration, e.g. for a bulk load."""
+        state = self._connections.get(conn)
+        if state is None:
+            yield conn
+            return
+        self.finish(conn)
+        # SQLite expands every statement's SQL for the callback, so only
+        # removing it makes thousands of identical upserts cheap again
+        conn.set_trace_callback(None)
+        try:
+            yield conn
+        finally:
+            conn.set_trace_callback(state[4])
+
+    def finish(self, conn):
+        """Close the running statement and log pending slow ones; ``conn`` must be idle."""
+        state = self._connections.get(conn)
+        if state is None:
+            return
+        if state[0] is not None:
+            self._record(state, time.perf_counter() - state[1])
+            state[0] = None
+        if state[2]:
+            pending, state[2] = state[2], []
+            state[3] = True
+            try:
+                for entry in pending:
+                    self._log_slow(conn, entry)
+            finally:
+                state[3] = False
+
+    def _record(self, state, seconds):
+        normalized = normalize(state[0])
+        statement = self.metrics.statement_id(normalized)
+        self.metrics.sql.observe((statement,), seconds)
+        if seconds >= self.slow_seconds:
+            state[2].append((state[0], normalized, statement, seconds, time.time()))
+
+    def _plan(self, conn, normalized):
+        with self._plans_lock:
+            plan = self._plans.get(normalized)
+            if plan is not None:
+                self._plans.move_to_end(normalized)
+                return plan
+        try:
+            explainable = normalized.replace("(?, ...)", "(?)")
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {explainable}", (None,) * explainable.count("?")).fetchall()
+            plan = [row[3] for row in rows]
+        except sqlite3.Error as e:
+            plan = [f"unavailable: {e}"]
+        with self._plans_lock:
+            self._plans[normalized] = plan
+            while len(self._plans) > self.max_plans:
+                self._plans.popitem(last=False)
+        return plan
+
+    def _log_slow(self, conn, entry):
+        sql, normalized, statement, seconds, at = entry
+        types = parameter_types(sql)
+        self.metrics.slow.inc((statement,))
+        record = {
+            "at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(at)),
+            "statement": statement,
+            "sql": normalized,
+            "params": types,
+            "duration_ms": round(seconds * 1000, 3),
+            "plan": self._plan(conn, normalized),
+        }
+        self.metrics.slow_queries.append(record)
+        logger.warning("slow query %.1f ms [%s] %s params=%s plan=%s", record["duration_ms"], statement,
+                       normalized, types, " | ".join(record["plan"]))
@@ -0,0 +1,41 @@
+"""Forward-only schema migrations, counted in each database's PRAGMA user_version.
+
+A migration list is a sequence of steps, each a function of a cursor. A
+database at user_version N has had the first N steps, so only the rest run.
+A database that is already current costs one PRAGMA read. Each step runs in
+its own BEGIN IMMEDIATE transaction together with the user_version bump. So
+a failed step leaves nothing half-applied, and worker processes starting
+together run each step exactly once: the others wait on the write lock, then
+see the new version and skip it.
+
+Steps are append-only: a released step is never edited or reordered, and a
+schema change is a new step at the end.
+"""
+
+
+class SchemaTooNew(RuntimeError):
+    """The database was migrated by a newer version of the code."""
+
+
+def version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, steps):
+    """Apply the ``steps`` past the database's user_version; returns how many ran."""
+    current = version(conn)
+    if current > len(steps):
+        raise SchemaTooNew(f"schema version {current} is newer than this code's {len(steps)}")
+    ran = 0
+    for number, step in enumerate(steps[current:], current + 1):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version(conn) < number:
+                step(conn.cursor())
+                conn.execute(f"PRAGMA user_version = {number}")
+                ran += 1
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return ran
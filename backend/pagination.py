@@ -0,0 +1,193 @@
+"""Keyset pagination and streaming export for the large list endpoints.
+
+Pages are ordered newest first on ``(date, id)`` and the cursor is the key
+of the last row returned, so fetching page N costs the same as page 1 and
+rows inserted meanwhile never shift later pages. Exports stream every
+matching row from one server-side cursor as NDJSON or CSV.
+
+With several databases (shards.py), each returns its page for the same
+cursor and ``merge`` takes the newest rows of all of them; ids are unique
+across shards, so the cursor still names one position.
+"""
+import base64
+import csv
+import heapq
+import io
+import json
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+import sqljson
+
+MAX_PAGE_SIZE = 1000
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def _where(clauses):
+    return f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+
+class Listing:
+    """A list endpoint's base query, keyset columns and allowed equality filters.
+
+    The last key must be unique and never NULL; the ones before it may be NULL.
+    """
+
+    def __init__(self, name, select, keys, filters):
+        self.name = name
+        self.select = select
+        self.keys = keys
+        self.filters = filters
+
+    def columns(self, conn):
+        """The names of the columns a row of this listing has."""
+        return [d[0] for d in conn.execute(f"{self.select} LIMIT 0").description]
+
+    def query(self, filters, cursor=None, limit=None):
+        clauses, params = [], []
+        for name, column in self.filters.items():
+            if filters.get(name) is not None:
+                clauses.append(f"{column} = ?")
+                params.append(filters[name])
+        order = ", ".join(f"{k} DESC" for k in self.keys)
+        sql = f"{self.select} {_where(clauses)} ORDER BY {order}"
+        if cursor is not None:
+            values = decode_cursor(cursor, len(self.keys))
+            first, rest = self.keys[0], self.keys[1:]
+            before = f"({', '.join(self.keys)}) < ({', '.join('?' * len(self.keys))})"
+            if not rest:
+                sql = f"{self.select} {_where([*clauses, before])} ORDER BY {order}"
+                params.extend(values)
+            elif values[0] is None:
+                # NULLs sort last, so only NULL keys are left; a row-value comparison is never true against one
+                older = f"({', '.join(rest)}) < ({', '.join('?' * len(rest))})"
+                sql = f"{self.select} {_where([*clauses, f'{first} IS NULL', older])} ORDER BY {order}"
+                params.extend(values[1:])
+            else:
+                # Older non-NULL keys, then every NULL one; SQLite merges the two in index order without sorting
+                names = ", ".join(f"{k.split('.')[-1]} DESC" for k in self.keys)
+                sql = (f"{self.select} {_where([*clauses, before])} UNION ALL "
+                       f"{self.select} {_where([*clauses, f'{first} IS NULL'])} ORDER BY {names}")
+                params = [*params, *values, *params]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return sql, params
+
+    def page(self, conn, filters, cursor=None, limit=None):
+        """Return ``(rows, next_cursor)``; without a limit every matching row is returned."""
+        # One extra row tells whether another page exists without a COUNT
+        sql, params = self.query(filters, cursor, None if limit is None else limit + 1)
+        rows = [dict(row) for row in conn.execute(sql, params).fetchall()]
+        if limit is None or len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        columns = [k.split(".")[-1] for k in self.keys]
+        return rows, encode_cursor([rows[-1][c] for c in columns])
+
+    def page_json(self, conn, filters, cursor=None, limit=None, keyed=False, columns=None):
+        """``page`` with the rows encoded by SQLite: ``(body, next_cursor)``, or None if Python must encode them.
+
+        With ``keyed`` the rows come back as ``(json, *keys)`` for ``merge_json`` instead of one body.
+        ``columns`` limits each row to those columns.
+        """
+        sql, params = self.query(filters, cursor, None if limit is None else limit + 1)
+        if limit is None and not keyed:
+            body = sqljson.array(conn, sql, params, columns)
+            return None if body is None else (body, None)
+        rows = sqljson.rows(conn, sql, params, [k.split(".")[-1] for k in self.keys], columns)
+        if rows is None:
+            return None
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(list(rows[-1][1:]))
+        return (rows, next_cursor) if keyed else (sqljson.join(row[0] for row in rows), next_cursor)
+
+    def merge_json(self, pages, limit=None):
+        """``merge`` for the keyed pages of ``page_json``."""
+        def key(row):
+            return tuple((value is not None, value) for value in row[1:])
+
+        rows = list(heapq.merge(*(rows for rows, _ in pages), key=key, reverse=True))
+        next_cursor = None
+        if limit is not None and (len(rows) > limit or any(cursor for _, cursor in pages)):
+            rows = rows[:limit]
+            next_cursor = encode_cursor(list(rows[-1][1:]))
+        return sqljson.join(row[0] for row in rows), next_cursor
+
+    def merge(self, pages, limit=None):
+        """One ``(rows, next_cursor)`` page from the pages several databases returned."""
+        if len(pages) == 1:
+            return pages[0]
+        columns = [k.split(".")[-1] for k in self.keys]
+
+        def key(row):
+            # NULLs sort last in SQLite's DESC order
+            return tuple((row[c] is not None, row[c]) for c in columns)
+
+        rows = list(heapq.merge(*(rows for rows, _ in pages), key=key, reverse=True))
+        if limit is None or (len(rows) <= limit and not any(cursor for _, cursor in pages)):
+            return rows, None
+        rows = rows[:limit]
+        return rows, encode_cursor([rows[-1][c] for c in columns])
+
+    def export(self, dbs, filters, fmt):
+        """Stream every matching row of each database in ``dbs``, one database after another."""
+        if fmt not in EXPORT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+        sql, params = self.query(filters)
+        encode = _ndjson_batch if fmt == "ndjson" else _csv_batches()
+
+        async def body():
+            for db in dbs:
+                async for columns, rows in db.stream(sql, params):
+                    yield encode(columns, rows)
+
+        return StreamingResponse(body(), media_type=EXPORT_FORMATS[fmt], headers={
+            "Content-Disposition": f'attachment; filename="{self.name}.{fmt}"',
+        })
+
+
+def page_headers(request, next_cursor):
+    if next_cursor is None:
+        return {}
+    next_url = request.url.include_query_params(cursor=next_cursor)
+    return {"X-Next-Cursor": next_cursor, "Link": f'<{next_url}>; rel="next"'}
+
+
+def _ndjson_batch(columns, rows):
+    return "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows)
+
+
+def _csv_batches():
+    header = []
+
+    def encode(columns, rows):
+        out = io.StringIO()
+        writer = csv.writer(out)
+        if not header:
+            header.append(columns)
+            writer.writerow(columns)
+        writer.writerows(rows)
+        return out.getvalue()
+
+    return encode
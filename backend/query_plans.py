@@ -0,0 +1,216 @@
+"""Query-plan regression check for every SQL statement the API issues.
+
+Boots the app against a scratch database, drives each endpoint in-process,
+captures the statements SQLite actually executes and runs EXPLAIN QUERY PLAN
+on each one. Exits non-zero if any statement falls back to a full table scan
+or a temp B-tree sort that is not listed in ALLOWED below.
+
+    python query_plans.py [-v]
+"""
+import asyncio
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="query_plans_")
+os.chdir(os.environ["DATA_DIR"])
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx  # noqa: E402
+
+import changes  # noqa: E402
+import ingest  # noqa: E402
+import main  # noqa: E402
+import seed  # noqa: E402
+import shards  # noqa: E402
+from db import Database  # noqa: E402
+from pagination import encode_cursor  # noqa: E402
+
+# Statements whose scan or sort is inherent, keyed by normalized SQL.
+ALLOWED = {
+    "SELECT * FROM properties": "unfiltered property list",
+    # entities.EntityIndex: full loads happen once and after bulk imports; writes are caught up from change_log
+    "SELECT id, address, tenant_name, landlord_name FROM properties": "entity index load",
+    "SELECT DISTINCT vendor, category FROM maintenance_issues": "entity index load",
+    "SELECT IFNULL(MAX(id), ?), COUNT(*) FROM entity_aliases": "alias version check, a handful of rows",
+    "SELECT alias, kind, entity_key FROM entity_aliases": "alias reload, a handful of rows",
+    "SELECT generation, dim, capacity, count, dead, chunks FROM vector_meta": "single-row vector index state",
+    "SELECT name FROM sqlite_master WHERE type = ? AND sql NOT LIKE ?": "schema lookup, cached per schema version",
+    # Listing.columns: LIMIT 0, only the column names are read
+    "SELECT * FROM properties p LIMIT ?": "column names only",
+    "SELECT m.*, p.address FROM maintenance_issues m JOIN properties p ON m.property_id = p.id LIMIT ?":
+        "column names only",
+    "SELECT * FROM documents d LIMIT ?": "column names only",
+    "SELECT kind, source_id FROM vector_pending LIMIT ?": "head of the vector queue",
+}
+ALLOWED_PATTERNS = [
+    # Ranking groups by their own aggregate can only be done after grouping
+    (re.compile(r"ORDER BY occurrence_count DESC$"), "sort of aggregated groups"),
+    (re.compile(r"ORDER BY score LIMIT \? OFFSET \?$"), "BM25 ranking of full-text matches"),
+    # A backwards rowid walk that stops after LIMIT rows
+    (re.compile(r"FROM ingest_jobs ORDER BY id DESC LIMIT \?$"), "newest ingest jobs"),
+    (re.compile(r"^SELECT type, IFNULL\(rent_amount, \?\), CASE .* FROM properties$"), "rent roll lease terms, cached"),
+    (re.compile(r"FROM \(SELECT \* FROM properties\)( LIMIT \?)?$"), "unfiltered property list, encoded by SQLite"),
+]
+
+REQUESTS = [
+    ("POST", "/api/login", {"json": {"username": "Ishaan", "password": "Ishaan123"}}),
+    ("GET", "/api/properties", {}),
+    ("GET", "/api/properties/mumbai_galaxy", {}),
+    ("GET", "/api/maintenance", {}),
+    ("POST", "/api/maintenance", {"json": {"property_id": "delhi_villa", "category": "heating", "description": "No heat"}}),
+    ("PUT", "/api/maintenance/1/status", {"json": {"status": "Resolved"}}),
+    ("POST", "/api/tenants", {"json": {
+        "username": "plan_check", "password": "x", "name": "Plan Check", "property_id": "delhi_villa",
+        "rent_amount": 1000, "lease_start": "2025-01-01", "lease_end": "2026-01-01",
+    }}),
+    ("POST", "/api/query", {"json": {"query": "plumbing at mumbai galaxy"}}),
+    ("POST", "/api/query", {"json": {"query": "heating complaints 2023"}}),
+    ("POST", "/api/query", {"json": {"query": "which leases expire soon"}}),
+    ("POST", "/api/query", {"json": {"query": "maintenance cost"}}),
+    ("POST", "/api/query", {"json": {"query": "triple net properties"}}),
+    ("POST", "/api/query", {"json": {"query": "recurring issues"}}),
+    ("POST", "/api/query", {"json": {"query": "overview"}}),
+    ("POST", "/api/query", {"json": {"query": "cost of plumbing at galaxy in 2024"}}),
+    ("POST", "/api/query", {"json": {"query": "electrical issues at koramangala since 2023"}}),
+    ("POST", "/api/upload", {"files": {"file": ("lease.txt", b"lease", "text/plain")}}),
+    ("GET", "/api/documents", {}),
+    ("GET", "/api/maintenance?limit=2", {}),
+    ("GET", f"/api/maintenance?limit=2&cursor={encode_cursor(['2024-08-01', 3])}", {}),
+    ("GET", f"/api/maintenance?property_id=mumbai_galaxy&limit=2&cursor={encode_cursor(['2024-08-01', 3])}", {}),
+    ("GET", f"/api/maintenance?status=Resolved&limit=2&cursor={encode_cursor(['2024-08-01', 3])}", {}),
+    ("GET", f"/api/maintenance?category=electrical&limit=2&cursor={encode_cursor(['2024-08-01', 3])}", {}),
+    ("GET", "/api/maintenance?property_id=mumbai_galaxy&status=Resolved&category=plumbing", {}),
+    ("GET", "/api/maintenance/export?format=csv&status=Resolved", {}),
+    ("GET", f"/api/documents?limit=1&cursor={encode_cursor(['2030-01-01', 9])}", {}),
+    ("GET", f"/api/documents?limit=1&cursor={encode_cursor([None, 9])}", {}),
+    ("GET", f"/api/maintenance?status=Resolved&limit=2&cursor={encode_cursor([None, 3])}", {}),
+    ("GET", "/api/documents?property_id=delhi_villa&limit=1", {}),
+    ("GET", "/api/documents?category=lease&limit=1", {}),
+    ("GET", "/api/documents/export?property_id=delhi_villa", {}),
+    ("GET", "/api/documents/1/content", {"headers": {"Range": "bytes=0-1"}}),
+    ("GET", "/api/documents/1/thumbnail", {}),
+    ("GET", "/api/search?q=heating complaints", {}),
+    ("GET", "/api/search?q=leakage&kind=maintenance&property_id=mumbai_galaxy&category=plumbing"
+            "&date_from=2024-01-01&date_to=2024-12-31", {}),
+    ("GET", "/api/search?q=lease&kind=documents&date_from=2024-01-01", {}),
+    ("GET", "/api/search/semantic?q=boiler not heating", {}),
+    ("GET", "/api/rentroll?months=24&as_of=2025-01", {}),
+    ("GET", "/api/analytics", {}),
+    ("POST", "/api/query", {"json": {"query": "plumbing issues by QuickFix at Galaxy Heights"}}),
+    ("POST", "/api/entities/aliases", {"json": {"alias": "Galaxy HQ", "kind": "property", "id": "mumbai_galaxy"}}),
+    ("GET", "/api/entities/resolve?q=koramangla", {}),
+    ("GET", "/api/entities/resolve?q=galaxy hq&kind=property,place", {}),
+    ("GET", "/api/dashboard", {}),
+    ("GET", "/api/dashboard?fields=properties.id,maintenance.status,analytics.active_issues&limit=2", {}),
+    ("GET", "/api/dashboard/mumbai_galaxy?include=property,maintenance,analytics", {}),
+    ("GET", "/api/analytics/rollup?group_by=category,vendor&bucket=quarter&metrics=count,sum,p90&anomaly_z=2", {}),
+    ("PUT", "/api/maintenance/2/status", {"json": {"status": "Open"}}),
+    ("GET", "/api/analytics/rollup?group_by=property&metrics=max", {}),
+    ("POST", "/api/import?kind=properties", {"content": b"id,address,rent_amount\nplan_p,1 Plan St,10\n"}),
+    ("POST", "/api/import?kind=users", {"content": b"username,password\nplan_u,x\n"}),
+    ("POST", "/api/import?kind=maintenance&format=ndjson", {"content": b'{"property_id": "plan_p", '
+                                                                       b'"category": "hvac", "description": "x", '
+                                                                       b'"date": "2024-01-01"}\n'}),
+    ("GET", "/api/ingest/jobs", {}),
+    ("GET", "/api/ingest/jobs?status=queued&document_id=1", {}),
+    ("GET", "/api/ingest/jobs/1", {}),
+    ("POST", "/api/properties", {"json": {"address": "1 Plan Rd", "type": "Residential", "rent_amount": 1, "owner_name": "x"}}),
+]
+
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+SCAN = re.compile(r"^SCAN (\w+)$")
+DERIVED = re.compile(r"^(?:CO-ROUTINE|MATERIALIZE) (\w+)$")
+
+
+class TracingDatabase(Database):
+    def __init__(self, path):
+        super().__init__(path)
+        self.statements = []
+
+    def connect(self):
+        conn = super().connect()
+        conn.set_trace_callback(self.statements.append)
+        return conn
+
+
+def normalize(sql):
+    return LITERAL.sub("?", " ".join(sql.split()))
+
+
+def problems(conn, sql):
+    found = []
+    plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    # Scanning a subquery or CTE result is fine, scanning a stored table is not
+    derived = {m.group(1) for m in map(DERIVED.match, plan) if m}
+    for detail in plan:
+        scan = SCAN.match(detail)
+        if (scan and scan.group(1) not in derived) or detail.startswith("USE TEMP B-TREE"):
+            found.append(detail)
+    return found
+
+
+def collect():
+    seed.seed(main)
+    main.db.close()
+    main.db = main.catalog = TracingDatabase(main.DB_PATH)
+    # Everything the app built on the old database, rebuilt on the traced one
+    main.default_shard = main._portfolio(shards.DEFAULT_PORTFOLIO, 0, main.DB_PATH, main.db, main.VECTOR_DIR)
+    main.ingest_worker = main.default_shard.ingest_worker
+    main.shard_router = shards.Shards(main.catalog, main.default_shard, main._open_shard, main.SHARD_DIR)
+
+    async def drive():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://plans") as client:
+            # The vector sync doesn't run here; index the seed data for semantic search to read
+            await main.db.run(main.default_shard.vector_index.sync)
+            for method, url, kwargs in REQUESTS:
+                response = await client.request(method, url, **kwargs)
+                if response.status_code >= 500:
+                    raise SystemExit(f"{method} {url} failed with {response.status_code}")
+            # The ingest worker doesn't run here; push one job through its statements directly
+            for job in await main.db.write(ingest.claim, 1):
+                await main.db.run(ingest.load_job_input, job)
+                await main.db.write(ingest.fail, job, "plan check")
+                await main.db.write(ingest.complete, job["id"], job["document_id"], {}, None)
+                await main.db.write(ingest.requeue_stale, (job["id"],))
+                await client.post(f"/api/ingest/jobs/{job['id']}/retry")
+            # Nor does the change feed, whose stream never ends
+            feed = changes.ChangeFeed(main.db)
+            await feed.start()
+            await main.db.run(changes._fetch, 0, changes.FETCH_BATCH)
+            await main.db.run(changes._replay, 0, feed.last_id, "mumbai_galaxy")
+            await main.db.run(changes._replay, 0, feed.last_id, None)
+            await main.db.write(changes._prune, 0)
+            await feed.stop()
+
+    asyncio.run(drive())
+    statements = {}
+    for sql in main.db.statements:
+        if sql.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")):
+            statements.setdefault(normalize(sql), sql)
+    return statements
+
+
+def main_():
+    verbose = "-v" in sys.argv
+    statements = collect()
+    conn = sqlite3.connect(main.DB_PATH)
+    failures = 0
+    for key, sql in statements.items():
+        found = problems(conn, sql)
+        reason = ALLOWED.get(key) or next((r for p, r in ALLOWED_PATTERNS if p.search(key)), None)
+        if found and not reason:
+            failures += 1
+            print(f"FAIL {key}\n     " + "\n     ".join(found))
+        elif verbose:
+            print(f"ok   {key}" + (f"  [allowed: {reason}]" if found else ""))
+    conn.close()
+    print(f"{len(statements)} statements checked, {failures} with scans or temp B-tree sorts")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
@@ -0,0 +1,224 @@
+"""Rent-roll and lease-expiry projection over the whole portfolio.
+
+Lease terms are loaded from ``properties`` once into columnar arrays: rent,
+and the first and last month of each lease as month numbers (year * 12 +
+month - 1). A projection is then a few array operations: which leases
+are running in each month, what they pay after escalations, what the rest
+of the portfolio would pay if let, and when leases run out. Each lease is a span of months, and each escalation
+step a shorter span from its anniversary, so the work grows with leases
+times years rather than leases times months.
+
+The arrays are kept until change_log shows a write to properties, from this
+process or any other, or has been pruned past the last change they include.
+"""
+import os
+import threading
+from datetime import date
+
+import numpy as np
+
+# Annual rent escalation applied on every lease anniversary
+ESCALATION_PCT = float(os.getenv("RENT_ESCALATION_PCT", 5.0))
+MAX_MONTHS = 120
+# Upper edges, in months from the start of the projection, of the expiry buckets
+EXPIRY_BUCKETS = (3, 6, 12, 24, 36, 60)
+
+
+def _month_sql(column):
+    # NULL unless the column starts with YYYY-MM
+    return f"""
+        CASE WHEN {column} GLOB '[0-9][0-9][0-9][0-9]-[0-1][0-9]*'
+             THEN CAST(substr({column}, 1, 4) AS INTEGER) * 12 + CAST(substr({column}, 6, 2) AS INTEGER) - 1
+        END
+    """
+
+
+LOAD_SQL = f"""
+    SELECT type, IFNULL(rent_amount, 0), {_month_sql("lease_start_date")}, {_month_sql("lease_end_date")}
+    FROM properties
+"""
+
+
+def month_number(value):
+    """``YYYY-MM`` (or a date) as a month number."""
+    if isinstance(value, date):
+        return value.year * 12 + value.month - 1
+    year, month = value.split("-")[:2]
+    if not 1 <= int(month) <= 12:
+        raise ValueError(f"invalid month: {value}")
+    return int(year) * 12 + int(month) - 1
+
+
+def month_label(number):
+    return f"{number // 12:04d}-{number % 12 + 1:02d}"
+
+
+class Columns:
+    def __init__(self, rows):
+        types, rent, start, end = zip(*rows) if rows else ((), (), (), ())
+        codes = {}
+        self.types = np.fromiter((codes.setdefault(t, len(codes)) for t in types), dtype=np.int32, count=len(types))
+        self.type_codes = codes
+        self.rent = np.array(rent, dtype=np.float64)
+        # A lease needs both ends; a property without one is vacant
+        start = np.array(start, dtype=np.float64)
+        end = np.array(end, dtype=np.float64)
+        self.leased = ~(np.isnan(start) | np.isnan(end))
+        self.start = np.nan_to_num(start).astype(np.int32)
+        self.end = np.nan_to_num(end).astype(np.int32)
+
+    def __len__(self):
+        return len(self.rent)
+
+
+class RentRoll:
+    def __init__(self):
+        self._columns = None
+        # Last change_log id the columns include
+        self.last_change = 0
+        self._lock = threading.Lock()
+
+    def _current(self, conn, last_change):
+        oldest = conn.execute("SELECT MIN(id) FROM change_log").fetchone()[0]
+        if oldest is not None and last_change < oldest - 1:
+            return False
+        return conn.execute("SELECT 1 FROM change_log WHERE id > ? AND entity = 'properties' LIMIT 1",
+                            (last_change,)).fetchone() is None
+
+    def columns(self, conn):
+        # One read transaction, so the rows and change_log agree
+        conn.execute("BEGIN")
+        try:
+            latest = conn.execute("SELECT IFNULL(MAX(id), 0) FROM change_log").fetchone()[0]
+            with self._lock:
+                columns, last_change = self._columns, self.last_change
+            if columns is None or (latest != last_change and not self._current(conn, last_change)):
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                columns = Columns(cursor.execute(LOAD_SQL).fetchall())
+        finally:
+            conn.rollback()
+        with self._lock:
+            # A call that read an older snapshot doesn't replace newer columns
+            if latest >= self.last_change:
+                self._columns, self.last_change = columns, latest
+        return columns
+
+    def project(self, conn, months=12, as_of=None, escalation_pct=ESCALATION_PCT, property_type=None):
+        columns = self.columns(conn)
+        first = month_number(as_of or date.today())
+        selected = np.ones(len(columns), dtype=bool)
+        if property_type is not None:
+            selected = columns.types == columns.type_codes.get(property_type, -1)
+        rent, start, end = columns.rent[selected], columns.start[selected], columns.end[selected]
+        leased = columns.leased[selected]
+
+        last = first + months - 1
+        # Months each lease runs within the projection
+        lo, hi = np.maximum(start, first), np.minimum(end, last)
+        running = leased & (lo <= hi)
+        lo, hi, r, s = lo[running], hi[running], rent[running], start[running]
+        flat = _spans(lo, hi, r, first, months)
+        occupied = _spans(lo, hi, None, first, months)
+        # Rent in the first month is the contract rent. The k-th anniversary
+        # after that adds r * (g^k - g^(k-1)) until the lease ends
+        growth = 1 + escalation_pct / 100
+        contracted = flat.copy()
+        escalations = np.zeros(months, dtype=np.int64)
+        anniversary = s + 12 * ((lo - s) // 12 + 1)
+        for k in range(1, months // 12 + 2):
+            due = anniversary <= hi
+            if not due.any():
+                break
+            contracted += _spans(anniversary[due], hi[due], r[due] * (growth ** k - growth ** (k - 1)), first, months)
+            escalations += np.bincount(anniversary[due] - first, minlength=months)
+            anniversary = anniversary + 12
+        exposure = rent.sum() - flat
+
+        # Expiries: the lease's last month, at the rent it pays by then
+        ending = leased & (end >= first) & (end <= last)
+        offsets = end[ending] - first
+        steps = (end[ending] - start[ending]) // 12 - (np.maximum(first, start[ending]) - start[ending]) // 12
+        final_rent = rent[ending] * growth ** np.maximum(steps, 0)
+        expiring = np.bincount(offsets, minlength=months)
+        expiring_rent = np.bincount(offsets, weights=final_rent, minlength=months)
+
+        horizon = range(first, first + months)
+        monthly = [
+            {
+                "month": month_label(horizon[i]),
+                "contracted_rent": round(float(contracted[i]), 2),
+                "vacancy_exposure": round(float(exposure[i]), 2),
+                "occupied": int(occupied[i]),
+                "expiring": int(expiring[i]),
+                "expiring_rent": round(float(expiring_rent[i]), 2),
+                "escalations": int(escalations[i]),
+                "escalation_uplift": round(float(contracted[i] - flat[i]), 2),
+            }
+            for i in range(months)
+        ]
+        return {
+            "as_of": month_label(first),
+            "months": months,
+            "escalation_pct": escalation_pct,
+            "properties": int(len(rent)),
+            "leases": int(leased.sum()),
+            "monthly": monthly,
+            "expiry_buckets": _expiry_buckets(leased, rent, end - first),
+            "totals": {
+                "contracted_rent": round(float(contracted.sum()), 2),
+                "vacancy_exposure": round(float(exposure.sum()), 2),
+                "escalation_uplift": round(float((contracted - flat).sum()), 2),
+            },
+        }
+
+
+def merge_projections(parts):
+    """One projection from projections of several databases over the same months."""
+    if len(parts) == 1:
+        return parts[0]
+    first = parts[0]
+
+    def total(rows, i, key):
+        return sum(row[i][key] for row in rows)
+
+    monthly = [
+        {key: value if key == "month" else round(total([p["monthly"] for p in parts], i, key), 2)
+         for key, value in month.items()}
+        for i, month in enumerate(first["monthly"])
+    ]
+    buckets = [
+        {"bucket": bucket["bucket"], "leases": total([p["expiry_buckets"] for p in parts], i, "leases"),
+         "rent": round(total([p["expiry_buckets"] for p in parts], i, "rent"), 2)}
+        for i, bucket in enumerate(first["expiry_buckets"])
+    ]
+    return {
+        **first,
+        "properties": sum(p["properties"] for p in parts),
+        "leases": sum(p["leases"] for p in parts),
+        "monthly": monthly,
+        "expiry_buckets": buckets,
+        "totals": {key: round(sum(p["totals"][key] for p in parts), 2) for key in first["totals"]},
+    }
+
+
+def _spans(lo, hi, weights, first, months):
+    """Per month, the sum of ``weights`` over the spans [lo, hi] covering it."""
+    changes = np.bincount(lo - first, weights, minlength=months + 1)
+    changes -= np.bincount(hi - first + 1, weights, minlength=months + 1)
+    return np.cumsum(changes[:months])
+
+
+def _expiry_buckets(leased, rent, months_left):
+    """Leases and their current rent by how many months they have left."""
+    months_left = months_left[leased]
+    rent = rent[leased]
+    edges = np.array((0,) + EXPIRY_BUCKETS)
+    # 0: already expired, 1..len(EXPIRY_BUCKETS): the buckets, last: beyond them
+    index = np.searchsorted(edges, months_left, side="right")
+    counts = np.bincount(index, minlength=len(edges) + 1)
+    totals = np.bincount(index, weights=rent, minlength=len(edges) + 1)
+    labels = (["expired"] + [f"{lo}-{hi} months" for lo, hi in zip(edges, edges[1:])]
+              + [f"over {edges[-1]} months"])
+    return [{"bucket": label, "leases": int(counts[i]), "rent": round(float(totals[i]), 2)}
+            for i, label in enumerate(labels)]
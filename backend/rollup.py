@@ -0,0 +1,573 @@
+"""Ad-hoc maintenance cost rollups over a columnar in-memory snapshot.
+
+Each maintenance issue is one position in a set of NumPy arrays: its id,
+the property, category, vendor and status as codes into per-column
+dictionaries, the day and month of its date, its cost and the cost's bin
+on a fixed log scale. A rollup combines the group-by codes and time bucket
+into one integer key per row and counts and sums with ``bincount``.
+
+Percentiles are exact without sorting: a histogram of key x cost bin says
+which bin holds the wanted rank of each group, and only the issues in that
+bin, which the snapshot keeps listed together, are looked at to pick it.
+
+The snapshot catches up before every rollup. Rows with an id past the
+last one loaded are appended. Issues that change_log says were updated
+are re-read in place. Anything it can't follow row by row, such as an
+import, properties moving to another portfolio or a pruned gap in the
+log, reloads everything.
+"""
+import re
+import threading
+from datetime import date
+
+import numpy as np
+
+from rentroll import month_label
+
+DIMENSIONS = ("property", "category", "vendor", "status")
+BUCKETS = ("day", "week", "month", "quarter", "year")
+METRICS = ("count", "sum", "avg", "min", "max", "std")
+PERCENTILE = re.compile(r"^p(100|\d{1,2})$")
+MAX_ROWS = 10_000
+LOAD_BATCH = 50_000
+INITIAL_CAPACITY = 1024
+# Day number of an issue whose date isn't YYYY-MM-DD
+NO_DAY = np.iinfo(np.int32).min
+# Cost bins: below 1, then 64 per doubling up to 2^50, then anything larger; NULL costs get their own
+BIN_EDGES = np.append(2.0 ** (np.arange(50 * 64 + 1) / 64), np.inf)
+NO_COST = len(BIN_EDGES)
+BINS = NO_COST + 1
+# Largest group x bin histogram, in cells, before percentiles fall back to a sort
+MAX_HISTOGRAM = 1 << 22
+# A key space up to this many times the selected rows is counted directly instead of sorted
+DENSE_FACTOR = 4
+
+# Days since 1970-01-01, NULL unless the date starts with YYYY-MM-DD
+LOAD_SQL = """
+    SELECT id, property_id, category, vendor, status,
+           CASE WHEN date GLOB '[0-9][0-9][0-9][0-9]-[0-1][0-9]-[0-3][0-9]*'
+                THEN CAST(julianday(substr(date, 1, 10)) - 2440587.5 AS INTEGER)
+           END,
+           cost
+    FROM maintenance_issues
+"""
+
+
+class Snapshot:
+    """The columns as of one refresh; never modified afterwards."""
+
+    def __init__(self, ids, codes, labels, day, month, cost, cost_bin, by_bin, bin_starts, unbinned, undated,
+                 uncosted):
+        self.ids = ids
+        self.codes = codes
+        self.labels = labels
+        self.day = day
+        self.month = month
+        # 0 where the cost is NULL, which cost_bin tells apart
+        self.cost = cost
+        self.cost_bin = cost_bin
+        # Positions grouped by cost bin, bin b at by_bin[bin_starts[b]:bin_starts[b + 1]]. Positions
+        # in unbinned were added or repriced since; by_bin may still list the latter under their old bin
+        self.by_bin = by_bin
+        self.bin_starts = bin_starts
+        self.unbinned = unbinned
+        self.undated = undated
+        self.uncosted = uncosted
+
+    def __len__(self):
+        return len(self.ids)
+
+    def in_bin(self, b):
+        listed = self.by_bin[self.bin_starts[b]:self.bin_starts[b + 1]]
+        positions = np.union1d(listed, self.unbinned) if len(self.unbinned) else listed
+        return positions[self.cost_bin[positions] == b]
+
+
+class MaintenanceColumns:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._count = None
+        self.reloads = self.appended = self.patched = 0
+
+    def _reset(self):
+        self._count = 0
+        self.last_id = self.last_change = 0
+        self._dictionaries = {dim: {} for dim in DIMENSIONS}
+        self._ids = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+        self._codes = {dim: np.zeros(INITIAL_CAPACITY, dtype=np.int32) for dim in DIMENSIONS}
+        self._day = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self._month = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self._cost = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+        self._cost_bin = np.zeros(INITIAL_CAPACITY, dtype=np.uint16)
+        self._by_bin = np.zeros(0, dtype=np.int64)
+        self._bin_starts = np.zeros(BINS + 1, dtype=np.int64)
+        self._binned = 0
+        self._repriced = np.zeros(0, dtype=np.int64)
+        self._undated = self._uncosted = 0
+        # Set once a snapshot shares the arrays, so patches copy them first
+        self._shared = False
+
+    def snapshot(self, conn):
+        """Catch up with the database and return the current Snapshot."""
+        with self._lock:
+            # One read transaction, so the rows and change_log agree
+            conn.execute("BEGIN")
+            try:
+                if self._count is None or not self._catch_up(conn):
+                    self.reloads += 1
+                    self._reset()
+                    self.last_change = conn.execute("SELECT IFNULL(MAX(id), 0) FROM change_log").fetchone()[0]
+                    self._append(conn)
+            finally:
+                conn.rollback()
+            n = self._count
+            unbinned = np.union1d(np.arange(self._binned, n), self._repriced)
+            if len(unbinned) > max(1 << 16, n >> 6):
+                self._rebin()
+                unbinned = self._repriced
+            self._shared = True
+            return Snapshot(
+                self._ids[:n], {dim: codes[:n] for dim, codes in self._codes.items()},
+                {dim: list(values) for dim, values in self._dictionaries.items()},
+                self._day[:n], self._month[:n], self._cost[:n], self._cost_bin[:n],
+                self._by_bin, self._bin_starts, unbinned, self._undated, self._uncosted,
+            )
+
+    def _catch_up(self, conn):
+        """Apply what changed since the last refresh; False if only a reload will do."""
+        oldest = conn.execute("SELECT MIN(id) FROM change_log").fetchone()[0]
+        if oldest is not None and self.last_change < oldest - 1:
+            return False
+        rows = conn.execute("""
+            SELECT id, entity_id, action FROM change_log
+            WHERE id > ? AND (entity = 'maintenance' OR action = 'moved')
+        """, (self.last_change,)).fetchall()
+        updated = set()
+        for _, entity_id, action in rows:
+            if action == "updated" and entity_id is not None:
+                updated.add(int(entity_id))
+            elif action != "created":
+                return False
+        self.last_change = conn.execute("SELECT IFNULL(MAX(id), 0) FROM change_log").fetchone()[0]
+        updated = sorted(i for i in updated if i <= self.last_id)
+        if updated and not self._patch(conn, updated):
+            return False
+        self._append(conn)
+        return True
+
+    def _encode(self, rows):
+        ids, properties, categories, vendors, statuses, days, costs = zip(*rows)
+        codes = {}
+        for dim, values in zip(DIMENSIONS, (properties, categories, vendors, statuses)):
+            dictionary = self._dictionaries[dim]
+            # Dictionaries keep insertion order, so a value's code is its position
+            codes[dim] = np.fromiter((dictionary.setdefault(v, len(dictionary)) for v in values),
+                                     dtype=np.int32, count=len(values))
+        day = np.array(days, dtype=np.float64)
+        known = ~np.isnan(day)
+        day = np.where(known, day, 0).astype(np.int32)
+        month = day.astype("datetime64[D]").astype("datetime64[M]").astype(np.int32) + 1970 * 12
+        day[~known] = NO_DAY
+        month[~known] = NO_DAY
+        cost = np.array(costs, dtype=np.float64)
+        # NaN sorts past every edge, into NO_COST
+        cost_bin = np.searchsorted(BIN_EDGES, cost, side="right").astype(np.uint16)
+        return np.array(ids, dtype=np.int64), codes, day, month, np.nan_to_num(cost, nan=0.0), cost_bin
+
+    def _append(self, conn):
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(f"{LOAD_SQL} WHERE id > ? ORDER BY id", (self.last_id,))
+        start = self._count
+        while rows := cursor.fetchmany(LOAD_BATCH):
+            ids, codes, day, month, cost, cost_bin = self._encode(rows)
+            self._grow(self._count + len(ids))
+            end = self._count + len(ids)
+            self._ids[self._count:end] = ids
+            for dim in DIMENSIONS:
+                self._codes[dim][self._count:end] = codes[dim]
+            self._day[self._count:end] = day
+            self._month[self._count:end] = month
+            self._cost[self._count:end] = cost
+            self._cost_bin[self._count:end] = cost_bin
+            self._undated += int(np.count_nonzero(day == NO_DAY))
+            self._uncosted += int(np.count_nonzero(cost_bin == NO_COST))
+            self._count = end
+            self.last_id = int(ids[-1])
+        self.appended += self._count - start
+
+    def _grow(self, size):
+        capacity = len(self._ids)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        # New arrays: snapshots keep the old ones
+        self._ids = _resized(self._ids, capacity)
+        self._codes = {dim: _resized(codes, capacity) for dim, codes in self._codes.items()}
+        self._day = _resized(self._day, capacity)
+        self._month = _resized(self._month, capacity)
+        self._cost = _resized(self._cost, capacity)
+        self._cost_bin = _resized(self._cost_bin, capacity)
+
+    def _rebin(self):
+        n = self._count
+        # A stable sort of 16-bit keys is a radix sort
+        self._by_bin = np.argsort(self._cost_bin[:n], kind="stable")
+        self._bin_starts = np.concatenate(([0], np.cumsum(np.bincount(self._cost_bin[:n], minlength=BINS))))
+        self._binned = n
+        self._repriced = np.zeros(0, dtype=np.int64)
+
+    def _patch(self, conn, ids):
+        n = self._count
+        positions = np.searchsorted(self._ids[:n], ids)
+        if (positions >= n).any() or (self._ids[np.minimum(positions, n - 1)] != ids).any():
+            return False
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        rows = []
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows += cursor.execute(f"{LOAD_SQL} WHERE id IN ({', '.join('?' * len(chunk))}) ORDER BY id",
+                                   chunk).fetchall()
+        if len(rows) != len(ids):
+            # Deleted, which change_log doesn't say row by row
+            return False
+        _, codes, day, month, cost, cost_bin = self._encode(rows)
+        if self._shared:
+            # Snapshots handed out must not see the patch
+            self._codes = {dim: column.copy() for dim, column in self._codes.items()}
+            self._day, self._month = self._day.copy(), self._month.copy()
+            self._cost, self._cost_bin = self._cost.copy(), self._cost_bin.copy()
+            self._shared = False
+        self._undated += int(np.count_nonzero(day == NO_DAY)) - int(np.count_nonzero(self._day[positions] == NO_DAY))
+        self._uncosted += (int(np.count_nonzero(cost_bin == NO_COST))
+                           - int(np.count_nonzero(self._cost_bin[positions] == NO_COST)))
+        rebinned = positions[self._cost_bin[positions] != cost_bin]
+        for dim in DIMENSIONS:
+            self._codes[dim][positions] = codes[dim]
+        self._day[positions] = day
+        self._month[positions] = month
+        self._cost[positions] = cost
+        self._cost_bin[positions] = cost_bin
+        if len(rebinned):
+            self._repriced = np.union1d(self._repriced, rebinned)
+        self.patched += len(ids)
+        return True
+
+    def stats(self):
+        with self._lock:
+            if self._count is None:
+                return {"rows": 0, "bytes": 0}
+            arrays = [self._ids, self._day, self._month, self._cost, self._cost_bin, self._by_bin,
+                      *self._codes.values()]
+            return {
+                "rows": self._count,
+                "bytes": sum(a.nbytes for a in arrays),
+                "reloads": self.reloads,
+                "appended": self.appended,
+                "patched": self.patched,
+            }
+
+
+def _resized(array, capacity):
+    grown = np.zeros(capacity, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def day_number(value):
+    """``YYYY-MM-DD`` as days since 1970-01-01."""
+    return int(np.datetime64(date.fromisoformat(value), "D").astype(np.int64))
+
+
+def _bucket_label(bucket, value):
+    if bucket == "day":
+        return str(np.datetime64(value, "D"))
+    if bucket == "week":
+        return str(np.datetime64(value * 7 - 3, "D"))
+    if bucket == "month":
+        return month_label(value)
+    if bucket == "quarter":
+        return f"{value // 4:04d}-Q{value % 4 + 1}"
+    return f"{value:04d}"
+
+
+class _Part:
+    """The rows of one snapshot that match a rollup's filters, and how to key them."""
+
+    def __init__(self, snapshot, filters, first_day, last_day, bucket):
+        self.snapshot = snapshot
+        mask = None
+
+        def narrow(condition):
+            nonlocal mask
+            mask = condition if mask is None else mask & condition
+
+        for dim, value in filters.items():
+            labels = snapshot.labels[dim]
+            narrow(snapshot.codes[dim] == (labels.index(value) if value in labels else -1))
+        if first_day is not None:
+            narrow(snapshot.day >= first_day)
+        if last_day is not None:
+            narrow(snapshot.day <= last_day)
+        if (bucket or last_day is not None) and first_day is None and snapshot.undated:
+            narrow(snapshot.day != NO_DAY)
+        self.mask = mask
+        self.rows = None if mask is None else np.flatnonzero(mask)
+        # Per dimension, this snapshot's codes as codes into the labels shared by all parts
+        self.lookup = {}
+
+    def __len__(self):
+        return len(self.snapshot) if self.rows is None else len(self.rows)
+
+    def take(self, array):
+        return array if self.rows is None else array[self.rows]
+
+    def buckets(self, bucket, positions=None):
+        """Time bucket numbers, ordered like time, of the selected rows or of ``positions``."""
+        snapshot = self.snapshot
+        take = self.take if positions is None else (lambda array: array[positions])
+        if bucket == "day":
+            return take(snapshot.day)
+        if bucket == "week":
+            # 1970-01-01 was a Thursday; weeks start on Monday
+            return (take(snapshot.day) + 3) // 7
+        divisor = {"month": 1, "quarter": 3, "year": 12}[bucket]
+        return take(snapshot.month) if divisor == 1 else take(snapshot.month) // divisor
+
+    def keys(self, dimensions, sizes, bucket=None, first_bucket=0, positions=None):
+        take = self.take if positions is None else (lambda array: array[positions])
+        key = None
+        for dim, size in zip(dimensions, sizes):
+            codes = take(self.snapshot.codes[dim])
+            if dim in self.lookup:
+                codes = self.lookup[dim][codes]
+            if key is None:
+                key = codes.astype(np.intp)
+            else:
+                key *= size
+                key += codes
+        if bucket:
+            offsets = self.buckets(bucket, positions) - first_bucket
+            if key is None:
+                key = offsets.astype(np.intp)
+            else:
+                key *= sizes[-1]
+                key += offsets
+        if key is None:
+            key = np.zeros(len(self) if positions is None else len(positions), dtype=np.intp)
+        return key
+
+
+def rollup(snapshots, group_by=(), bucket=None, metrics=("count", "sum", "avg"), filters=None,
+           date_from=None, date_to=None, anomaly_z=None, order_by=None, limit=1000):
+    """Maintenance issues grouped by ``group_by`` dimensions and an optional time ``bucket``.
+
+    ``metrics`` are among METRICS and percentiles such as ``p90``, all over
+    cost except ``count``, which counts issues. With ``anomaly_z`` every
+    group's total cost gets a z-score against its peers: the other buckets
+    of the same group when bucketing by time, otherwise all other groups.
+    Groups scoring at least ``anomaly_z`` are flagged.
+    """
+    filters = {dim: value for dim, value in (filters or {}).items() if value is not None}
+    first_day = day_number(date_from) if date_from else None
+    last_day = day_number(date_to) if date_to else None
+    parts = [_Part(s, filters, first_day, last_day, bucket) for s in snapshots]
+    n = sum(len(part) for part in parts)
+
+    labels = {}
+    for dim in group_by:
+        if len(parts) == 1:
+            labels[dim] = parts[0].snapshot.labels[dim]
+            continue
+        union = {}
+        for part in parts:
+            part.lookup[dim] = np.fromiter((union.setdefault(v, len(union)) for v in part.snapshot.labels[dim]),
+                                           dtype=np.int32, count=len(part.snapshot.labels[dim]))
+        labels[dim] = list(union)
+    sizes = [max(len(labels[dim]), 1) for dim in group_by]
+    first_bucket = 0
+    if bucket:
+        ranges = [(int(b.min()), int(b.max())) for b in (part.buckets(bucket) for part in parts) if len(b)]
+        first_bucket = min((lo for lo, _ in ranges), default=0)
+        sizes.append(max((hi for _, hi in ranges), default=0) - first_bucket + 1)
+    span = sizes[-1] if bucket else 1
+    space = int(np.prod(sizes, dtype=np.float64)) if sizes else 1
+
+    keys = [part.keys(group_by, sizes, bucket, first_bucket) for part in parts]
+    ranked = [m for m in metrics if m in ("min", "max") or PERCENTILE.match(m)]
+    histogram = bool(ranked) and space * BINS <= MAX_HISTOGRAM
+    if space > max(DENSE_FACTOR * n, 1 << 16):
+        # Too many possible groups to count directly: number the ones present
+        groups, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+        offsets = np.cumsum([0] + [len(key) for key in keys])
+        keys = [inverse[lo:hi] for lo, hi in zip(offsets, offsets[1:])]
+        size = len(groups)
+    else:
+        groups, size = None, space
+
+    # Each pass over the rows costs about as much as the rest, so only the ones asked for
+    summed = anomaly_z is not None or any(m in metrics for m in ("sum", "avg", "std"))
+    costed = summed or bool(ranked)
+    count = np.zeros(size, dtype=np.int64)
+    cost_count = np.zeros(size)
+    total = np.zeros(size)
+    squares = np.zeros(size) if "std" in metrics else None
+    cells = np.zeros(size * BINS, dtype=np.int64) if histogram else None
+    for part, key in zip(parts, keys):
+        snapshot = part.snapshot
+        if summed:
+            total += np.bincount(key, weights=part.take(snapshot.cost), minlength=size)
+        if squares is not None:
+            squares += np.bincount(key, weights=part.take(snapshot.cost) ** 2, minlength=size)
+        if histogram:
+            cell = key * BINS
+            cell += part.take(snapshot.cost_bin)
+            cells += np.bincount(cell, minlength=size * BINS)
+            continue
+        counts = np.bincount(key, minlength=size)
+        count += counts
+        if costed and snapshot.uncosted:
+            cost_count += np.bincount(key, weights=part.take(snapshot.cost_bin) != NO_COST, minlength=size)
+        elif costed:
+            cost_count += counts
+    if histogram:
+        cells = cells.reshape(size, BINS)
+        count = cells.sum(axis=1)
+        cost_count = (count - cells[:, NO_COST]).astype(np.float64)
+
+    if groups is None:
+        groups = np.flatnonzero(count)
+        # The key each group was counted under
+        counted = groups
+    else:
+        counted = np.arange(len(groups))
+    count, cost_count, total = count[counted], cost_count[counted], total[counted]
+    if histogram:
+        cells = cells[counted]
+    g = len(groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(cost_count > 0, total / cost_count, np.nan)
+        results = {"count": count, "sum": np.where(cost_count > 0, total, np.nan), "avg": mean}
+        if squares is not None:
+            results["std"] = np.sqrt(np.maximum(squares[counted] / cost_count - mean * mean, 0))
+
+    z = None
+    if anomaly_z is not None:
+        # Peers are the same group's other buckets (empty ones count as 0), or every group
+        peers = groups // span if bucket else np.zeros(g, dtype=np.int64)
+        _, peer = np.unique(peers, return_inverse=True)
+        peer_size = span if bucket else max(g, 1)
+        peer_mean = np.bincount(peer, weights=total) / peer_size
+        peer_std = np.sqrt(np.maximum(np.bincount(peer, weights=total * total) / peer_size - peer_mean ** 2, 0))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            z = np.where(peer_std[peer] > 0, (total - peer_mean[peer]) / peer_std[peer], 0.0)
+
+    # Percentiles for every group if they decide the order, else only for the rows returned
+    rows = np.arange(g)
+    if order_by in ranked:
+        results.update(_ranked(ranked, rows, parts, keys, groups, counted, cost_count, cells, group_by, sizes,
+                               bucket, first_bucket))
+        ranked = []
+    if z is not None and order_by == "cost_z":
+        rows = rows[np.argsort(-z, kind="stable")]
+    elif order_by:
+        rows = rows[np.argsort(-np.nan_to_num(results[order_by], nan=-np.inf), kind="stable")]
+    rows = rows[:limit]
+    if ranked:
+        for metric, values in _ranked(ranked, rows, parts, keys, groups, counted, cost_count, cells, group_by,
+                                      sizes, bucket, first_bucket).items():
+            results[metric] = np.full(g, np.nan)
+            results[metric][rows] = values
+
+    # Back from keys to labels, least significant (the bucket) first
+    remaining = groups[rows]
+    columns = {}
+    if bucket:
+        remaining, offset = np.divmod(remaining, span)
+        columns["bucket"] = [_bucket_label(bucket, int(v) + first_bucket) for v in offset]
+    for dim, size in reversed(list(zip(group_by, sizes))):
+        remaining, code = np.divmod(remaining, size)
+        columns[dim] = [labels[dim][c] if labels[dim] else None for c in code]
+
+    out = []
+    for i, row in enumerate(rows):
+        item = {dim: columns[dim][i] for dim in group_by}
+        if bucket:
+            item["bucket"] = columns["bucket"][i]
+        for metric in metrics:
+            value = results[metric][row]
+            item[metric] = int(value) if metric == "count" else None if np.isnan(value) else round(float(value), 2)
+        if z is not None:
+            item["cost_z"] = round(float(z[row]), 3)
+            item["anomaly"] = bool(z[row] >= anomaly_z)
+        out.append(item)
+    return {"issues": int(n), "groups": int(g), "rows": out}
+
+
+def _ranked(metrics, rows, parts, keys, groups, counted, cost_count, cells, group_by, sizes, bucket, first_bucket):
+    """Percentiles (numpy's default linear interpolation), min and max of cost for groups ``rows``."""
+    costed = cost_count[rows].astype(np.int64)
+    targets = {}
+    for metric in metrics:
+        q = {"min": 0.0, "max": 100.0}.get(metric)
+        targets[metric] = (costed - 1) * (float(metric[1:]) if q is None else q) / 100
+    if cells is None:
+        found = _ranked_by_sort(rows, parts, keys, counted)
+    else:
+        found = _ranked_by_bin(targets, costed, rows, parts, groups, cells, group_by, sizes, bucket, first_bucket)
+    results = {}
+    for metric, position in targets.items():
+        values = np.full(len(rows), np.nan)
+        for i, row in enumerate(rows):
+            if costed[i]:
+                lo = int(np.floor(position[i]))
+                hi = min(lo + 1, costed[i] - 1)
+                low, high = found(i, row, lo), found(i, row, hi)
+                values[i] = low + (high - low) * (position[i] - lo)
+        results[metric] = values
+    return results
+
+
+def _ranked_by_bin(targets, costed, rows, parts, groups, cells, group_by, sizes, bucket, first_bucket):
+
+    # Each wanted rank is found in the one cost bin that holds it
+    by_bin = {}
+    for i, row in enumerate(rows):
+        if not costed[i]:
+            continue
+        ranks = set()
+        for position in targets.values():
+            lo = int(np.floor(position[i]))
+            ranks.update((lo, min(lo + 1, costed[i] - 1)))
+        cumulative = np.cumsum(cells[row, :NO_COST])
+        for rank in ranks:
+            b = int(np.searchsorted(cumulative, rank, side="right"))
+            by_bin.setdefault(b, []).append((row, rank, rank - (int(cumulative[b - 1]) if b else 0)))
+    found = {}
+    for b, wanted in by_bin.items():
+        costs, candidate_keys = [], []
+        for part in parts:
+            positions = part.snapshot.in_bin(b)
+            if part.mask is not None:
+                positions = positions[part.mask[positions]]
+            costs.append(part.snapshot.cost[positions])
+            candidate_keys.append(part.keys(group_by, sizes, bucket, first_bucket, positions))
+        costs, candidate_keys = np.concatenate(costs), np.concatenate(candidate_keys)
+        for row, rank, within in wanted:
+            found[row, rank] = np.partition(costs[candidate_keys == groups[row]], within)[within]
+    return lambda i, row, rank: found[row, rank]
+
+
+def _ranked_by_sort(rows, parts, keys, counted):
+    # Too many groups for the histogram: sort their costs by group, then cost
+    key = np.concatenate(keys)
+    costs = np.concatenate([part.take(part.snapshot.cost) for part in parts])
+    wanted = np.concatenate([part.take(part.snapshot.cost_bin) != NO_COST for part in parts])
+    wanted &= np.isin(key, counted[rows])
+    key, costs = key[wanted], costs[wanted]
+    order = np.lexsort((costs, key))
+    key, costs = key[order], costs[order]
+    starts = np.searchsorted(key, counted[rows])
+    return lambda i, row, rank: costs[starts[i] + rank]
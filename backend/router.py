@@ -0,0 +1,469 @@
+import re
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from aggregates import load_analytics
+
+# Real-estate ontology: every phrase a user might type, mapped to the concept it
+# stands for. Category and lease-type concepts also carry the stored values they
+# select, so "hvac" can widen to every climate-control category.
+CATEGORY_SYNONYMS = {
+    ("plumbing",): ["plumbing", "plumber", "leak", "leaks", "leakage", "leaking", "pipe", "pipes",
+                    "drain", "drainage", "tap", "faucet", "seepage"],
+    ("electrical",): ["electrical", "electric", "electrician", "wiring", "power", "ups", "switch",
+                      "geyser", "short circuit", "mcb"],
+    ("heating",): ["heating", "heater", "heaters", "heat", "furnace", "boiler", "radiator"],
+    ("hvac", "heating", "cooling"): ["hvac", "air conditioning", "air conditioner", "ac", "a c",
+                                     "cooling", "ventilation", "chiller"],
+    ("painting",): ["painting", "paint", "repaint", "touch up"],
+    ("gardening",): ["gardening", "garden", "lawn", "landscaping", "pruning"],
+    ("roofing",): ["roof", "roofing", "terrace", "waterproofing"],
+    ("pest_control",): ["pest", "pests", "pest control", "termite", "termites"],
+}
+
+LEASE_TYPE_SYNONYMS = {
+    "Triple Net": ["triple net", "nnn", "net net net", "cam", "cam charges", "common area maintenance"],
+    "Gross Lease": ["gross lease", "gross"],
+    "11-Month Agreement": ["11 month", "eleven month", "leave and license"],
+    "Standard Lease": ["standard lease"],
+}
+
+LEASE_TYPE_LABELS = {"Triple Net": "Triple Net Lease"}
+
+KEYWORDS = {
+    "cost": ["cost", "costs", "spend", "spent", "spending", "expense", "expenses", "price", "paid",
+             "money", "budget"],
+    "lease": ["lease", "leases", "agreement", "agreements", "contract", "contracts", "tenancy"],
+    "expire": ["expire", "expires", "expiring", "expiry", "expiration", "expired", "end", "ends",
+               "ending", "renewal", "renewals", "renew"],
+    "recurring": ["recurring", "recur", "recurs", "repeat", "repeated", "repeating", "multiple",
+                  "again", "frequent"],
+    "history": ["last", "latest", "recent", "recently", "when", "history", "previous", "repaired",
+                "fixed"],
+    "issue": ["issue", "issues", "complaint", "complaints", "problem", "problems", "maintenance",
+              "repair", "repairs", "work order", "work orders", "ticket", "tickets"],
+}
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "eighteen": 18, "twenty four": 24,
+}
+UNIT_DAYS = {"day": 1, "days": 1, "week": 7, "weeks": 7, "month": 30, "months": 30, "year": 365, "years": 365}
+
+ADDRESS_STOPWORDS = {"unit", "flat", "floor", "road", "rd", "street", "st", "the", "of", "and", "near",
+                     "east", "west", "north", "south", "no", "plot", "sector"}
+
+TOKEN = re.compile(r"\d{4}-\d{2}-\d{2}|[a-z0-9]+")
+YEAR = re.compile(r"^(?:19|20)\d{2}$")
+ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+# Longest look-back or look-ahead a question gets, so "in 99999999 years" stays a valid date
+MAX_SPAN_DAYS = 100 * 365
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+class PhraseMatcher:
+    """Multi-pattern matcher compiled from phrase -> value pairs.
+
+    Phrases are stored as token tuples in one hash table, so matching is a
+    probe per token n-gram: cost depends on query length and the longest
+    phrase, not on how many phrases or intents are registered.
+    """
+
+    def __init__(self, phrases):
+        self.table = {}
+        self.max_len = 1
+        for phrase, value in phrases:
+            key = tuple(tokenize(phrase))
+            self.table.setdefault(key, []).append(value)
+            self.max_len = max(self.max_len, len(key))
+
+    def match(self, tokens):
+        found = []
+        i = 0
+        while i < len(tokens):
+            # Longest match wins so "gross lease" is not also read as "lease"
+            for size in range(min(self.max_len, len(tokens) - i), 0, -1):
+                values = self.table.get(tuple(tokens[i:i + size]))
+                if values:
+                    found.extend(values)
+                    i += size
+                    break
+            else:
+                i += 1
+        return found
+
+
+def _ontology_phrases():
+    for categories, phrases in CATEGORY_SYNONYMS.items():
+        for phrase in phrases:
+            yield phrase, ("category", categories)
+    for lease_type, phrases in LEASE_TYPE_SYNONYMS.items():
+        for phrase in phrases:
+            yield phrase, ("lease_type", lease_type)
+    for concept, phrases in KEYWORDS.items():
+        for phrase in phrases:
+            yield phrase, ("concept", concept)
+
+
+MATCHER = PhraseMatcher(_ontology_phrases())
+
+
+@dataclass
+class Route:
+    intent: str
+    tokens: list
+    concepts: set
+    property_id: str = None
+    # Several properties, when a place or a name covers more than one
+    property_ids: tuple = ()
+    address: str = None
+    vendor: str = None
+    mentions: list = field(default_factory=list)
+    categories: tuple = ()
+    lease_type: str = None
+    period: tuple = None
+    period_label: str = None
+    horizon_days: int = 180
+    horizon_label: str = "6 months"
+
+
+@dataclass
+class Intent:
+    name: str
+    triggers: list
+    handler: object = field(default=None, repr=False)
+
+
+RECENT = ("last", "past", "previous")
+
+# Words the router reads itself, never taken for part of a name
+VOCABULARY = (
+    {word for phrase in MATCHER.table for word in phrase}
+    | {word for phrase in NUMBER_WORDS for word in phrase.split()}
+    | set(UNIT_DAYS) | set(RECENT)
+    | {"this", "current", "next", "coming", "since", "after", "before", "between", "what", "which", "who",
+       "where", "how", "much", "many", "show", "list", "tell", "give", "find", "all", "any", "are", "was",
+       "were", "did", "does", "have", "has", "been", "for", "from", "with", "about", "there", "our", "total",
+       "property", "properties", "tenant", "tenants", "vendor", "vendors", "landlord", "owner"}
+)
+
+
+def _count_before(tokens, i):
+    """Read the number just before tokens[i] ("6", "six", "twenty four"); return (count, start)."""
+    if i >= 2 and f"{tokens[i - 2]} {tokens[i - 1]}" in NUMBER_WORDS:
+        return NUMBER_WORDS[f"{tokens[i - 2]} {tokens[i - 1]}"], i - 2
+    if i >= 1 and tokens[i - 1].isdigit():
+        return int(tokens[i - 1]), i - 1
+    if i >= 1 and tokens[i - 1] in NUMBER_WORDS:
+        return NUMBER_WORDS[tokens[i - 1]], i - 1
+    return None, i
+
+
+def _is_date(token):
+    # Shaped like a date and a real one (not 2024-13-45), with a day after it
+    if not ISO_DATE.match(token):
+        return False
+    try:
+        return date.fromisoformat(token) < date.max
+    except ValueError:
+        return False
+
+
+def extract_period(tokens, today):
+    """Return ((start, end), label) for the date range a query mentions; end is exclusive or None."""
+    dates = [t for t in tokens if _is_date(t)]
+    if len(dates) >= 2:
+        first, last = sorted(dates[:2])
+        end = (date.fromisoformat(last) + timedelta(days=1)).isoformat()
+        return (first, end), f"between {first} and {last}"
+    if dates:
+        return (dates[0], None), f"since {dates[0]}"
+
+    for i, token in enumerate(tokens):
+        if token in ("this", "current") and i + 1 < len(tokens) and tokens[i + 1] in ("year", "month"):
+            start = today.replace(month=1, day=1) if tokens[i + 1] == "year" else today.replace(day=1)
+            return (start.isoformat(), None), f"this {tokens[i + 1]}"
+        if token not in UNIT_DAYS:
+            continue
+        count, start = _count_before(tokens, i)
+        if count and start > 0 and tokens[start - 1] in RECENT:
+            since = today - timedelta(days=min(count * UNIT_DAYS[token], MAX_SPAN_DAYS))
+            return (since.isoformat(), None), f"in the last {count} {token}"
+        if not count and i > 0 and tokens[i - 1] in RECENT:
+            if token == "year":
+                year = today.year - 1
+                return (f"{year}-01-01", f"{year + 1}-01-01"), f"in {year}"
+            since = today - timedelta(days=UNIT_DAYS[token])
+            return (since.isoformat(), None), f"in the last {token}"
+
+    years = sorted({int(t) for t in tokens if YEAR.match(t)})
+    if years:
+        first, last = years[0], years[-1]
+        if first == last and any(t in ("since", "after") for t in tokens):
+            return (f"{first}-01-01", None), f"since {first}"
+        label = f"in {first}" if first == last else f"between {first} and {last}"
+        return (f"{first}-01-01", f"{last + 1}-01-01"), label
+    return None, None
+
+
+def extract_horizon(tokens):
+    """Look-ahead window for lease questions, e.g. "next 90 days"; defaults to six months."""
+    for i, token in enumerate(tokens):
+        if token not in UNIT_DAYS:
+            continue
+        count, _ = _count_before(tokens, i)
+        if count:
+            return min(count * UNIT_DAYS[token], MAX_SPAN_DAYS), f"{count} {token}"
+        if i > 0 and tokens[i - 1] in ("next", "coming"):
+            return UNIT_DAYS[token], token
+    return 180, "6 months"
+
+
+class Router:
+    """Routes a natural-language question to an intent and its slots.
+
+    Triggers are sets of concepts (keywords) and slots ("@property",
+    "@category", "@lease_type", "@period"). Keywords weigh more than slots so
+    "cost of plumbing at Galaxy" is a cost question scoped to a category and
+    property, not a history lookup; ties go to the intent declared first.
+    Each trigger is indexed under a single anchor, a keyword when it has one,
+    so a query only inspects triggers anchored on something it mentions and
+    routing cost does not grow with the number of registered intents.
+    """
+
+    def __init__(self, intents, fallback):
+        self.intents = intents
+        self.fallback = fallback
+        self.by_concept = {}
+        for order, intent in enumerate(intents):
+            for trigger in intent.triggers:
+                trigger = frozenset(trigger)
+                weight = sum(1 if c.startswith("@") else 2 for c in trigger)
+                anchor = min(trigger, key=lambda c: (c.startswith("@"), c))
+                self.by_concept.setdefault(anchor, []).append((intent, trigger, weight, order))
+
+    def route(self, text, entities=None, today=None):
+        today = today or date.today()
+        tokens = tokenize(text)
+        route = Route(intent=self.fallback.name, tokens=tokens, concepts=set())
+
+        categories = []
+        for kind, value in MATCHER.match(tokens):
+            if kind == "category":
+                categories.extend(c for c in value if c not in categories)
+                route.concepts.add("@category")
+            elif kind == "lease_type":
+                route.lease_type = value
+                route.concepts.add("@lease_type")
+            else:
+                route.concepts.add(value)
+        route.categories = tuple(categories)
+
+        if entities is not None:
+            route.mentions = entities.bind(tokens, VOCABULARY)
+            _bind(route, route.mentions)
+
+        route.period, route.period_label = extract_period(tokens, today)
+        if route.period:
+            route.concepts.add("@period")
+        route.horizon_days, route.horizon_label = extract_horizon(tokens)
+
+        best = None
+        for concept in route.concepts:
+            for intent, trigger, weight, order in self.by_concept.get(concept, ()):
+                if trigger <= route.concepts and (best is None or (weight, -order) > best[:2]):
+                    best = (weight, -order, intent)
+        route.intent = best[2].name if best else self.fallback.name
+        return route, (best[2] if best else self.fallback)
+
+
+def _bind(route, mentions):
+    # Entity mentions become slots; a property named outright beats one a place or name implies
+    for mention in sorted(mentions, key=lambda m: m["kind"] != "property"):
+        kind = mention["kind"]
+        if kind == "property" and not route.property_id:
+            route.property_id, route.address, route.property_ids = mention["id"], mention["name"], ()
+        elif kind in ("place", "tenant", "landlord") and not route.property_id and not route.property_ids:
+            if mention["property_count"] == 1:
+                route.property_id, route.address = mention["property_ids"][0], mention["address"]
+            elif len(mention["property_ids"]) == mention["property_count"]:
+                route.property_ids, route.address = tuple(mention["property_ids"]), mention["name"]
+            else:
+                # Too broad to filter by; the mention only lists some of its properties
+                continue
+        elif kind == "vendor" and not route.vendor:
+            route.vendor = mention["name"]
+            route.concepts.add("@vendor")
+            continue
+        elif kind == "category":
+            if mention["id"] not in route.categories:
+                route.categories += (mention["id"],)
+            route.concepts.add("@category")
+            continue
+        else:
+            continue
+        route.concepts.add("@property")
+
+
+# SQL templates. Each handler takes a pooled connection and the Route and
+# returns (answer, rows); filters are appended only for the slots present.
+
+def _filters(route, alias="", category=True, period=True, prop=True):
+    clauses, params = [], []
+    if prop and route.property_id:
+        clauses.append(f"{alias}property_id = ?")
+        params.append(route.property_id)
+    elif prop and route.property_ids:
+        clauses.append(f"{alias}property_id IN ({', '.join('?' * len(route.property_ids))})")
+        params.extend(route.property_ids)
+    if route.vendor:
+        clauses.append(f"{alias}vendor = ?")
+        params.append(route.vendor)
+    if category and route.categories:
+        clauses.append(f"{alias}category IN ({', '.join('?' * len(route.categories))})")
+        params.extend(route.categories)
+    if period and route.period:
+        start, end = route.period
+        clauses.append(f"{alias}date >= ?")
+        params.append(start)
+        if end:
+            clauses.append(f"{alias}date < ?")
+            params.append(end)
+    return clauses, params
+
+
+def _where(clauses):
+    return f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+
+def _scope(route):
+    parts = []
+    if route.categories:
+        parts.append(route.categories[0].replace("_", " "))
+    parts.append("issue(s)" if not route.categories else "complaint(s)")
+    if route.vendor:
+        parts.append(f"by {route.vendor}")
+    if route.address:
+        parts.append(f"at {route.address}")
+    if route.period_label:
+        parts.append(route.period_label)
+    return " ".join(parts)
+
+
+def maintenance_history(conn, route):
+    clauses, params = _filters(route)
+    rows = [dict(row) for row in conn.execute(f"""
+        SELECT * FROM maintenance_issues
+        {_where(clauses)}
+        ORDER BY date DESC
+    """, params)]
+    label = route.categories[0].replace("_", " ") if route.categories else "maintenance"
+    if not rows:
+        return f"No {label} issues recorded at {route.address}.", rows
+    latest = rows[0]
+    return (
+        f"The {label} at {route.address} was last repaired on {latest['date']} by {latest['vendor']} "
+        f"(₹{latest['cost']:,.2f}). Issue: {latest['description']}"
+    ), rows
+
+
+def filtered_maintenance(conn, route):
+    clauses, params = _filters(route, alias="m.")
+    rows = [dict(row) for row in conn.execute(f"""
+        SELECT m.*, p.address
+        FROM maintenance_issues m
+        JOIN properties p ON m.property_id = p.id
+        {_where(clauses)}
+        ORDER BY m.date DESC
+    """, params)]
+    return f"Found {len(rows)} {_scope(route)}.", rows
+
+
+def expiring_leases(conn, route):
+    today = date.today()
+    clauses = ["lease_end_date <= ?", "lease_end_date >= ?"]
+    params = [(today + timedelta(days=route.horizon_days)).isoformat(), today.isoformat()]
+    if route.property_id:
+        clauses.append("id = ?")
+        params.append(route.property_id)
+    elif route.property_ids:
+        clauses.append(f"id IN ({', '.join('?' * len(route.property_ids))})")
+        params.extend(route.property_ids)
+    rows = [dict(row) for row in conn.execute(f"""
+        SELECT * FROM properties
+        {_where(clauses)}
+        ORDER BY lease_end_date
+    """, params)]
+    return f"Found {len(rows)} lease(s) expiring in the next {route.horizon_label}.", rows
+
+
+def financial_summary(conn, route):
+    clauses, params = _filters(route)
+    rows = [dict(row) for row in conn.execute(f"""
+        SELECT p.address, t.total_cost, t.issue_count
+        FROM (
+            SELECT property_id, SUM(cost) as total_cost, COUNT(*) as issue_count
+            FROM maintenance_issues
+            {_where(clauses)}
+            GROUP BY property_id
+        ) t
+        JOIN properties p ON t.property_id = p.id
+    """, params)]
+    total = sum(row["total_cost"] or 0 for row in rows)
+    scope = route.address or "all properties"
+    if route.categories:
+        scope = f"{route.categories[0].replace('_', ' ')} at {scope}"
+    if route.vendor:
+        scope = f"{scope} by {route.vendor}"
+    if route.period_label:
+        scope = f"{scope} {route.period_label}"
+    return f"Total maintenance costs across {scope}: ${total:,.2f}", rows
+
+
+def lease_type_info(conn, route):
+    rows = [dict(row) for row in conn.execute(
+        "SELECT * FROM properties WHERE lease_type = ?", (route.lease_type,)
+    )]
+    label = LEASE_TYPE_LABELS.get(route.lease_type, route.lease_type)
+    return f"Found {len(rows)} {label} properties.", rows
+
+
+def recurring_issues(conn, route):
+    clauses, params = _filters(route)
+    rows = [dict(row) for row in conn.execute(f"""
+        SELECT property_id, category, COUNT(*) as occurrence_count,
+               GROUP_CONCAT(date) as dates, SUM(cost) as total_cost
+        FROM maintenance_issues
+        {_where(clauses)}
+        GROUP BY property_id, category
+        HAVING COUNT(*) > 1
+        ORDER BY occurrence_count DESC
+    """, params)]
+    return f"Found {len(rows)} recurring maintenance issues across properties.", rows
+
+
+def system_overview(conn, route):
+    # Reads the maintained aggregates rather than counting the source tables
+    stats = load_analytics(conn)
+    return (
+        f"System Overview: {stats['total_properties']} properties, "
+        f"${stats['total_monthly_rent'] or 0:,.2f} total monthly rent, "
+        f"{stats['active_issues']} active maintenance issues."
+    ), []
+
+
+# Declaration order breaks ties between equally specific triggers.
+INTENTS = [
+    Intent("expiring_leases", [{"lease", "expire"}], expiring_leases),
+    Intent("recurring_issues", [{"recurring"}], recurring_issues),
+    Intent("financial_summary", [{"cost"}], financial_summary),
+    Intent("lease_type_info", [{"@lease_type"}], lease_type_info),
+    Intent("maintenance_history", [{"@property", "@category"}, {"@property", "history"}], maintenance_history),
+    Intent("filtered_maintenance", [{"@category"}, {"issue", "@period"}, {"issue", "@property"},
+                                    {"@vendor"}], filtered_maintenance),
+]
+
+ROUTER = Router(INTENTS, fallback=Intent("system_overview", [], system_overview))
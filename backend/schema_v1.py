@@ -0,0 +1,495 @@
+"""Schema version 1, frozen: the first step of the migrations in main.py.
+
+These are the statements the schema builders ran when versioning began,
+copied here so that no later edit can change what step 1 does to a new
+database: a database at user_version 1 or above never runs it again, so a
+schema change is always a new step. Every statement is idempotent and each
+derived structure (full-text indexes, summary tables, the vector queue) is
+filled only when it is first created, so the step also brings a database
+from before versioning up to date. Nothing but the migration lists calls
+this module, and it is never edited.
+"""
+from datetime import datetime
+
+TABLES = [
+    """
+        CREATE TABLE IF NOT EXISTS properties (
+            id TEXT PRIMARY KEY,
+            address TEXT NOT NULL,
+            type TEXT,
+            tenant_name TEXT,
+            lease_type TEXT,
+            rent_amount REAL,
+            lease_start_date TEXT,
+            lease_end_date TEXT,
+            landlord_name TEXT,
+            pan_number TEXT,
+            created_at TEXT
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS maintenance_issues (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            property_id TEXT,
+            category TEXT,
+            description TEXT,
+            date TEXT,
+            status TEXT,
+            cost REAL,
+            vendor TEXT,
+            created_at TEXT,
+            FOREIGN KEY (property_id) REFERENCES properties(id)
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            property_id TEXT,
+            type TEXT,
+            filename TEXT,
+            upload_date TEXT,
+            extracted_data TEXT,
+            content_summary TEXT,
+            size INTEGER,
+            sha256 TEXT,
+            content_type TEXT,
+            FOREIGN KEY (property_id) REFERENCES properties(id)
+        )
+    """,
+]
+
+# (table, column, declaration) added to tables that predate the column
+ADDED_COLUMNS = [
+    # Natural key for bulk imports: the source system's work-order id, or a hash
+    ("maintenance_issues", "source_key", "TEXT"),
+    ("documents", "size", "INTEGER"),
+    ("documents", "sha256", "TEXT"),
+    ("documents", "content_type", "TEXT"),
+]
+
+# Secondary indexes for the API's access paths. Column order matters:
+# equality columns first, then the ORDER BY / range column, then any
+# columns an aggregate reads so the index covers the query on its own.
+INDEXES = [
+    # get_property, per-property/category history, recurring-issue and per-property cost rollups
+    "CREATE INDEX IF NOT EXISTS idx_maintenance_property_category ON maintenance_issues "
+    "(property_id, category, date, cost)",
+    # get_maintenance ORDER BY date
+    "CREATE INDEX IF NOT EXISTS idx_maintenance_date ON maintenance_issues (date)",
+    # category + date range filters and the GROUP BY category aggregate
+    "CREATE INDEX IF NOT EXISTS idx_maintenance_category_date ON maintenance_issues (category, date, cost)",
+    # keyset pages of get_maintenance filtered by property, status or category;
+    # the implicit trailing rowid makes each one ordered on (date, id)
+    "CREATE INDEX IF NOT EXISTS idx_maintenance_property_date ON maintenance_issues (property_id, date)",
+    "CREATE INDEX IF NOT EXISTS idx_maintenance_status_date ON maintenance_issues (status, date)",
+    "CREATE INDEX IF NOT EXISTS idx_maintenance_category_page ON maintenance_issues (category, date)",
+    # lease expiry ranges
+    "CREATE INDEX IF NOT EXISTS idx_properties_lease_end ON properties (lease_end_date)",
+    "CREATE INDEX IF NOT EXISTS idx_properties_lease_type ON properties (lease_type)",
+    # get_documents ORDER BY upload_date, optionally per property
+    "CREATE INDEX IF NOT EXISTS idx_documents_upload_date ON documents (upload_date)",
+    "CREATE INDEX IF NOT EXISTS idx_documents_property ON documents (property_id, upload_date)",
+    "CREATE INDEX IF NOT EXISTS idx_documents_type ON documents (type, upload_date)",
+    # bulk import upserts
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_maintenance_source_key ON maintenance_issues (source_key)",
+    # upload dedupe by content hash
+    "CREATE INDEX IF NOT EXISTS idx_documents_sha256 ON documents (sha256, property_id)",
+]
+
+# Indexes replaced by a wider one above
+DROPPED_INDEXES = ["idx_maintenance_status"]
+
+# (table, statements creating it and what keeps it in step, statements filling it the first time)
+DERIVED = [
+    ("maintenance_fts", [
+        """
+            CREATE VIRTUAL TABLE IF NOT EXISTS maintenance_fts USING fts5(
+                description, category, vendor,
+                content='maintenance_issues', content_rowid='id',
+                tokenize='porter unicode61 remove_diacritics 2'
+            )
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS maintenance_fts_ai AFTER INSERT ON maintenance_issues BEGIN
+                INSERT INTO maintenance_fts (rowid, description, category, vendor) VALUES (new.id, new.description,
+                    new.category, new.vendor);
+            END
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS maintenance_fts_ad AFTER DELETE ON maintenance_issues BEGIN
+                INSERT INTO maintenance_fts (maintenance_fts, rowid, description, category, vendor) VALUES
+                    ('delete', old.id, old.description, old.category, old.vendor);
+            END
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS maintenance_fts_au AFTER UPDATE OF description, category, vendor ON
+                maintenance_issues BEGIN
+                INSERT INTO maintenance_fts (maintenance_fts, rowid, description, category, vendor) VALUES
+                    ('delete', old.id, old.description, old.category, old.vendor);
+                INSERT INTO maintenance_fts (rowid, description, category, vendor) VALUES (new.id, new.description,
+                    new.category, new.vendor);
+            END
+        """,
+    ], [
+        "INSERT INTO maintenance_fts (maintenance_fts) VALUES ('rebuild')",
+    ]),
+    ("documents_fts", [
+        """
+            CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                filename, content_summary, extracted_data,
+                content='documents', content_rowid='id',
+                tokenize='porter unicode61 remove_diacritics 2'
+            )
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS documents_fts_ai AFTER INSERT ON documents BEGIN
+                INSERT INTO documents_fts (rowid, filename, content_summary, extracted_data) VALUES (new.id,
+                    new.filename, new.content_summary, new.extracted_data);
+            END
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS documents_fts_ad AFTER DELETE ON documents BEGIN
+                INSERT INTO documents_fts (documents_fts, rowid, filename, content_summary, extracted_data) VALUES
+                    ('delete', old.id, old.filename, old.content_summary, old.extracted_data);
+            END
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS documents_fts_au AFTER UPDATE OF filename, content_summary, extracted_data
+                ON documents BEGIN
+                INSERT INTO documents_fts (documents_fts, rowid, filename, content_summary, extracted_data) VALUES
+                    ('delete', old.id, old.filename, old.content_summary, old.extracted_data);
+                INSERT INTO documents_fts (rowid, filename, content_summary, extracted_data) VALUES (new.id,
+                    new.filename, new.content_summary, new.extracted_data);
+            END
+        """,
+    ], [
+        "INSERT INTO documents_fts (documents_fts) VALUES ('rebuild')",
+    ]),
+    ("portfolio_stats", [
+        """
+            CREATE TABLE IF NOT EXISTS portfolio_stats (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                property_count INTEGER NOT NULL DEFAULT 0,
+                rent_count INTEGER NOT NULL DEFAULT 0,
+                total_rent REAL NOT NULL DEFAULT 0,
+                issue_count INTEGER NOT NULL DEFAULT 0,
+                cost_count INTEGER NOT NULL DEFAULT 0,
+                total_cost REAL NOT NULL DEFAULT 0
+            )
+        """,
+        """
+            CREATE TABLE IF NOT EXISTS property_stats (
+                property_id TEXT, status TEXT,
+                issue_count INTEGER NOT NULL DEFAULT 0,
+                cost_count INTEGER NOT NULL DEFAULT 0,
+                total_cost REAL NOT NULL DEFAULT 0
+            )
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_property_stats_key ON property_stats (property_id, status)",
+        """
+            CREATE TABLE IF NOT EXISTS category_stats (
+                category TEXT,
+                issue_count INTEGER NOT NULL DEFAULT 0,
+                cost_count INTEGER NOT NULL DEFAULT 0,
+                total_cost REAL NOT NULL DEFAULT 0
+            )
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_category_stats_key ON category_stats (category)",
+        """
+            CREATE TABLE IF NOT EXISTS status_stats (
+                status TEXT,
+                issue_count INTEGER NOT NULL DEFAULT 0,
+                cost_count INTEGER NOT NULL DEFAULT 0,
+                total_cost REAL NOT NULL DEFAULT 0
+            )
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_status_stats_key ON status_stats (status)",
+        """
+            CREATE TRIGGER IF NOT EXISTS maintenance_stats_ai AFTER INSERT ON maintenance_issues BEGIN
+                UPDATE portfolio_stats SET issue_count = issue_count + 1, cost_count = cost_count + 1 * (new.cost IS
+                    NOT NULL), total_cost = total_cost + 1 * IFNULL(new.cost, 0) WHERE id = 1;
+                INSERT INTO property_stats (property_id, status) SELECT new.property_id, new.status WHERE NOT EXISTS
+                    (SELECT 1 FROM property_stats WHERE property_id IS new.property_id AND status IS new.status);
+                UPDATE property_stats SET issue_count = issue_count + 1, cost_count = cost_count + 1 * (new.cost IS
+                    NOT NULL), total_cost = total_cost + 1 * IFNULL(new.cost, 0) WHERE property_id IS
+                    new.property_id AND status IS new.status;
+                INSERT INTO category_stats (category) SELECT new.category WHERE NOT EXISTS (SELECT 1 FROM
+                    category_stats WHERE category IS new.category);
+                UPDATE category_stats SET issue_count = issue_count + 1, cost_count = cost_count + 1 * (new.cost IS
+                    NOT NULL), total_cost = total_cost + 1 * IFNULL(new.cost, 0) WHERE category IS new.category;
+                INSERT INTO status_stats (status) SELECT new.status WHERE NOT EXISTS (SELECT 1 FROM status_stats
+                    WHERE status IS new.status);
+                UPDATE status_stats SET issue_count = issue_count + 1, cost_count = cost_count + 1 * (new.cost IS
+                    NOT NULL), total_cost = total_cost + 1 * IFNULL(new.cost, 0) WHERE status IS new.status;
+            END
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS maintenance_stats_ad AFTER DELETE ON maintenance_issues BEGIN
+                UPDATE portfolio_stats SET issue_count = issue_count + -1, cost_count = cost_count + -1 * (old.cost
+                    IS NOT NULL), total_cost = total_cost + -1 * IFNULL(old.cost, 0) WHERE id = 1;
+                UPDATE property_stats SET issue_count = issue_count + -1, cost_count = cost_count + -1 * (old.cost
+                    IS NOT NULL), total_cost = total_cost + -1 * IFNULL(old.cost, 0) WHERE property_id IS
+                    old.property_id AND status IS old.status;
+                DELETE FROM property_stats WHERE property_id IS old.property_id AND status IS old.status AND
+                    issue_count = 0;
+                UPDATE category_stats SET issue_count = issue_count + -1, cost_count = cost_count + -1 * (old.cost
+                    IS NOT NULL), total_cost = total_cost + -1 * IFNULL(old.cost, 0) WHERE category IS old.category;
+                DELETE FROM category_stats WHERE category IS old.category AND issue_count = 0;
+                UPDATE status_stats SET issue_count = issue_count + -1, cost_count = cost_count + -1 * (old.cost IS
+                    NOT NULL), total_cost = total_cost + -1 * IFNULL(old.cost, 0) WHERE status IS old.status;
+                DELETE FROM status_stats WHERE status IS old.status AND issue_count = 0;
+            END
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS maintenance_stats_au AFTER UPDATE OF property_id, category, status, cost ON
+                maintenance_issues BEGIN
+                UPDATE portfolio_stats SET issue_count = issue_count + -1, cost_count = cost_count + -1 * (old.cost
+                    IS NOT NULL), total_cost = total_cost + -1 * IFNULL(old.cost, 0) WHERE id = 1;
+                UPDATE property_stats SET issue_count = issue_count + -1, cost_count = cost_count + -1 * (old.cost
+                    IS NOT NULL), total_cost = total_cost + -1 * IFNULL(old.cost, 0) WHERE property_id IS
+                    old.property_id AND status IS old.status;
+                DELETE FROM property_stats WHERE property_id IS old.property_id AND status IS old.status AND
+                    issue_count = 0;
+                UPDATE category_stats SET issue_count = issue_count + -1, cost_count = cost_count + -1 * (old.cost
+                    IS NOT NULL), total_cost = total_cost + -1 * IFNULL(old.cost, 0) WHERE category IS old.category;
+                DELETE FROM category_stats WHERE category IS old.category AND issue_count = 0;
+                UPDATE status_stats SET issue_count = issue_count + -1, cost_count = cost_count + -1 * (old.cost IS
+                    NOT NULL), total_cost = total_cost + -1 * IFNULL(old.cost, 0) WHERE status IS old.status;
+                DELETE FROM status_stats WHERE status IS old.status AND issue_count = 0;
+                UPDATE portfolio_stats SET issue_count = issue_count + 1, cost_count = cost_count + 1 * (new.cost IS
+                    NOT NULL), total_cost = total_cost + 1 * IFNULL(new.cost, 0) WHERE id = 1;
+                INSERT INTO property_stats (property_id, status) SELECT new.property_id, new.status WHERE NOT EXISTS
+                    (SELECT 1 FROM property_stats WHERE property_id IS new.property_id AND status IS new.status);
+                UPDATE property_stats SET issue_count = issue_count + 1, cost_count = cost_count + 1 * (new.cost IS
+                    NOT NULL), total_cost = total_cost + 1 * IFNULL(new.cost, 0) WHERE property_id IS
+                    new.property_id AND status IS new.status;
+                INSERT INTO category_stats (category) SELECT new.category WHERE NOT EXISTS (SELECT 1 FROM
+                    category_stats WHERE category IS new.category);
+                UPDATE category_stats SET issue_count = issue_count + 1, cost_count = cost_count + 1 * (new.cost IS
+                    NOT NULL), total_cost = total_cost + 1 * IFNULL(new.cost, 0) WHERE category IS new.category;
+                INSERT INTO status_stats (status) SELECT new.status WHERE NOT EXISTS (SELECT 1 FROM status_stats
+                    WHERE status IS new.status);
+                UPDATE status_stats SET issue_count = issue_count + 1, cost_count = cost_count + 1 * (new.cost IS
+                    NOT NULL), total_cost = total_cost + 1 * IFNULL(new.cost, 0) WHERE status IS new.status;
+            END
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS property_stats_ai AFTER INSERT ON properties BEGIN
+                UPDATE portfolio_stats SET property_count = property_count + 1, rent_count = rent_count + 1 *
+                    (new.rent_amount IS NOT NULL), total_rent = total_rent + 1 * IFNULL(new.rent_amount, 0) WHERE id
+                    = 1;
+            END
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS property_stats_ad AFTER DELETE ON properties BEGIN
+                UPDATE portfolio_stats SET property_count = property_count + -1, rent_count = rent_count + -1 *
+                    (old.rent_amount IS NOT NULL), total_rent = total_rent + -1 * IFNULL(old.rent_amount, 0) WHERE
+                    id = 1;
+            END
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS property_stats_au AFTER UPDATE OF rent_amount ON properties BEGIN
+                UPDATE portfolio_stats SET rent_count = rent_count + -1 * (old.rent_amount IS NOT NULL), total_rent
+                    = total_rent + -1 * IFNULL(old.rent_amount, 0) WHERE id = 1;
+                UPDATE portfolio_stats SET rent_count = rent_count + 1 * (new.rent_amount IS NOT NULL), total_rent =
+                    total_rent + 1 * IFNULL(new.rent_amount, 0) WHERE id = 1;
+            END
+        """,
+    ], [
+        "DELETE FROM portfolio_stats",
+        """
+            INSERT INTO portfolio_stats
+            SELECT 1 AS id, COUNT(*) AS property_count, COUNT(rent_amount) AS rent_count,
+                   IFNULL(SUM(rent_amount), 0) AS total_rent,
+                   (SELECT COUNT(*) FROM maintenance_issues) AS issue_count,
+                   (SELECT COUNT(cost) FROM maintenance_issues) AS cost_count,
+                   (SELECT IFNULL(SUM(cost), 0) FROM maintenance_issues) AS total_cost
+            FROM properties
+        """,
+        "DELETE FROM property_stats",
+        """
+            INSERT INTO property_stats
+            SELECT property_id, status, COUNT(*) AS issue_count, COUNT(cost) AS cost_count,
+                   IFNULL(SUM(cost), 0) AS total_cost
+            FROM maintenance_issues
+            GROUP BY property_id, status
+        """,
+        "DELETE FROM category_stats",
+        """
+            INSERT INTO category_stats
+            SELECT category, COUNT(*) AS issue_count, COUNT(cost) AS cost_count,
+                   IFNULL(SUM(cost), 0) AS total_cost
+            FROM maintenance_issues
+            GROUP BY category
+        """,
+        "DELETE FROM status_stats",
+        """
+            INSERT INTO status_stats
+            SELECT status, COUNT(*) AS issue_count, COUNT(cost) AS cost_count,
+                   IFNULL(SUM(cost), 0) AS total_cost
+            FROM maintenance_issues
+            GROUP BY status
+        """,
+    ]),
+    ("vector_pending", [
+        """
+            CREATE TABLE IF NOT EXISTS vector_pending (
+                kind TEXT NOT NULL,
+                source_id INTEGER NOT NULL,
+                PRIMARY KEY (kind, source_id)
+            ) WITHOUT ROWID
+        """,
+        """
+            CREATE TABLE IF NOT EXISTS vector_chunks (
+                row INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                source_id INTEGER NOT NULL,
+                chunk INTEGER NOT NULL
+            )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_vector_chunks_source ON vector_chunks (kind, source_id)",
+        """
+            CREATE TABLE IF NOT EXISTS vector_meta (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                generation INTEGER NOT NULL,
+                dim INTEGER NOT NULL,
+                capacity INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                dead INTEGER NOT NULL,
+                chunks INTEGER NOT NULL
+            )
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS vector_maintenance_issues_ai AFTER INSERT ON maintenance_issues BEGIN
+                INSERT OR IGNORE INTO vector_pending (kind, source_id) VALUES ('maintenance', new.id);
+            END
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS vector_maintenance_issues_au AFTER UPDATE OF category, description, vendor
+                ON maintenance_issues BEGIN
+                INSERT OR IGNORE INTO vector_pending (kind, source_id) VALUES ('maintenance', new.id);
+            END
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS vector_maintenance_issues_ad AFTER DELETE ON maintenance_issues BEGIN
+                INSERT OR IGNORE INTO vector_pending (kind, source_id) VALUES ('maintenance', old.id);
+            END
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS vector_documents_ai AFTER INSERT ON documents BEGIN
+                INSERT OR IGNORE INTO vector_pending (kind, source_id) VALUES ('documents', new.id);
+            END
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS vector_documents_au AFTER UPDATE OF filename, content_summary,
+                extracted_data ON documents BEGIN
+                INSERT OR IGNORE INTO vector_pending (kind, source_id) VALUES ('documents', new.id);
+            END
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS vector_documents_ad AFTER DELETE ON documents BEGIN
+                INSERT OR IGNORE INTO vector_pending (kind, source_id) VALUES ('documents', old.id);
+            END
+        """,
+    ], [
+        "INSERT OR IGNORE INTO vector_pending (kind, source_id) SELECT 'maintenance', id FROM maintenance_issues",
+        "INSERT OR IGNORE INTO vector_pending (kind, source_id) SELECT 'documents', id FROM documents",
+    ]),
+]
+
+# Ingest jobs and the change log
+QUEUES = [
+    """
+        CREATE TABLE IF NOT EXISTS ingest_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            error TEXT,
+            created_at TEXT,
+            updated_at TEXT,
+            available_at TEXT
+        )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_ingest_jobs_queue ON ingest_jobs (status, available_at)",
+    "CREATE INDEX IF NOT EXISTS idx_ingest_jobs_document ON ingest_jobs (document_id)",
+    """
+        CREATE TABLE IF NOT EXISTS change_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            at TEXT NOT NULL,
+            entity TEXT NOT NULL,
+            entity_id TEXT,
+            property_id TEXT,
+            action TEXT NOT NULL
+        )
+    """,
+]
+
+USERS = [
+    """
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            username TEXT UNIQUE,
+            password TEXT,
+            role TEXT,
+            property_id TEXT
+        )
+    """,
+]
+
+CATALOG_TABLES = [
+    """
+        CREATE TABLE IF NOT EXISTS portfolios (
+            id TEXT PRIMARY KEY,
+            number INTEGER NOT NULL UNIQUE,
+            path TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'active',
+            created_at TEXT
+        )
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS placements (
+            property_id TEXT PRIMARY KEY,
+            portfolio_id TEXT NOT NULL
+        )
+    """,
+]
+
+
+
+def _columns(cursor, table):
+    return {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+
+
+def create(cursor):
+    """Step 1 of a portfolio's database."""
+    for statement in TABLES:
+        cursor.execute(statement)
+    for table, column, declaration in ADDED_COLUMNS:
+        if column not in _columns(cursor, table):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+    for statement in INDEXES:
+        cursor.execute(statement)
+    for name in DROPPED_INDEXES:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+    for table, statements, fill in DERIVED:
+        exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+        for statement in statements:
+            cursor.execute(statement)
+        if not exists:
+            for statement in fill:
+                cursor.execute(statement)
+    for statement in QUEUES + USERS:
+        cursor.execute(statement)
+
+
+def create_catalog(cursor, default_path, users):
+    """Step 1 of the catalog: the default portfolio at ``default_path``, and ``users`` copied the first time."""
+    for statement in USERS + CATALOG_TABLES:
+        cursor.execute(statement)
+    cursor.execute("""
+        INSERT OR IGNORE INTO portfolios (id, number, path, state, created_at) VALUES ('default', 0, ?, 'active', ?)
+    """, (default_path, datetime.now().isoformat()))
+    if cursor.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+        cursor.executemany("INSERT INTO users VALUES (?, ?, ?, ?, ?)", users)
@@ -0,0 +1,171 @@
+"""Full-text search over maintenance issues and documents using SQLite FTS5.
+
+Both indexes are external-content tables: the text lives only in the source
+tables and triggers keep the index in step on insert, update and delete.
+Existing databases are indexed once when the tables are first created, and
+can be rebuilt online with:
+
+    python search.py rebuild
+"""
+import re
+import sys
+
+# (fts table, source table, indexed columns)
+INDEXES = [
+    ("maintenance_fts", "maintenance_issues", ("description", "category", "vendor")),
+    ("documents_fts", "documents", ("filename", "content_summary", "extracted_data")),
+]
+
+STOPWORDS = {
+    "a", "all", "an", "and", "any", "are", "at", "for", "find", "from", "give", "in", "is", "list",
+    "me", "of", "on", "or", "show", "the", "to", "was", "were", "what", "which", "with",
+}
+TERM = re.compile(r"\w+", re.UNICODE)
+
+SNIPPET_TOKENS = 12
+
+
+def rebuild(conn):
+    """Rebuild and merge both indexes. Readers keep working in WAL mode while this runs."""
+    for fts, _, _ in INDEXES:
+        with conn:
+            conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+        with conn:
+            conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('optimize')")
+
+
+def to_match_query(text):
+    """Turn free text into an FTS5 query: quoted terms OR-ed together, ranked by BM25."""
+    terms = [t for t in TERM.findall(text.lower()) if t not in STOPWORDS]
+    if not terms:
+        terms = TERM.findall(text.lower())
+    return " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+
+
+def _maintenance_select(property_id, category, date_from, date_to):
+    clauses, params = ["maintenance_fts MATCH ?"], []
+    if property_id:
+        clauses.append("m.property_id = ?")
+        params.append(property_id)
+    if category:
+        clauses.append("m.category = ?")
+        params.append(category)
+    if date_from:
+        clauses.append("m.date >= ?")
+        params.append(date_from)
+    if date_to:
+        clauses.append("m.date <= ?")
+        params.append(date_to)
+    sql = f"""
+        SELECT 'maintenance' AS kind, m.id, m.property_id, m.category AS title, m.date,
+               bm25(maintenance_fts) AS score
+        FROM maintenance_fts
+        JOIN maintenance_issues m ON m.id = maintenance_fts.rowid
+        WHERE {" AND ".join(clauses)}
+    """
+    return sql, params
+
+
+def _documents_select(property_id, category, date_from, date_to):
+    clauses, params = ["documents_fts MATCH ?"], []
+    if property_id:
+        clauses.append("d.property_id = ?")
+        params.append(property_id)
+    if category:
+        clauses.append("d.type = ?")
+        params.append(category)
+    if date_from:
+        clauses.append("d.upload_date >= ?")
+        params.append(date_from)
+    if date_to:
+        # upload_date is a full timestamp, so include the whole end day
+        clauses.append("d.upload_date < date(?, '+1 day')")
+        params.append(date_to)
+    sql = f"""
+        SELECT 'documents' AS kind, d.id, d.property_id, d.filename AS title, d.upload_date AS date,
+               bm25(documents_fts) AS score
+        FROM documents_fts
+        JOIN documents d ON d.id = documents_fts.rowid
+        WHERE {" AND ".join(clauses)}
+    """
+    return sql, params
+
+
+SOURCES = {
+    "maintenance": ("maintenance_fts", _maintenance_select),
+    "documents": ("documents_fts", _documents_select),
+}
+
+
+def _add_snippets(conn, match, results):
+    # Snippets are only built for the page being returned, not every match
+    for kind, (fts, _) in SOURCES.items():
+        ids = [r["id"] for r in results if r["kind"] == kind]
+        if not ids:
+            continue
+        snippets = dict(conn.execute(f"""
+            SELECT rowid, snippet({fts}, -1, '<mark>', '</mark>', '…', {SNIPPET_TOKENS})
+            FROM {fts}
+            WHERE {fts} MATCH ? AND rowid IN ({", ".join("?" * len(ids))})
+        """, (match, *ids)).fetchall())
+        for result in results:
+            if result["kind"] == kind:
+                result["snippet"] = snippets.get(result["id"])
+
+
+def search(conn, text, kind="all", property_id=None, category=None, date_from=None, date_to=None,
+           limit=20, offset=0):
+    match = to_match_query(text)
+    if not match:
+        return {"query": text, "results": [], "limit": limit, "offset": offset, "has_more": False}
+
+    kinds = list(SOURCES) if kind == "all" else [kind]
+    parts, params = [], []
+    for name in kinds:
+        sql, extra = SOURCES[name][1](property_id, category, date_from, date_to)
+        parts.append(sql)
+        params.extend([match, *extra])
+
+    # Fetch one extra row to know whether another page exists without a COUNT
+    rows = conn.execute(f"""
+        {" UNION ALL ".join(parts)}
+        ORDER BY score
+        LIMIT ? OFFSET ?
+    """, (*params, limit + 1, offset)).fetchall()
+    results = [dict(row) for row in rows[:limit]]
+    _add_snippets(conn, match, results)
+    return {
+        "query": text,
+        "results": results,
+        "limit": limit,
+        "offset": offset,
+        "has_more": len(rows) > limit,
+    }
+
+
+def merge(parts, limit, offset):
+    """One page from ``search`` results that several databases returned for ``limit + offset`` rows.
+
+    bm25 weighs terms by each database's own statistics, so ranks across
+    shards are close but not identical to one combined index.
+    """
+    if len(parts) == 1:
+        return parts[0]
+    results = sorted((r for part in parts for r in part["results"]), key=lambda r: r["score"])
+    return {
+        "query": parts[0]["query"],
+        "results": results[offset:offset + limit],
+        "limit": limit,
+        "offset": offset,
+        "has_more": len(results) > offset + limit or any(part["has_more"] for part in parts),
+    }
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python search.py rebuild")
+    import main
+    main.init_db()
+    with main.get_db() as conn:
+        rebuild(conn)
+    print("Search indexes rebuilt")
@@ -0,0 +1,74 @@
+"""Demo data: three properties, their maintenance history and a login for each role.
+
+    python seed.py
+
+Migrates the databases first, then fills the users and properties tables
+only if they are empty, so it is safe to run again. The API never seeds;
+deployments run this once when they build.
+"""
+from datetime import datetime
+
+USERS = [
+    ("user_owner", "Ishaan", "Ishaan123", "owner", None),
+    ("user_tenant_1", "Chintu", "Chintu123", "tenant", "mumbai_galaxy"),
+    ("user_tenant_2", "suresh", "tenant123", "tenant", "bangalore_tech"),
+]
+
+PROPERTIES = [
+    ("mumbai_galaxy", "101, Galaxy Heights, Bandra West, Mumbai", "Residential", "Chintu", "11-Month Agreement", 85000, "2024-01-01", "2024-12-31", "Ishaan Chawla", "ABCPV1234A"),
+    ("bangalore_tech", "Unit 402, Tech Park View, Koramangala, Bangalore", "Commercial", "Innovate Solutions Pvt Ltd", "Triple Net", 150000, "2023-04-01", "2026-03-31", "Ishaan Chawla", "XYZPM5678B"),
+    ("delhi_villa", "Villa 12, Green Park, South Delhi", "Residential", "Mehta Family", "Standard Lease", 120000, "2024-06-01", "2025-05-31", "Ishaan Chawla", "PQRSJ9012C"),
+]
+
+ISSUES = [
+    ("mumbai_galaxy", "plumbing", "Monsoon leakage in master bedroom wall", "2024-07-15", "Resolved", 4500, "QuickFix Utilities"),
+    ("bangalore_tech", "electrical", "UPS Battery replacement for server room", "2024-02-20", "Resolved", 12000, "PowerSafe Ltd"),
+    ("mumbai_galaxy", "electrical", "Geyser switch burnout", "2024-08-10", "Resolved", 850, "Local Electrician"),
+    ("delhi_villa", "gardening", "Seasonal lawn maintenance and pruning", "2024-09-05", "In Progress", 2500, "Green Thumbs"),
+    ("mumbai_galaxy", "painting", "Living room touch-up paint", "2024-01-10", "Resolved", 15000, "Asian Paints Service"),
+]
+
+
+def seed_users(conn):
+    if conn.execute("SELECT count(*) FROM users").fetchone()[0]:
+        return 0
+    conn.executemany("INSERT INTO users VALUES (?, ?, ?, ?, ?)", USERS)
+    return len(USERS)
+
+
+def seed_properties(conn):
+    if conn.execute("SELECT count(*) FROM properties").fetchone()[0]:
+        return 0
+    now = datetime.now().isoformat()
+    conn.executemany("""
+        INSERT INTO properties (id, address, type, tenant_name, lease_type, rent_amount, lease_start_date, lease_end_date, landlord_name, pan_number, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [(*prop, now) for prop in PROPERTIES])
+    conn.executemany("""
+        INSERT INTO maintenance_issues (property_id, category, description, date, status, cost, vendor, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [(*issue, now) for issue in ISSUES])
+    return len(PROPERTIES)
+
+
+def seed(main):
+    """Seed the databases of the ``main`` module; returns (users, properties) added."""
+    main.init_db()
+    # Users go to the catalog, properties to the default portfolio, which are one database unless sharded
+    with main.catalog.connection() as conn:
+        users = seed_users(conn)
+        conn.commit()
+    with main.get_db() as conn:
+        properties = seed_properties(conn)
+        conn.commit()
+    return users, properties
+
+
+if __name__ == "__main__":
+    import main
+
+    users, properties = seed(main)
+    print(f"Seeded {users} users and {properties} properties in {main.DATA_DIR}")
+    main.db.close()
+    if main.catalog is not main.db:
+        main.catalog.close()
@@ -0,0 +1,629 @@
+"""Optional per-portfolio sharding: one SQLite file per owner portfolio.
+
+With DB_SHARDING=1, a small catalog database (catalog.db in DATA_DIR) holds
+users, the portfolios and which portfolio each property belongs to. Each
+portfolio's properties, maintenance, documents and everything derived from
+them live in that portfolio's own database file. Every file has its own
+write lock and writer, so one portfolio's imports and writes never queue
+behind another's, and owner-wide reads run against all of them
+concurrently.
+
+The existing real_estate.db becomes the "default" portfolio: switching
+sharding on copies its users into the catalog and leaves its data in place.
+Properties the catalog doesn't place belong to the default portfolio.
+
+Every portfolio has a number, and its AUTOINCREMENT ids start at
+``number << ID_BITS``. Ids therefore stay unique across files, and a
+maintenance issue, document or ingest job id names the portfolio that
+created it. Rows only ever move to higher-numbered portfolios (see
+``split``), so a row missing from its home is looked for there.
+
+Without DB_SHARDING, the one database is both the catalog and the only
+shard, and routing always lands on it.
+
+    python shards.py list
+    python shards.py split <portfolio> <new_portfolio> <property_id>...
+    python shards.py move <portfolio> <directory>
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import socket
+import sqlite3
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+import changes
+from db import BUSY_TIMEOUT_MS
+
+SHARDING_ENABLED = os.getenv("DB_SHARDING", "0") == "1"
+SHARD_POOL_SIZE = int(os.getenv("DB_SHARD_POOL_SIZE", 4))
+DEFAULT_PORTFOLIO = "default"
+ID_BITS = 40
+# Keeps every id below 2**53, the largest integer a JavaScript client reads exactly
+MAX_PORTFOLIOS = 1 << (53 - ID_BITS)
+ID_TABLES = ("maintenance_issues", "documents", "ingest_jobs", "change_log")
+# How long split and move wait, after refusing new writes, for writes already routed to finish
+DRAIN_SECONDS = float(os.getenv("SHARD_DRAIN_SECONDS", 2.0))
+# How often API processes check the catalog for split and move, and report which files they have open
+HANDLE_SECONDS = float(os.getenv("SHARD_HANDLE_SECONDS", 1.0))
+# A report this old belongs to a process that died
+HANDLE_TIMEOUT_SECONDS = 30.0
+# How long split and move wait for every API process to pause or reopen before giving up
+ACK_TIMEOUT_SECONDS = float(os.getenv("SHARD_ACK_SECONDS", 60.0))
+# Per-process reports, in the shard directory
+HANDLES = "handles"
+PROCESS_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+PORTFOLIO_NAME = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+COPY_BATCH = 5000
+
+logger = logging.getLogger("shards")
+
+
+class ShardUnavailable(Exception):
+    """The portfolio is being split or moved and refuses writes for now."""
+
+
+class UnknownPortfolio(LookupError):
+    pass
+
+
+def reserve_ids(conn, number):
+    """Start the AUTOINCREMENT tables at this portfolio's id range; tables must exist."""
+    base = number << ID_BITS
+    for table in ID_TABLES:
+        conn.execute("""
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+        """, (table, base, table))
+        conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ? AND seq < ?", (base, table, base))
+
+
+def home_number(row_id):
+    return row_id >> ID_BITS
+
+
+class Shard:
+    """One portfolio's database and the per-database state the API keeps for it."""
+
+    def __init__(self, name, number, path, db, vector_index=None, rent_roll=None, change_feed=None,
+                 ingest_worker=None, maintenance_columns=None, entities=None):
+        self.name = name
+        self.number = number
+        self.path = path
+        self.db = db
+        self.vector_index = vector_index
+        self.rent_roll = rent_roll
+        self.change_feed = change_feed
+        self.ingest_worker = ingest_worker
+        self.maintenance_columns = maintenance_columns
+        self.entities = entities
+        # Background writers stopped while the portfolio is split or moved
+        self.paused = False
+
+    async def pause(self):
+        """Stop the background writers; once this returns only API requests write here."""
+        if self.ingest_worker is not None:
+            await self.ingest_worker.pause()
+        if self.vector_index is not None:
+            await self.vector_index.stop()
+        if self.change_feed is not None:
+            await self.change_feed.pause()
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+        if self.change_feed is not None:
+            self.change_feed.resume()
+
+    async def close(self):
+        if self.ingest_worker is not None:
+            await self.ingest_worker.stop()
+        if self.change_feed is not None:
+            await self.change_feed.stop()
+        if self.vector_index is not None:
+            await self.vector_index.stop()
+        self.db.close()
+
+
+class Shards:
+    """Resolves the shard that serves a property, a portfolio or a row.
+
+    ``open_shard(name, number, path)`` is awaited to open a portfolio's
+    database the first time it is needed. Catalog rows are cached, and the
+    cache is dropped whenever ``PRAGMA data_version`` shows that another
+    connection, such as the split and move tools, changed the catalog;
+    ``on_change()`` is then called so callers can drop what they cached too.
+
+    Once started, ``start_shard(shard)`` starts a shard's background workers
+    whenever its portfolio is active. With sharding, a watcher pauses them
+    while the portfolio is 'moving', reopens a moved portfolio at its new
+    path, and reports what this process has open to a file in
+    ``directory``/handles, which split and move wait on.
+    """
+
+    def __init__(self, catalog, default, open_shard=None, directory=None, enabled=SHARDING_ENABLED,
+                 on_change=None):
+        self.catalog = catalog
+        self.default = default
+        self.open_shard = open_shard
+        self.directory = directory
+        self.enabled = enabled
+        self.on_change = on_change
+        self._open = {default.name: default}
+        self._opening = {}
+        self._portfolios = None
+        self._placements = {}
+        self._moved = OrderedDict()
+        self._version = None
+        self._version_conn = None
+        self.start_shard = None
+        self._watcher = None
+        self._reported = None
+        self._reported_at = 0.0
+
+    def _fresh(self):
+        # data_version only changes for commits made by other connections,
+        # so one long-lived connection sees every catalog change but its own
+        if self._version_conn is None:
+            self._version_conn = sqlite3.connect(self.catalog.path, check_same_thread=False)
+        version = self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._version:
+            changed = self._version is not None
+            self._version = version
+            self._portfolios = None
+            self._placements.clear()
+            if changed and self.on_change is not None:
+                self.on_change()
+
+    def refresh(self):
+        """Notice catalog changes made by other processes; for reads served from a cache."""
+        if self.enabled:
+            self._fresh()
+
+    async def portfolios(self):
+        """``{name: (number, path, state)}`` for every portfolio."""
+        if not self.enabled:
+            return {self.default.name: (0, self.default.path, "active")}
+        self._fresh()
+        if self._portfolios is None:
+            rows = await self.catalog.fetchall("SELECT id, number, path, state FROM portfolios ORDER BY number")
+            self._portfolios = {row[0]: (row[1], row[2], row[3]) for row in rows}
+        return self._portfolios
+
+    async def for_portfolio(self, name=None, write=False, create=False):
+        name = name or DEFAULT_PORTFOLIO
+        portfolios = await self.portfolios()
+        if name not in portfolios:
+            if not create:
+                raise UnknownPortfolio(name)
+            await self.create_portfolio(name)
+            portfolios = await self.portfolios()
+        number, path, state = portfolios[name]
+        if write and state != "active":
+            raise ShardUnavailable(name)
+        shard = self._open.get(name)
+        if shard is not None and shard.path == path:
+            return shard
+        return await self._open_portfolio(name, number, path, state)
+
+    async def _open_portfolio(self, name, number, path, state):
+        # Concurrent first requests for a portfolio wait for one open
+        task = self._opening.get(name)
+        if task is None:
+            task = self._opening[name] = asyncio.ensure_future(self._opened(name, number, path, state))
+            task.add_done_callback(lambda _: self._opening.pop(name, None))
+        shard = await asyncio.shield(task)
+        previous = self._open.get(name)
+        self._open[name] = shard
+        if previous is not None and previous is not shard:
+            # Moved to a new file; in-flight work on the old one finishes on its connections
+            await previous.close()
+        return shard
+
+    async def _opened(self, name, number, path, state):
+        shard = await self.open_shard(name, number, path)
+        if self.start_shard is not None:
+            await self._start(shard, state)
+        return shard
+
+    async def _start(self, shard, state):
+        if state == "active":
+            shard.resume()
+            await self.start_shard(shard)
+        else:
+            await shard.pause()
+
+    async def start(self, start_shard):
+        self.start_shard = start_shard
+        portfolios = await self.portfolios()
+        for name, shard in list(self._open.items()):
+            await self._start(shard, portfolios.get(name, (0, shard.path, "active"))[2])
+        if self.enabled:
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def _watch(self):
+        while True:
+            try:
+                await self._follow()
+            except Exception:
+                # Reports stop while this fails, so split and move time out instead of copying under a writer
+                logger.exception("following the shard catalog failed")
+            await asyncio.sleep(HANDLE_SECONDS)
+
+    async def _follow(self):
+        portfolios = await self.portfolios()
+        for name, shard in list(self._open.items()):
+            if name not in portfolios:
+                continue
+            number, path, state = portfolios[name]
+            if shard.path != path:
+                await self._open_portfolio(name, number, path, state)
+            elif state != "active" and not shard.paused:
+                await shard.pause()
+            elif state == "active" and shard.paused:
+                shard.resume()
+                await self.start_shard(shard)
+        await asyncio.to_thread(self._report)
+
+    def _report(self):
+        handles = {name: {"path": shard.path, "paused": shard.paused} for name, shard in self._open.items()}
+        # Rewritten when something changed, and often enough to stay live while nothing does
+        if handles == self._reported and time.time() - self._reported_at < HANDLE_TIMEOUT_SECONDS / 3:
+            return
+        directory = os.path.join(self.directory, HANDLES)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{PROCESS_ID}.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(handles, f)
+        os.replace(f"{path}.tmp", path)
+        self._reported, self._reported_at = handles, time.time()
+
+    async def for_property(self, property_id, write=False):
+        if not self.enabled:
+            return self.default
+        self._fresh()
+        portfolio = self._placements.get(property_id)
+        if portfolio is None:
+            row = await self.catalog.fetchone("SELECT portfolio_id FROM placements WHERE property_id = ?",
+                                              (property_id,))
+            portfolio = row[0] if row else DEFAULT_PORTFOLIO
+            if len(self._placements) < 100_000:
+                self._placements[property_id] = portfolio
+        return await self.for_portfolio(portfolio, write)
+
+    async def for_row(self, table, row_id, write=False):
+        """The shard holding ``table`` row ``row_id``; the default one if none does."""
+        if not self.enabled:
+            return self.default
+        portfolios = await self.portfolios()
+        by_number = sorted((number, name) for name, (number, _, _) in portfolios.items())
+        home = home_number(row_id)
+        moved = self._moved.get((table, row_id))
+        candidates = [moved] if moved in portfolios else []
+        # A row is created in its home portfolio and can only move to higher-numbered ones
+        candidates += [name for number, name in by_number if number == home]
+        candidates += [name for number, name in by_number if number > home]
+        for name in candidates:
+            shard = await self.for_portfolio(name)
+            if await shard.db.fetchone(f"SELECT 1 FROM {table} WHERE id = ?", (row_id,)):
+                if portfolios[name][0] != home:
+                    self._moved[(table, row_id)] = name
+                    if len(self._moved) > 10_000:
+                        self._moved.popitem(last=False)
+                return await self.for_portfolio(name, write) if write else shard
+        return await self.for_portfolio(DEFAULT_PORTFOLIO, write)
+
+    async def all(self):
+        if not self.enabled:
+            return [self.default]
+        return [await self.for_portfolio(name) for name in await self.portfolios()]
+
+    async def scope(self, property_id=None):
+        """The shards a read filtered on ``property_id`` (or not filtered) has to visit."""
+        if property_id is not None:
+            return [await self.for_property(property_id)]
+        return await self.all()
+
+    async def gather(self, fn, shards):
+        """``fn(shard)`` awaited for every shard at once, results in the same order."""
+        if len(shards) == 1:
+            return [await fn(shards[0])]
+        return await asyncio.gather(*(fn(shard) for shard in shards))
+
+    async def place(self, property_ids, portfolio):
+        if not self.enabled or not property_ids:
+            return
+        await self.catalog.write(_place, list(property_ids), portfolio)
+        for property_id in property_ids:
+            self._placements[property_id] = portfolio
+
+    async def place_all(self, shard):
+        """Place every property ``shard`` holds that the catalog doesn't know, e.g. after an import."""
+        if not self.enabled or shard.name == DEFAULT_PORTFOLIO:
+            return
+        rows = await shard.db.fetchall("SELECT id FROM properties")
+        await self.catalog.write(_place_missing, [row[0] for row in rows], shard.name)
+
+    async def create_portfolio(self, name):
+        if not PORTFOLIO_NAME.match(name):
+            raise ValueError("Portfolio names are lowercase letters, digits, '-' and '_'")
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{name}.db")
+        await self.catalog.write(_register, name, path)
+
+    def opened(self):
+        return list(self._open.values())
+
+    def stats(self):
+        return {"open": len(self._open), "placements_cached": len(self._placements)}
+
+    async def close(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+            _remove_file(os.path.join(self.directory, HANDLES, f"{PROCESS_ID}.json"))
+        for shard in self._open.values():
+            if shard is not self.default:
+                await shard.close()
+        if self.catalog is not self.default.db:
+            self.catalog.close()
+        if self._version_conn is not None:
+            self._version_conn.close()
+
+
+def _place(conn, property_ids, portfolio):
+    conn.executemany(
+        "INSERT INTO placements (property_id, portfolio_id) VALUES (?, ?) "
+        "ON CONFLICT (property_id) DO UPDATE SET portfolio_id = excluded.portfolio_id",
+        [(property_id, portfolio) for property_id in property_ids],
+    )
+
+
+def _place_missing(conn, property_ids, portfolio):
+    conn.executemany("INSERT OR IGNORE INTO placements (property_id, portfolio_id) VALUES (?, ?)",
+                     [(property_id, portfolio) for property_id in property_ids])
+
+
+def _register(conn, name, path):
+    if conn.execute("SELECT 1 FROM portfolios WHERE id = ?", (name,)).fetchone():
+        return
+    number = conn.execute("SELECT IFNULL(MAX(number), -1) + 1 FROM portfolios").fetchone()[0]
+    if number >= MAX_PORTFOLIOS:
+        raise ValueError(f"At most {MAX_PORTFOLIOS} portfolios")
+    conn.execute("INSERT INTO portfolios (id, number, path, state, created_at) VALUES (?, ?, ?, 'active', ?)",
+                 (name, number, path, datetime.now().isoformat()))
+
+
+# Split and move. They run from the command line, possibly while the API is
+# serving: the portfolio is marked 'moving' so API processes refuse writes
+# to it (503) and pause its background writers. DRAIN_SECONDS later, once
+# every API process has reported them paused, the copy starts under the
+# source's write lock. Every step can be re-run after a crash.
+
+# Rows that belong to a property, as (table, WHERE clause over the property ids)
+PROPERTY_ROWS = [
+    ("properties", "id IN ({})"),
+    ("maintenance_issues", "property_id IN ({})"),
+    ("documents", "property_id IN ({})"),
+    ("ingest_jobs", "document_id IN (SELECT id FROM documents WHERE property_id IN ({}))"),
+]
+
+
+def _set_state(catalog, name, state):
+    with catalog:
+        catalog.execute("UPDATE portfolios SET state = ? WHERE id = ?", (state, name))
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, isolation_level=None, timeout=BUSY_TIMEOUT_MS / 1000)
+    conn.execute("PRAGMA journal_mode = WAL")
+    return conn
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _live_handles(directory):
+    """``{process: {portfolio: {"path": ..., "paused": ...}}}`` as reported by API processes still running."""
+    live = {}
+    cutoff = time.time() - HANDLE_TIMEOUT_SECONDS
+    entries = os.scandir(directory) if os.path.isdir(directory) else ()
+    for entry in entries:
+        if not entry.name.endswith(".json"):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                continue
+            with open(entry.path) as f:
+                live[entry.name[:-len(".json")]] = json.load(f)
+        except FileNotFoundError:
+            # The process shut down
+            continue
+    return live
+
+
+def _await_handles(directory, done, what):
+    """Wait until ``done(handles)`` holds for every running API process; TimeoutError after ACK_TIMEOUT_SECONDS."""
+    deadline = time.monotonic() + ACK_TIMEOUT_SECONDS
+    while True:
+        waiting = [process for process, handles in _live_handles(directory).items() if not done(handles)]
+        if not waiting:
+            return
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"API processes did not {what}: {', '.join(waiting)}")
+        time.sleep(HANDLE_SECONDS / 4)
+
+
+def _paused(name):
+    return lambda handles: handles.get(name, {"paused": True})["paused"]
+
+
+def _portfolio_rows(catalog):
+    return {row[0]: (row[1], row[2]) for row in catalog.execute("SELECT id, number, path FROM portfolios")}
+
+
+def split(catalog, open_schema, source, target, property_ids, handles):
+    """Move ``property_ids`` with their maintenance, documents and jobs from ``source`` to ``target``.
+
+    ``target`` is created if needed and must be numbered above ``source``.
+    Copied rows keep their ids, and search, aggregate and vector triggers
+    maintain both databases as rows arrive and leave. ``handles`` is the
+    directory API processes report to. Returns rows moved per table.
+    """
+    portfolios = _portfolio_rows(catalog)
+    if source not in portfolios:
+        raise UnknownPortfolio(source)
+    if target not in portfolios:
+        if not PORTFOLIO_NAME.match(target):
+            raise ValueError(f"invalid portfolio name: {target}")
+        with catalog:
+            _register(catalog, target, os.path.join(os.path.dirname(portfolios[source][1]), f"{target}.db"))
+        portfolios = _portfolio_rows(catalog)
+    if portfolios[target][0] <= portfolios[source][0]:
+        # Moved ids would pass the target's own counter and collide with rows it creates later
+        raise ValueError(f"{target} must be a newer portfolio than {source}")
+    marks = ", ".join("?" * len(property_ids))
+    _set_state(catalog, source, "moving")
+    try:
+        time.sleep(DRAIN_SECONDS)
+        # Paused workers hand back the jobs they were extracting, so no result lands after the copy
+        _await_handles(handles, _paused(source), f"pause {source}")
+        src, dst = _connect(portfolios[source][1]), _connect(portfolios[target][1])
+        try:
+            open_schema(dst, portfolios[target][0])
+            # The source's write lock is held until its rows are gone, so nothing slips in behind the copy
+            src.execute("BEGIN IMMEDIATE")
+            dst.execute("BEGIN IMMEDIATE")
+            # Leftovers of an interrupted run go first; deletes keep the triggers' tables right
+            for table, where in reversed(PROPERTY_ROWS):
+                dst.execute(f"DELETE FROM {table} WHERE {where.format(marks)}", property_ids)
+            moved = {}
+            for table, where in PROPERTY_ROWS:
+                wanted = set(_columns(dst, table))
+                columns = ", ".join(c for c in _columns(src, table) if c in wanted)
+                rows = src.execute(f"SELECT {columns} FROM {table} WHERE {where.format(marks)}", property_ids)
+                moved[table] = 0
+                while batch := rows.fetchmany(COPY_BATCH):
+                    dst.executemany(f"INSERT INTO {table} ({columns}) VALUES ({', '.join('?' * len(batch[0]))})",
+                                    batch)
+                    moved[table] += len(batch)
+            # Still 'running' only if its process died; the target's workers run it again
+            dst.execute(f"UPDATE ingest_jobs SET status = 'queued' WHERE status = 'running' AND "
+                        f"{dict(PROPERTY_ROWS)['ingest_jobs'].format(marks)}", property_ids)
+            for property_id in property_ids:
+                changes.record(dst, "properties", "moved", property_id, property_id)
+            dst.execute("COMMIT")
+            with catalog:
+                _place(catalog, property_ids, target)
+            # Children first: the ingest job clause reads documents
+            for table, where in reversed(PROPERTY_ROWS):
+                src.execute(f"DELETE FROM {table} WHERE {where.format(marks)}", property_ids)
+            for property_id in property_ids:
+                changes.record(src, "properties", "moved", property_id, property_id)
+            src.execute("COMMIT")
+        finally:
+            src.close()
+            dst.close()
+    finally:
+        _set_state(catalog, source, "active")
+    return moved
+
+
+def move(catalog, name, directory, handles):
+    """Copy portfolio ``name`` to ``directory``, point the catalog at the copy and remove the original.
+
+    The original is removed only once every API process reporting to
+    ``handles`` has reopened the portfolio at its new path.
+    """
+    row = catalog.execute("SELECT path FROM portfolios WHERE id = ?", (name,)).fetchone()
+    if row is None:
+        raise UnknownPortfolio(name)
+    if name == DEFAULT_PORTFOLIO:
+        raise ValueError("The default portfolio is the database at DB_PATH; set DB_PATH to move it")
+    old = row[0]
+    new = os.path.join(os.path.abspath(directory), os.path.basename(old))
+    if os.path.abspath(old) == new:
+        return new
+    os.makedirs(directory, exist_ok=True)
+    _set_state(catalog, name, "moving")
+    guard = None
+    try:
+        time.sleep(DRAIN_SECONDS)
+        _await_handles(handles, _paused(name), f"pause {name}")
+        # Held until every process has left the old file: a write that slipped past 'moving' fails instead of being lost
+        guard = _connect(old)
+        guard.execute("BEGIN IMMEDIATE")
+        src = sqlite3.connect(old, timeout=BUSY_TIMEOUT_MS / 1000)
+        dst = sqlite3.connect(new)
+        try:
+            src.backup(dst)
+            if dst.execute("PRAGMA quick_check").fetchone()[0] != "ok":
+                raise RuntimeError(f"copy of {name} failed its integrity check")
+            dst.execute("PRAGMA journal_mode = WAL")
+        finally:
+            src.close()
+            dst.close()
+        with catalog:
+            catalog.execute("UPDATE portfolios SET path = ? WHERE id = ?", (new, name))
+    except BaseException:
+        if guard is not None:
+            guard.close()
+        raise
+    finally:
+        _set_state(catalog, name, "active")
+    try:
+        # On a timeout the original stays, for whoever still has it open
+        _await_handles(handles, lambda open_: open_.get(name, {}).get("path") != old, f"reopen {name} at {new}")
+    finally:
+        guard.close()
+    for suffix in ("", "-wal", "-shm"):
+        _remove_file(old + suffix)
+    return new
+
+
+def describe(catalog):
+    rows = catalog.execute("""
+        SELECT p.id, p.number, p.path, p.state, COUNT(pl.property_id)
+        FROM portfolios p LEFT JOIN placements pl ON pl.portfolio_id = p.id
+        GROUP BY p.id ORDER BY p.number
+    """).fetchall()
+    return [
+        {"portfolio": name, "number": number, "path": path, "state": state, "placed_properties": placed,
+         "bytes": os.path.getsize(path) if os.path.exists(path) else 0}
+        for name, number, path, state, placed in rows
+    ]
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not (args == ["list"] or (args[:1] == ["split"] and len(args) >= 4) or (args[:1] == ["move"] and len(args) == 3)):
+        sys.exit("usage: python shards.py list | split <portfolio> <new_portfolio> <property_id>... "
+                 "| move <portfolio> <directory>")
+    os.environ["DB_SHARDING"] = "1"
+    import main
+    main.init_db()
+    handles = os.path.join(main.SHARD_DIR, HANDLES)
+    catalog = sqlite3.connect(main.CATALOG_PATH, isolation_level=None, timeout=BUSY_TIMEOUT_MS / 1000)
+    if args[0] == "list":
+        for entry in describe(catalog):
+            print(entry)
+    elif args[0] == "split":
+        moved = split(catalog, main.open_portfolio_schema, args[1], args[2], args[3:], handles)
+        print(f"Moved to {args[2]}: " + ", ".join(f"{count} {table}" for table, count in moved.items()))
+    else:
+        print(f"{args[1]} is now at {move(catalog, args[1], args[2], handles)}")
@@ -0,0 +1,104 @@
+"""JSON response bodies rendered by SQLite, skipping a Python dict per row.
+
+The list endpoints otherwise turn every row into a dict and the dicts into
+JSON with json.dumps. Here the query renders each row with json_object(),
+and an unpaged list's whole array with json_group_array(), so the body
+comes back as one string.
+
+json_object() writes text, integers and NULL exactly as the JSON responses
+always have (compact, non-ASCII kept). REALs differ: SQLite prints them
+with 15 significant digits and uses an exponent outside [1e-4, 1e15),
+where Python prints the shortest digits that read back as the same
+double. Each query therefore also counts the REALs it would print
+differently, and when there are any the caller uses the Python path, so
+the body is the same either way. Money amounts with a couple of decimals
+never trigger it, and columns declared TEXT are not checked at all.
+"""
+import json
+import os
+
+SQL_JSON_ENABLED = os.getenv("SQL_JSON", "1") != "0"
+
+
+def _identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _inexact(column):
+    # 1 when json_object would print this REAL other than json.dumps does
+    return (f"(typeof({column}) = 'real' AND NOT (abs({column}) < 1e15 AND (abs({column}) >= 1e-4 OR {column} = 0)"
+            f" AND CAST(printf('%!.15g', {column}) AS REAL) = {column}))")
+
+
+# (database file, schema_version) -> names of columns that never hold a REAL
+_TEXT_COLUMNS = {}
+
+
+def _text_columns(conn):
+    """Columns declared with TEXT affinity in every ordinary table that has one by that name."""
+    key = (conn.execute("PRAGMA database_list").fetchone()[2], conn.execute("PRAGMA schema_version").fetchone()[0])
+    names = _TEXT_COLUMNS.get(key)
+    if names is None:
+        affinities = {}
+        tables = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND sql NOT LIKE 'CREATE VIRTUAL%'")
+        for (table,) in tables.fetchall():
+            for column in conn.execute(f"PRAGMA table_info({_identifier(table)})").fetchall():
+                declared = (column[2] or "").upper()
+                text = "INT" not in declared and any(word in declared for word in ("CHAR", "CLOB", "TEXT"))
+                affinities.setdefault(column[1], set()).add(text)
+        names = _TEXT_COLUMNS[key] = {name for name, text in affinities.items() if text == {True}}
+    return names
+
+
+def _render(conn, sql, params, columns=None):
+    """json_object() of a row of ``sql`` and the count of its REALs that need Python, as SQL over ``sql``'s columns.
+
+    ``columns`` limits the object to those columns of ``sql``, in that order.
+    """
+    names = columns or [d[0] for d in conn.execute(f"SELECT * FROM ({sql}) LIMIT 0", params).description]
+    row = "json_object(" + ", ".join(f"'{name.replace(chr(39), chr(39) * 2)}', {_identifier(name)}"
+                                     for name in names) + ")"
+    text = _text_columns(conn)
+    inexact = " + ".join(_inexact(_identifier(name)) for name in names if name not in text)
+    return row, inexact or "0"
+
+
+def array(conn, sql, params=(), columns=None):
+    """The rows of ``sql``, in its order, as the bytes of a JSON array; None if Python must encode them."""
+    row, inexact = _render(conn, sql, params, columns)
+    body, inexact = conn.execute(f"SELECT json_group_array({row}), total({inexact}) FROM ({sql})", params).fetchone()
+    return None if inexact else body.encode()
+
+
+def rows(conn, sql, params, keys, columns=None):
+    """``(json, *key values)`` per row of ``sql``, for paging and merging; None if Python must encode them."""
+    row, inexact = _render(conn, sql, params, columns)
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    result = cursor.execute(f"SELECT {row}, {inexact}, {', '.join(map(_identifier, keys))} FROM ({sql})",
+                            params).fetchall()
+    if any(r[1] for r in result):
+        return None
+    return [(r[0], *r[2:]) for r in result]
+
+
+def dumps(value):
+    """``value`` encoded exactly as JSONResponse encodes it."""
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def document(members):
+    """One JSON object of ``members``, whose values are bytes already encoded or anything ``dumps`` takes."""
+    return b"{" + b",".join(dumps(name) + b":" + (value if isinstance(value, bytes) else dumps(value))
+                            for name, value in members.items()) + b"}"
+
+
+def join(encoded):
+    """One JSON array of already encoded rows."""
+    return ("[" + ",".join(encoded) + "]").encode()
+
+
+def concat(arrays):
+    """One JSON array of the elements of several ``array`` bodies."""
+    parts = [body[1:-1] for body in arrays if body != b"[]"]
+    return b"[" + b",".join(parts) + b"]"
@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+
+from multipart.multipart import MultipartParser, parse_options_header
+
+CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 250 * 1024 * 1024))
+MAX_FIELD_BYTES = 64 * 1024
+# Allowance for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadError(Exception):
+    status_code = 400
+
+
+class UploadTooLarge(UploadError):
+    status_code = 413
+
+
+class BlobStore:
+    """Content-addressed blob storage: every blob lives at ``<root>/ab/cd/<sha256>``.
+
+    Identical content always maps to the same path, so storing it twice is a
+    no-op and duplicate uploads cost no extra disk.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.tmp = os.path.join(root, "tmp")
+        os.makedirs(self.tmp, exist_ok=True)
+
+    def path_for(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def exists(self, sha256):
+        return os.path.exists(self.path_for(sha256))
+
+    def writer(self, max_bytes=MAX_UPLOAD_BYTES):
+        return BlobWriter(self, max_bytes)
+
+
+class BlobWriter:
+    """Hashes and spools one blob to a temp file, then moves it into place on commit."""
+
+    def __init__(self, store, max_bytes):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hasher = hashlib.sha256()
+        fd, self.temp_path = tempfile.mkstemp(dir=store.tmp)
+        self.file = os.fdopen(fd, "wb")
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"File exceeds the {self.max_bytes} byte upload limit")
+        self.hasher.update(data)
+        self.file.write(data)
+
+    def commit(self):
+        self.file.close()
+        sha256 = self.hasher.hexdigest()
+        path = self.store.path_for(sha256)
+        deduplicated = os.path.exists(path)
+        if deduplicated:
+            os.remove(self.temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self.temp_path, path)
+        return sha256, path, deduplicated
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.temp_path)
+        except FileNotFoundError:
+            pass
+
+
+class StoredFile:
+    def __init__(self, field_name, filename, content_type, size, sha256, path, deduplicated):
+        self.field_name = field_name
+        self.filename = filename
+        self.content_type = content_type
+        self.size = size
+        self.sha256 = sha256
+        self.path = path
+        self.deduplicated = deduplicated
+
+
+class _Part:
+    def __init__(self):
+        self.headers = {}
+        self.field_name = None
+        self.filename = None
+        self.content_type = None
+        self.data = bytearray()
+        self.writer = None
+
+
+async def _flush(part, force=False):
+    # Disk writes happen off the event loop in fixed-size chunks
+    while len(part.data) >= CHUNK_SIZE or (force and part.data):
+        chunk = bytes(part.data[:CHUNK_SIZE])
+        del part.data[:CHUNK_SIZE]
+        await asyncio.to_thread(part.writer.write, chunk)
+
+
+async def receive_upload(request, store, max_bytes=MAX_UPLOAD_BYTES):
+    """Stream a multipart request body straight into the blob store.
+
+    Returns ``(fields, files)``. File parts are written to disk in CHUNK_SIZE
+    writes while they are hashed, so memory use stays bounded no matter how
+    large the upload is, and oversized uploads are rejected as soon as they
+    cross ``max_bytes`` instead of after being buffered.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadError("Expected a multipart/form-data body")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes + MULTIPART_OVERHEAD:
+        raise UploadTooLarge(f"File exceeds the {max_bytes} byte upload limit")
+
+    fields, files = {}, []
+    finished, open_writers = [], set()
+    state = {"part": None, "header_name": b"", "header_value": b""}
+
+    def on_part_begin():
+        state["part"] = _Part()
+
+    def on_header_field(data, start, end):
+        state["header_name"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["header_value"] += data[start:end]
+
+    def on_header_end():
+        state["part"].headers[state["header_name"].lower()] = state["header_value"]
+        state["header_name"], state["header_value"] = b"", b""
+
+    def on_headers_finished():
+        part = state["part"]
+        _, options = parse_options_header(part.headers.get(b"content-disposition", b""))
+        if b"name" not in options:
+            raise UploadError('Content-Disposition is missing the "name" parameter')
+        part.field_name = options[b"name"].decode("utf-8", "replace")
+        if b"filename" in options:
+            part.filename = os.path.basename(options[b"filename"].decode("utf-8", "replace"))
+            part.content_type = part.headers.get(b"content-type", b"application/octet-stream").decode("latin-1")
+            part.writer = store.writer(max_bytes)
+            open_writers.add(part.writer)
+
+    def on_part_data(data, start, end):
+        part = state["part"]
+        part.data.extend(data[start:end])
+        if part.writer is None and len(part.data) > MAX_FIELD_BYTES:
+            raise UploadError(f"Form field '{part.field_name}' is too large")
+
+    def on_part_end():
+        finished.append(state["part"])
+        state["part"] = None
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            # One request chunk can finish several parts; finish them in order
+            for part in finished:
+                if part.writer is None:
+                    fields[part.field_name] = part.data.decode("utf-8", "replace")
+                    continue
+                await _flush(part, force=True)
+                sha256, path, deduplicated = await asyncio.to_thread(part.writer.commit)
+                open_writers.discard(part.writer)
+                files.append(StoredFile(part.field_name, part.filename, part.content_type,
+                                        part.writer.size, sha256, path, deduplicated))
+            finished.clear()
+            current = state["part"]
+            if current is not None and current.writer is not None:
+                await _flush(current)
+        parser.finalize()
+    finally:
+        # A part the body never closed, whether it failed or just ended early, leaves no temp file behind
+        for writer in open_writers:
+            writer.abort()
+    return fields, files
@@ -0,0 +1,179 @@
+"""Document thumbnails, rendered on first request and kept in a bounded disk cache.
+
+Images are scaled with Pillow and PDFs have their first page rendered by
+poppler's ``pdftoppm``. The image installs both, but they stay optional: without
+them, or for a document neither can handle, there is no thumbnail. Thumbnails are keyed by content hash and size, so every
+document sharing a blob shares its thumbnails. The cache directory is kept
+under THUMBNAIL_CACHE_MAX_BYTES by evicting the least recently served files;
+recency survives restarts through the files' mtimes.
+"""
+import asyncio
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv("THUMBNAIL_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+THUMBNAIL_SIZES = (128, 256, 512)
+THUMBNAIL_QUALITY = 80
+PDF_RENDER_TIMEOUT = 20
+PDFTOPPM = shutil.which("pdftoppm")
+
+IMAGE_TYPES = {"image/png", "image/jpeg", "image/gif", "image/webp", "image/bmp", "image/tiff"}
+
+
+def _render_image(path, size):
+    with Image.open(path) as image:
+        # JPEGs can decode straight to a reduced scale, which is most of the saving
+        image.draft("RGB", (size, size))
+        image.thumbnail((size, size))
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+        return out.getvalue()
+
+
+def _render_pdf(path, size):
+    with tempfile.TemporaryDirectory() as tmp:
+        prefix = os.path.join(tmp, "page")
+        subprocess.run(
+            [PDFTOPPM, "-f", "1", "-l", "1", "-singlefile", "-jpeg", "-scale-to", str(size), path, prefix],
+            check=True, capture_output=True, timeout=PDF_RENDER_TIMEOUT,
+        )
+        with open(prefix + ".jpg", "rb") as f:
+            return f.read()
+
+
+def renderer_for(content_type, filename):
+    """The function that can thumbnail this kind of file here, or None."""
+    extension = os.path.splitext(filename or "")[1].lower()
+    if content_type == "application/pdf" or extension == ".pdf":
+        return _render_pdf if PDFTOPPM else None
+    if content_type in IMAGE_TYPES or extension in (".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp", ".tif", ".tiff"):
+        return _render_image if Image is not None else None
+    return None
+
+
+class ThumbnailCache:
+    """LRU set of thumbnail files under one directory, bounded by total size."""
+
+    def __init__(self, directory, max_bytes=THUMBNAIL_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = self.failures = 0
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+        self._rendering = {}
+        # Blobs that failed to render aren't tried again until the process restarts
+        self._failed = set()
+        os.makedirs(directory, exist_ok=True)
+        found = []
+        for entry in os.scandir(directory):
+            if entry.name.endswith(".jpg"):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+            else:
+                # A render that died before its rename
+                os.remove(entry.path)
+        for _, name, size in sorted(found):
+            self._files[name] = size
+            self.bytes += size
+        self._evict()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def lookup(self, name):
+        with self._lock:
+            if name not in self._files:
+                return None
+            self._files.move_to_end(name)
+            self.hits += 1
+        path = self._path(name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.bytes -= self._files.pop(name, 0)
+            return None
+        return path
+
+    def store(self, name, data):
+        fd, temp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp, self._path(name))
+        with self._lock:
+            self.bytes += len(data) - self._files.pop(name, 0)
+            self._files[name] = len(data)
+            self._evict()
+        return self._path(name)
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and len(self._files) > 1:
+            name, size = self._files.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+
+    async def get(self, sha256, source, content_type, filename, size):
+        """Path of the thumbnail for a blob, rendering it on a miss; None if it can't be made."""
+        name = f"{sha256}-{size}.jpg"
+        path = self.lookup(name)
+        if path is not None:
+            return path
+        render = renderer_for(content_type, filename)
+        if render is None or name in self._failed:
+            return None
+        # Concurrent requests for the same thumbnail wait for one render
+        task = self._rendering.get(name)
+        if task is None:
+            with self._lock:
+                self.misses += 1
+            task = self._rendering[name] = asyncio.ensure_future(self._render(name, render, source, size))
+            task.add_done_callback(lambda _: self._rendering.pop(name, None))
+        return await asyncio.shield(task)
+
+    async def _render(self, name, render, source, size):
+        try:
+            data = await asyncio.to_thread(render, source, size)
+        except Exception:
+            # Corrupt or unsupported content: no thumbnail rather than an error page
+            with self._lock:
+                self.failures += 1
+                if len(self._failed) < 10000:
+                    self._failed.add(name)
+            return None
+        return await asyncio.to_thread(self.store, name, data)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "files": len(self._files),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "failures": self.failures,
+                "pillow": Image is not None,
+                "pdftoppm": PDFTOPPM is not None,
+            }
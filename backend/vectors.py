@@ -0,0 +1,637 @@
+"""Local semantic retrieval over maintenance issues and document text.
+
+Every chunk of text becomes a hashed TF-IDF vector: words and word pairs are
+hashed into VECTOR_DIM signed buckets, weighted by 1 + log(tf) and their
+inverse document frequency, and L2-normalized, so a dot product is a cosine
+similarity. Nothing leaves the machine and no model has to be loaded.
+
+The vectors live in a memory-mapped float32 file stored dimension-major, one
+row per dimension and one column per chunk. A question only has a handful of
+non-zero dimensions, so scoring reads just those rows (a few megabytes for a
+million chunks) block by block, and argpartition picks the top k among the
+scores that can still make it. Results are exact.
+
+Triggers queue every inserted, edited or deleted issue and document in
+vector_pending. ``sync`` drains that queue a batch at a time, in a
+background task that writes wake and that also polls for other processes'
+writes: it zeroes the columns of superseded chunks and appends fresh ones.
+Each batch holds the write lock (BEGIN IMMEDIATE) from reading the index
+state to committing it, so several API processes and the CLI take turns
+rather than writing the same columns. Searches only read. Once zeroed
+columns make up COMPACT_DEAD_RATIO of the file, a background compaction
+writes the live columns to a new generation of the file. Document
+frequencies only grow between rebuilds, so a rebuild re-weights everything
+from scratch:
+
+    python vectors.py sync|compact|rebuild
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import zlib
+from contextlib import nullcontext
+
+import numpy as np
+
+from search import STOPWORDS, TERM
+
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", 256))
+# Document frequencies are kept per hashed term, in a much larger space than the vectors
+DF_BUCKETS = 1 << 20
+CHUNK_WORDS = 80
+CHUNK_OVERLAP = 16
+# A long question is cut down to its strongest dimensions; each one is a row read
+QUERY_DIMS = 32
+BLOCK_COLUMNS = 1 << 18
+TOP_SEGMENT = 256
+INITIAL_CAPACITY = 4096
+# Sources indexed per write transaction; the write lock is held while they are vectorized
+SYNC_BATCH = 500
+VECTOR_SYNC_ENABLED = os.getenv("VECTOR_SYNC_ENABLED", "1") != "0"
+# Writes in this process wake the sync at once; other processes' are found by polling
+VECTOR_POLL_SECONDS = float(os.getenv("VECTOR_POLL_SECONDS", 5.0))
+VECTOR_MAX_BACKOFF_SECONDS = 60.0
+COMPACT_DEAD_RATIO = 0.25
+COMPACT_MIN_DEAD = 1000
+# Below this cosine a match is noise rather than an answer
+MIN_SCORE = float(os.getenv("VECTOR_MIN_SCORE", 0.15))
+
+KINDS = ("maintenance", "documents")
+# kind -> (source table, query returning (id, text) for the given ids)
+SOURCES = {
+    "maintenance": ("maintenance_issues", """
+        SELECT id, IFNULL(category, '') || ' ' || IFNULL(description, '') || ' ' || IFNULL(vendor, '')
+        FROM maintenance_issues WHERE id IN ({ids})
+    """),
+    "documents": ("documents", """
+        SELECT id, IFNULL(filename, '') || ' ' || IFNULL(content_summary, '') || ' '
+                   || IFNULL(json_extract(extracted_data, '$.text'), '')
+        FROM documents WHERE id IN ({ids})
+    """),
+}
+# A compaction's file nobody has touched for this long was left by a process that died
+STALE_COPY_SECONDS = 3600
+
+logger = logging.getLogger("vectors")
+
+
+def queue_without_conflicts(cursor):
+    """Migration step 3: queue triggers that can't fail an upsert of a source already queued.
+
+    Inside an UPSERT, SQLite applies the outer statement's conflict handling
+    to the statements of the triggers it fires, so their INSERT OR IGNORE
+    raised a UNIQUE error instead of ignoring the row. The statements here
+    are fixed; a later change is a new step.
+    """
+    for kind, table, columns in (("maintenance", "maintenance_issues", "category, description, vendor"),
+                                 ("documents", "documents", "filename, content_summary, extracted_data")):
+        for suffix, event, row in (("ai", "INSERT", "new"), ("au", f"UPDATE OF {columns}", "new"),
+                                   ("ad", "DELETE", "old")):
+            cursor.execute(f"DROP TRIGGER IF EXISTS vector_{table}_{suffix}")
+            cursor.execute(f"""
+                CREATE TRIGGER vector_{table}_{suffix} AFTER {event} ON {table} BEGIN
+                    INSERT INTO vector_pending (kind, source_id) SELECT '{kind}', {row}.id
+                    WHERE NOT EXISTS (SELECT 1 FROM vector_pending WHERE kind = '{kind}' AND source_id = {row}.id);
+                END
+            """)
+
+
+def _queue_everything(cursor):
+    for kind, (table, _) in SOURCES.items():
+        cursor.execute(f"INSERT OR IGNORE INTO vector_pending (kind, source_id) SELECT '{kind}', id FROM {table}")
+
+
+def _stem(word):
+    if word.endswith("ing") and len(word) > 5:
+        return word[:-3]
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def words(text):
+    return [_stem(w) for w in TERM.findall(text.lower()) if w not in STOPWORDS and not w.isdigit()]
+
+
+def terms(text):
+    found = words(text)
+    return found + [f"{a} {b}" for a, b in zip(found, found[1:])]
+
+
+def chunks(text):
+    words = text.split()
+    if len(words) <= CHUNK_WORDS:
+        return [text] if words else []
+    step = CHUNK_WORDS - CHUNK_OVERLAP
+    return [" ".join(words[i:i + CHUNK_WORDS]) for i in range(0, len(words) - CHUNK_OVERLAP, step)]
+
+
+def _hashed(text, dim):
+    """(df bucket, dimension, sign, term frequency) arrays for one text."""
+    counts = {}
+    for term in terms(text):
+        h = zlib.crc32(term.encode())
+        counts[h] = counts.get(h, 0) + 1
+    hashes = np.fromiter(counts, dtype=np.uint32, count=len(counts))
+    tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    return hashes & (DF_BUCKETS - 1), (hashes >> 12) % dim, np.where(hashes & 1, 1.0, -1.0), tf
+
+
+def _top(scores, k):
+    """Indices of the ``k`` highest ``scores``, in no particular order.
+
+    Partitioning a whole block is the slow part of a query, so it is cut
+    down first: the k-th highest of the segment maxima is a lower bound for
+    the k-th highest score, and usually only a few scores reach it.
+    """
+    if len(scores) <= k:
+        return np.arange(len(scores))
+    maxima = np.maximum.reduceat(scores, np.arange(0, len(scores), TOP_SEGMENT))
+    if len(maxima) > k:
+        candidates = np.flatnonzero(scores >= np.partition(maxima, -k)[-k])
+    else:
+        candidates = np.arange(len(scores))
+    if len(candidates) <= k:
+        return candidates
+    return candidates[np.argpartition(scores[candidates], -k)[-k:]]
+
+
+class VectorIndex:
+    def __init__(self, directory, db=None, dim=VECTOR_DIM):
+        self.directory = directory
+        self.db = db
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._compacting = None
+        # df buckets counted by the sync in progress, to take back if it rolls back
+        self._learned = None
+        self._wakeup = None
+        self._task = None
+        self._syncing = None
+        self._matrix = None
+        self._df = None
+        self.generation = 0
+        self.capacity = 0
+        self.count = 0
+        self.dead = 0
+        self.chunks = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, generation):
+        return os.path.join(self.directory, f"vectors.{generation}.f32")
+
+    def _map(self, generation, capacity, mode="r+"):
+        return np.memmap(self._path(generation), dtype=np.float32, mode=mode, shape=(self.dim, capacity))
+
+    def _meta(self, conn):
+        return conn.execute("SELECT generation, dim, capacity, count, dead, chunks FROM vector_meta").fetchone()
+
+    def _load(self, conn):
+        """Map the files vector_meta names, unless already mapped; False if the index must start over.
+
+        Call with the lock held. Another process may have synced or
+        compacted, so the state is compared every time. Only reads.
+        """
+        meta = self._meta(conn)
+        if self._matrix is not None and meta is not None and tuple(meta) == (
+                self.generation, self.dim, self.capacity, self.count, self.dead, self.chunks):
+            return True
+        df_path = os.path.join(self.directory, "df.i32")
+        if meta is None or meta[1] != self.dim or not os.path.exists(self._path(meta[0])) \
+                or not os.path.exists(df_path):
+            return False
+        self.generation, _, self.capacity, self.count, self.dead, self.chunks = meta
+        self._matrix = self._map(self.generation, self.capacity)
+        self._df = np.memmap(df_path, dtype=np.int32, mode="r+", shape=(DF_BUCKETS,))
+        return True
+
+    def _clean(self):
+        # Files of older generations, and copies a compaction that died left behind; with the write lock held
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            generation = name.split(".")[1] if name.startswith("vectors.") else ""
+            if name.endswith(".tmp"):
+                stale = time.time() - os.path.getmtime(path) > STALE_COPY_SECONDS
+            else:
+                stale = generation.isdigit() and int(generation) < self.generation
+            if stale:
+                _remove(path)
+
+    def open(self, conn):
+        with self._lock:
+            self._load(conn)
+
+    def _reset(self, conn):
+        """Start the index over inside the caller's write transaction."""
+        for name in os.listdir(self.directory):
+            _remove(os.path.join(self.directory, name))
+        self.generation, self.capacity, self.count, self.dead, self.chunks = 1, INITIAL_CAPACITY, 0, 0, 0
+        self._matrix = self._map(self.generation, self.capacity, mode="w+")
+        self._df = np.memmap(os.path.join(self.directory, "df.i32"), dtype=np.int32, mode="w+", shape=(DF_BUCKETS,))
+        conn.execute("DELETE FROM vector_chunks")
+        _queue_everything(conn)
+        self._save_meta(conn)
+
+    def _save_meta(self, conn):
+        conn.execute("""
+            INSERT INTO vector_meta (id, generation, dim, capacity, count, dead, chunks)
+            VALUES (1, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET generation = excluded.generation, capacity = excluded.capacity,
+                count = excluded.count, dead = excluded.dead, chunks = excluded.chunks
+        """, (self.generation, self.dim, self.capacity, self.count, self.dead, self.chunks))
+
+    # Writing
+
+    def vectorize(self, texts, learn=False):
+        """Rows of unit vectors for ``texts``; with ``learn`` their terms count toward document frequency."""
+        hashed = [_hashed(text, self.dim) for text in texts]
+        if learn:
+            for buckets, _, _, _ in hashed:
+                np.add.at(self._df, buckets, 1)
+                if self._learned is not None:
+                    self._learned.append(buckets)
+            self.chunks += len(texts)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, (buckets, dims, signs, tf) in enumerate(hashed):
+            if not len(buckets):
+                continue
+            idf = np.log((1 + self.chunks) / (1 + self._df[buckets])) + 1
+            np.add.at(vectors[i], dims, signs * (1 + np.log(tf)) * idf)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=vectors, where=norms > 0)
+
+    def _grow(self, needed):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        matrix = self._map(self.generation + 1, capacity, mode="w+")
+        for d in range(self.dim):
+            matrix[d, :self.count] = self._matrix[d, :self.count]
+        matrix.flush()
+        return matrix, capacity
+
+    def append(self, conn, items):
+        """Index ``(kind, source_id, chunk, text)`` items; the caller commits ``conn``.
+
+        Columns are written before vector_chunks and vector_meta point at
+        them, so a crash in between leaves the index as it was.
+        """
+        if not items:
+            return
+        start = self.count
+        vectors = self.vectorize([text for _, _, _, text in items], learn=True)
+        matrix, capacity, generation = self._matrix, self.capacity, self.generation
+        if start + len(items) > capacity:
+            matrix, capacity = self._grow(start + len(items))
+            generation += 1
+        matrix[:, start:start + len(items)] = vectors.T
+        conn.executemany(
+            "INSERT INTO vector_chunks (row, kind, source_id, chunk) VALUES (?, ?, ?, ?)",
+            [(start + i, kind, source_id, chunk) for i, (kind, source_id, chunk, _) in enumerate(items)],
+        )
+        old = self._path(self.generation) if generation != self.generation else None
+        self._matrix, self.capacity, self.generation = matrix, capacity, generation
+        self.count = start + len(items)
+        self._save_meta(conn)
+        return old
+
+    def _drop(self, conn, kind, ids):
+        rows = [row for (row,) in conn.execute(
+            f"SELECT row FROM vector_chunks WHERE kind = ? AND source_id IN ({', '.join('?' * len(ids))})",
+            (kind, *ids),
+        )]
+        if rows:
+            self._matrix[:, rows] = 0
+            conn.execute(
+                f"DELETE FROM vector_chunks WHERE kind = ? AND source_id IN ({', '.join('?' * len(ids))})",
+                (kind, *ids),
+            )
+            self.dead += len(rows)
+
+    def sync(self, conn, limit=SYNC_BATCH):
+        """Index up to ``limit`` queued sources in one write transaction; returns how many were processed.
+
+        BEGIN IMMEDIATE comes first, so the index state, the queue and the
+        first free column are read under the write lock. If the transaction
+        fails, the document frequencies it counted are taken back and the
+        state is re-read from vector_meta next time.
+        """
+        # Thousands of near-identical statements; timing each tells nothing
+        untraced = self.db.untraced(conn) if self.db is not None else nullcontext()
+        with self._lock, untraced:
+            conn.execute("BEGIN IMMEDIATE")
+            self._learned = []
+            try:
+                if not self._load(conn):
+                    self._reset(conn)
+                self._clean()
+                pending = conn.execute("SELECT kind, source_id FROM vector_pending LIMIT ?", (limit,)).fetchall()
+                items = []
+                for kind in KINDS:
+                    ids = [source_id for k, source_id in pending if k == kind]
+                    if not ids:
+                        continue
+                    self._drop(conn, kind, ids)
+                    sql = SOURCES[kind][1].format(ids=", ".join("?" * len(ids)))
+                    for source_id, text in conn.execute(sql, ids):
+                        items.extend((kind, source_id, n, chunk) for n, chunk in enumerate(chunks(text)))
+                stale = self.append(conn, items)
+                self._save_meta(conn)
+                conn.executemany("DELETE FROM vector_pending WHERE kind = ? AND source_id = ?", pending)
+                self._matrix.flush()
+                self._df.flush()
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                for buckets in self._learned:
+                    np.subtract.at(self._df, buckets, 1)
+                self._matrix = None
+                raise
+            finally:
+                self._learned = None
+            if stale:
+                _remove(stale)
+        if self.dead >= COMPACT_MIN_DEAD and self.dead >= COMPACT_DEAD_RATIO * self.count:
+            self.compact_in_background()
+        return len(pending)
+
+    def sync_all(self, conn):
+        done = 0
+        while True:
+            synced = self.sync(conn)
+            done += synced
+            if not synced:
+                return done
+
+    def compact(self, conn):
+        """Rewrite the live columns, in order, to a new generation of the vector file; False if it gave up.
+
+        The copy is made from a read snapshot without the write lock, into a
+        file of this process's own. Under BEGIN IMMEDIATE it replaces the
+        index only if no sync, here or in another process, changed the index
+        since; otherwise it is thrown away and a later sync tries again.
+        """
+        with self._lock:
+            conn.execute("BEGIN")
+            try:
+                if not self._load(conn):
+                    return False
+                seen = tuple(self._meta(conn))
+                live = np.array([row for (row,) in conn.execute("SELECT row FROM vector_chunks ORDER BY row")],
+                                dtype=np.int64)
+            finally:
+                conn.rollback()
+            capacity = max(INITIAL_CAPACITY, 1 << max(0, len(live) - 1).bit_length())
+            copy = f"{self._path(self.generation + 1)}.{os.getpid()}.tmp"
+            matrix = np.memmap(copy, dtype=np.float32, mode="w+", shape=(self.dim, capacity))
+            for d in range(self.dim):
+                matrix[d, :len(live)] = self._matrix[d, live]
+            matrix.flush()
+            del matrix
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if tuple(self._meta(conn)) != seen:
+                    conn.rollback()
+                    _remove(copy)
+                    return False
+                os.replace(copy, self._path(self.generation + 1))
+                conn.execute("""
+                    CREATE TABLE vector_chunks_compacted (
+                        row INTEGER PRIMARY KEY,
+                        kind TEXT NOT NULL,
+                        source_id INTEGER NOT NULL,
+                        chunk INTEGER NOT NULL
+                    )
+                """)
+                conn.execute("""
+                    INSERT INTO vector_chunks_compacted (row, kind, source_id, chunk)
+                    SELECT ROW_NUMBER() OVER (ORDER BY row) - 1, kind, source_id, chunk FROM vector_chunks
+                """)
+                conn.execute("DROP TABLE vector_chunks")
+                conn.execute("ALTER TABLE vector_chunks_compacted RENAME TO vector_chunks")
+                conn.execute("CREATE INDEX idx_vector_chunks_source ON vector_chunks (kind, source_id)")
+                stale = self._path(self.generation)
+                self.capacity, self.generation = capacity, self.generation + 1
+                self.count, self.dead = len(live), 0
+                self._save_meta(conn)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                self._matrix = None
+                raise
+            self._matrix = self._map(self.generation, self.capacity)
+            _remove(stale)
+            return True
+
+    def compact_in_background(self):
+        if self.db is None or (self._compacting and self._compacting.is_alive()):
+            return
+
+        def run():
+            try:
+                with self.db.connection() as conn:
+                    self.compact(conn)
+            except Exception:
+                logger.exception("vector compaction failed")
+
+        self._compacting = threading.Thread(target=run, name="vector-compact", daemon=True)
+        self._compacting.start()
+
+    def rebuild(self, conn):
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._reset(conn)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                self._matrix = None
+                raise
+        self.sync_all(conn)
+
+    # Background sync
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._wakeup.set()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop syncing; once this returns nothing here writes to the index until started again."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # A cancelled batch keeps running on its thread, and may have started a compaction
+        if self._syncing is not None:
+            await asyncio.gather(self._syncing, return_exceptions=True)
+            self._syncing = None
+        if self._compacting is not None:
+            await asyncio.to_thread(self._compacting.join)
+
+    async def _run(self):
+        wait = backoff = VECTOR_POLL_SECONDS
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                # A batch at a time, so other writers get the lock in between
+                while True:
+                    self._syncing = asyncio.ensure_future(self.db.run(self.sync))
+                    if not await asyncio.shield(self._syncing):
+                        break
+                wait = backoff = VECTOR_POLL_SECONDS
+            except Exception:
+                # A locked or failing database delays indexing; the queue keeps the work
+                logger.exception("vector sync failed; retrying in %.1f s", backoff)
+                wait, backoff = backoff, min(backoff * 2, VECTOR_MAX_BACKOFF_SECONDS)
+
+    # Reading
+
+    def top_rows(self, vector, k=10):
+        """``[(row, score)]`` of the best ``k`` columns for a unit query vector, best first."""
+        matrix, count = self._matrix, self.count
+        dims = np.flatnonzero(vector)
+        if not len(dims) or not count:
+            return []
+        if len(dims) > QUERY_DIMS:
+            dims = dims[np.argpartition(-np.abs(vector[dims]), QUERY_DIMS)[:QUERY_DIMS]]
+        scores = np.empty(min(count, BLOCK_COLUMNS), dtype=np.float32)
+        term = np.empty_like(scores)
+        best_rows, best_scores = [], []
+        for start in range(0, count, BLOCK_COLUMNS):
+            end = min(count, start + BLOCK_COLUMNS)
+            block, part = scores[:end - start], term[:end - start]
+            np.multiply(matrix[dims[0], start:end], vector[dims[0]], out=block)
+            for d in dims[1:]:
+                block += np.multiply(matrix[d, start:end], vector[d], out=part)
+            top = _top(block, k)
+            best_rows.append(top + start)
+            best_scores.append(block[top])
+        rows, scores = np.concatenate(best_rows), np.concatenate(best_scores)
+        order = np.argsort(-scores)[:k]
+        # Zeroed columns and chunks sharing nothing with the question score 0
+        return [(int(rows[i]), float(scores[i])) for i in order if scores[i] > 0]
+
+    def search(self, conn, text, k=10, min_score=0.0):
+        """The ``k`` chunks closest to ``text`` with their source rows, as of the last sync; only reads."""
+        # A sync or compaction already running here shouldn't hold up the question
+        if self._lock.acquire(blocking=False):
+            try:
+                self._load(conn)
+            finally:
+                self._lock.release()
+        if self._matrix is None:
+            return []
+        generation = self.generation
+        # Hashing folds unrelated terms together, so candidates are over-fetched
+        # and only those sharing a word with the question are kept
+        hits = [(row, score) for row, score in self.top_rows(self.vectorize([text])[0], k * 3) if score >= min_score]
+        if not hits:
+            return []
+        located = {row: (kind, source_id, chunk) for row, kind, source_id, chunk in conn.execute(
+            f"SELECT row, kind, source_id, chunk FROM vector_chunks WHERE row IN ({', '.join('?' * len(hits))})",
+            [row for row, _ in hits],
+        )}
+        if generation != self.generation:
+            # Compacted while scoring: the rows were renumbered, so score again
+            return self.search(conn, text, k, min_score)
+        return self._results(conn, hits, located, set(words(text)))[:k]
+
+    def _results(self, conn, hits, located, question):
+        details = {}
+        for kind in KINDS:
+            ids = sorted({located[row][1] for row, _ in hits if row in located and located[row][0] == kind})
+            if not ids:
+                continue
+            placeholders = ", ".join("?" * len(ids))
+            if kind == "maintenance":
+                sql = f"""
+                    SELECT id, property_id, category AS title, date FROM maintenance_issues
+                    WHERE id IN ({placeholders})
+                """
+            else:
+                sql = f"""
+                    SELECT id, property_id, filename AS title, upload_date AS date FROM documents
+                    WHERE id IN ({placeholders})
+                """
+            texts = dict(conn.execute(SOURCES[kind][1].format(ids=placeholders), ids).fetchall())
+            for row in conn.execute(sql, ids):
+                details[kind, row["id"]] = (dict(row), texts.get(row["id"], ""))
+        results = []
+        for row, score in hits:
+            if row not in located:
+                continue
+            kind, source_id, chunk = located[row]
+            if (kind, source_id) not in details:
+                continue
+            detail, text = details[kind, source_id]
+            parts = chunks(text)
+            text = parts[chunk] if chunk < len(parts) else text
+            if question.isdisjoint(words(text)):
+                continue
+            results.append({"kind": kind, **detail, "text": text, "score": round(score, 4)})
+        return results
+
+    def stats(self):
+        return {
+            "syncing": self._task is not None,
+            "dim": self.dim,
+            "generation": self.generation,
+            "capacity": self.capacity,
+            "chunks": self.count - self.dead,
+            "dead": self.dead,
+            "file_bytes": self.dim * self.capacity * 4,
+        }
+
+
+def _remove(path):
+    # A file another thread or process still has mapped can't always be removed (Windows); it goes next time
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def semantic_answer(index, conn, question, k=5):
+    """Answer a question no intent claimed from its closest chunks, or None when nothing is close."""
+    results = index.search(conn, question, k=k, min_score=MIN_SCORE)
+    if not results:
+        return None
+    best = results[0]
+    label = "maintenance issue" if best["kind"] == "maintenance" else "document"
+    where = f" at {best['property_id']}" if best.get("property_id") else ""
+    return (
+        f"Found {len(results)} related record(s). Closest match: {label} '{best['title']}'{where} "
+        f"({best['date'] or 'undated'}): {best['text'][:200]}"
+    ), results
+
+
+if __name__ == "__main__":
+    commands = ("sync", "compact", "rebuild")
+    if len(sys.argv) != 2 or sys.argv[1] not in commands:
+        sys.exit(f"usage: python vectors.py {'|'.join(commands)}")
+    import main
+    main.init_db()
+    with main.get_db() as conn, main.db.untraced(conn):
+        index = main.vector_index
+        index.open(conn)
+        if sys.argv[1] == "sync":
+            print(f"{index.sync_all(conn)} sources indexed")
+        elif sys.argv[1] == "compact":
+            index.compact(conn)
+        else:
+            index.rebuild(conn)
+        print(json.dumps(index.stats(), indent=2))
@@ -543,7 +543,7 @@ function OwnerDashboard() {
 
                 <div className="bg-white p-4 rounded-2xl shadow-xl mb-6">
                   <img
-                    src={`${API_BASE}/api/qr?t=${Date.now()}`}
+                    src={`${API_BASE}/api/qr`}
                     onError={(e) => e.target.src = `https://api.qrserver.com/v1/create-qr-code/?size=250x250&data=upi://pay?pa=propnexa@bank&pn=PropNexa&am=0&cu=INR`}
                     alt="My UPI QR Code"
                     className="w-64 h-64 object-contain"